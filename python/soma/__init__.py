@@ -8,3 +8,28 @@
 #
 
 from .info import __version__
+
+
+def _import_submodule(package, name):
+    '''
+    Import and return the submodule name of package, for the module
+    ``__getattr__`` function of packages (PEP 562). AttributeError is raised
+    if there is no such submodule.
+    '''
+    if not name.startswith('__'):
+        import importlib
+        try:
+            return importlib.import_module('.' + name, package)
+        except ModuleNotFoundError as e:
+            if e.name != '%s.%s' % (package, name):
+                raise
+    raise AttributeError('module %r has no attribute %r' % (package, name))
+
+
+def __getattr__(name):
+    '''
+    Import soma submodules when they are first accessed as attributes:
+    ``import soma`` does not import any submodule, and ``soma.path`` can be
+    used after it.
+    '''
+    return _import_submodule(__name__, name)
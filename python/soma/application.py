@@ -2,9 +2,11 @@
 __docformat__ = "restructuredtext en"
 
 
+import json
 import os
 import sys
 import platform
+import time
 import traceback
 from os.path import dirname
 
@@ -30,6 +32,13 @@ class Application(Singleton, Controller):
 
     plugin_modules = ListStr(
         desc='List of Python module to load after application configuration')
+    deferred_plugin_modules = ListStr(
+        desc='List of plugin modules loaded when they are first looked for '
+        'in loaded_plugin_modules, after application initialization')
+
+    #: functions of a plugin module called by :meth:`initialize`
+    plugin_hooks = ('call_before_application_initialization',
+                    'call_after_application_initialization')
 
     def __singleton_init__(self, name=None, version=None, *args, **kwargs):
         '''Replaces __init__ in Singleton.'''
@@ -52,7 +61,16 @@ class Application(Singleton, Controller):
             name = os.path.basename(sys.argv[0])
         self.name = name
         self.version = version
-        self.loaded_plugin_modules = {}
+        self.loaded_plugin_modules = PluginModules(self)
+        # plugin module -> {'import' or hook name: duration in seconds}
+        self.plugin_timings = {}
+        # JSON file of the plugins manifest (see _read_plugin_manifest). None
+        # means a default file in the user cache directory, '' means no
+        # manifest.
+        self.plugin_manifest_file = None
+        self._plugin_manifest = None
+        self._plugin_manifest_modified = False
+        self._failed_plugin_modules = set()
 
     def initialize(self):
         '''This method must be called once to setup the application.'''
@@ -86,15 +104,20 @@ class Application(Singleton, Controller):
         if homedir and os.path.exists(homedir):
             self.user_directory = homedir
 
-        # Load early plugin modules
+        # Load early plugin modules. Deferred plugins are not imported now.
+        self._read_plugin_manifest(homedir)
+        deferred = self.loaded_plugin_modules.deferred
         for plugin_module in self.plugin_modules:
-            module = self.load_plugin_module(plugin_module)
+            if plugin_module in self.deferred_plugin_modules:
+                if plugin_module not in deferred:
+                    deferred.append(plugin_module)
+                continue
+            module = self._import_plugin_module(plugin_module)
             if module is not None:
                 self.loaded_plugin_modules[plugin_module] = module
-                init = getattr(
-                    module, 'call_before_application_initialization', None)
-                if init is not None:
-                    init(self)
+                self._call_plugin_hook(
+                    plugin_module, module,
+                    'call_before_application_initialization')
 
         appdir = os.path.normpath(
             os.path.dirname(os.path.dirname(sys.argv[0])))
@@ -107,15 +130,160 @@ class Application(Singleton, Controller):
 
         # Load plugin modules
         for plugin_module in self.plugin_modules:
-            module = self.loaded_plugin_modules.get(plugin_module)
+            if plugin_module in deferred \
+                    or plugin_module in self._failed_plugin_modules:
+                continue
+            module = dict.get(self.loaded_plugin_modules, plugin_module)
             if module is None:
-                module = self.load_plugin_module(plugin_module)
+                module = self._import_plugin_module(plugin_module)
             if module is not None:
                 self.loaded_plugin_modules[plugin_module] = module
-                init = getattr(
-                    module, 'call_after_application_initialization', None)
-                if init is not None:
-                    init(self)
+                self._call_plugin_hook(
+                    plugin_module, module,
+                    'call_after_application_initialization')
+        for plugin_module in self.deferred_plugin_modules:
+            if plugin_module not in deferred \
+                    and not dict.__contains__(self.loaded_plugin_modules,
+                                              plugin_module):
+                deferred.append(plugin_module)
+        self._write_plugin_manifest()
+
+    def load_deferred_plugin_module(self, plugin_module):
+        '''Load a deferred plugin module, and call its initialization functions
+        (both ``call_before_application_initialization`` and
+        ``call_after_application_initialization``). Returns the module, or
+        None if it cannot be imported.
+
+        This is done when the plugin is first looked for in
+        ``loaded_plugin_modules``.'''
+        deferred = self.loaded_plugin_modules.deferred
+        if plugin_module not in deferred:
+            return dict.get(self.loaded_plugin_modules, plugin_module)
+        deferred.remove(plugin_module)
+        module = self._import_plugin_module(plugin_module)
+        if module is not None:
+            self.loaded_plugin_modules[plugin_module] = module
+            for hook in self.plugin_hooks:
+                self._call_plugin_hook(plugin_module, module, hook)
+        self._write_plugin_manifest()
+        return module
+
+    def load_deferred_plugin_modules(self):
+        '''Load all the deferred plugin modules.'''
+        for plugin_module in list(self.loaded_plugin_modules.deferred):
+            self.load_deferred_plugin_module(plugin_module)
+
+    def print_plugin_timings(self, out=sys.stdout):
+        '''Print the time spent to import each plugin module and to call its
+        initialization functions.'''
+        print('%-30s %10s %10s %10s' % ('plugin module', 'import ms',
+                                        'before ms', 'after ms'), file=out)
+        total = 0.
+        for plugin_module, timings in self.plugin_timings.items():
+            times = [timings.get(i) for i in ('import', ) + self.plugin_hooks]
+            total += sum(t for t in times if t is not None)
+            print('%-30s %10s %10s %10s'
+                  % ((plugin_module, ) + tuple(
+                      '-' if t is None else '%.1f' % (t * 1000.)
+                      for t in times)), file=out)
+        deferred = self.loaded_plugin_modules.deferred
+        if deferred:
+            # import times recorded by previous runs
+            manifest = self._plugin_manifest or {}
+            print('deferred:', ', '.join(
+                plugin_module if 'import_time' not in
+                manifest.get(plugin_module, {})
+                else '%s (last import %.1f ms)'
+                % (plugin_module,
+                   manifest[plugin_module]['import_time'] * 1000.)
+                for plugin_module in deferred), file=out)
+        print('total: %.1f ms' % (total * 1000.), file=out)
+
+    def _read_plugin_manifest(self, homedir):
+        '''The plugins manifest records, for each plugin module, the
+        initialization functions it defines and its last import time. It is
+        only used for reporting (see :meth:`print_plugin_timings`): the
+        import time of deferred plugins is known before they are loaded. An
+        entry is valid as long as the module file is not modified.'''
+        if self.plugin_manifest_file is None:
+            cache_directory = os.environ.get('XDG_CACHE_HOME')
+            if not cache_directory and homedir:
+                cache_directory = os.path.join(homedir, '.cache')
+            if cache_directory:
+                self.plugin_manifest_file = os.path.join(
+                    cache_directory, 'soma', '%s-plugins.json' % self.name)
+            else:
+                self.plugin_manifest_file = ''
+        self._plugin_manifest = {}
+        if self.plugin_manifest_file:
+            try:
+                with open(self.plugin_manifest_file) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+            for plugin_module, entry in manifest.items():
+                try:
+                    if os.stat(entry['file']).st_mtime == entry['mtime']:
+                        self._plugin_manifest[plugin_module] = entry
+                except (OSError, KeyError, TypeError):
+                    pass
+        self._plugin_manifest_modified = False
+        return self._plugin_manifest
+
+    def _write_plugin_manifest(self):
+        if not self.plugin_manifest_file or not self._plugin_manifest_modified:
+            return
+        self._plugin_manifest_modified = False
+        try:
+            directory = os.path.dirname(self.plugin_manifest_file)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            tmp = '%s.%d.tmp' % (self.plugin_manifest_file, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(self._plugin_manifest, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.plugin_manifest_file)
+        except OSError:
+            # the manifest is only a cache
+            pass
+
+    def _import_plugin_module(self, plugin_module):
+        '''Import a plugin module, record its import time and update its
+        manifest entry. A plugin module which cannot be imported is not
+        imported again.'''
+        already_imported = plugin_module in sys.modules
+        t0 = time.perf_counter()
+        module = self.load_plugin_module(plugin_module)
+        duration = time.perf_counter() - t0
+        if module is None:
+            self._failed_plugin_modules.add(plugin_module)
+            return None
+        self.plugin_timings.setdefault(plugin_module, {})['import'] = duration
+        manifest = self._plugin_manifest
+        if manifest is not None:
+            entry = dict(manifest.get(plugin_module, {}))
+            try:
+                entry['file'] = module.__file__
+                entry['mtime'] = os.stat(module.__file__).st_mtime
+            except (AttributeError, TypeError, OSError):
+                # no module file: no manifest entry
+                manifest.pop(plugin_module, None)
+                return module
+            entry['hooks'] = [hook for hook in self.plugin_hooks
+                              if hasattr(module, hook)]
+            if not already_imported:
+                entry['import_time'] = duration
+            if entry != manifest.get(plugin_module):
+                manifest[plugin_module] = entry
+                self._plugin_manifest_modified = True
+        return module
+
+    def _call_plugin_hook(self, plugin_module, module, hook):
+        function = getattr(module, hook, None)
+        if function is not None:
+            t0 = time.perf_counter()
+            function(self)
+            self.plugin_timings.setdefault(plugin_module, {})[hook] \
+                = time.perf_counter() - t0
 
     @staticmethod
     def load_plugin_module(plugin_module):
@@ -131,3 +299,35 @@ class Application(Singleton, Controller):
             traceback.print_exception(
                 exceptionType, exceptionValue, exceptionTraceback)
         return None
+
+
+class PluginModules(dict):
+
+    '''Dictionary of the plugin modules loaded by an :class:`Application`
+    (``Application.loaded_plugin_modules``). Deferred plugin modules are
+    listed in the ``deferred`` attribute: they are loaded (see
+    :meth:`Application.load_deferred_plugin_module`) when they are first
+    looked for in the dictionary.'''
+
+    def __init__(self, application):
+        super(PluginModules, self).__init__()
+        self.application = application
+        self.deferred = []
+
+    def __missing__(self, plugin_module):
+        if plugin_module in self.deferred:
+            module = self.application.load_deferred_plugin_module(
+                plugin_module)
+            if module is not None:
+                return module
+        raise KeyError(plugin_module)
+
+    def __contains__(self, plugin_module):
+        return dict.__contains__(self, plugin_module) \
+            or plugin_module in self.deferred
+
+    def get(self, plugin_module, default=None):
+        try:
+            return self[plugin_module]
+        except KeyError:
+            return default
@@ -1,21 +1,46 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+import bz2
+import collections
+import fnmatch
+import gzip
+import lzma
 import tarfile
 import zipfile
+import zlib
 import os
 
+from soma.bufferandfile import identify
+
+#: size of the chunks of a tar stream compressed in parallel by
+#: :func:`pack_tar`
+compress_chunk_size = 4 << 20
+
+_zip_magics = (b'PK\x03\x04',  # zip
+               b'PK\x05\x06')  # empty zip
+
+
 def is_archive(filename):
     """
     Returns true if filename is an archive and false otherwise.
+
+    Only the header of the file is read, once: the file is an archive if it
+    starts with the signature of a zip file, or with a tar header (possibly
+    compressed with gzip, bz2 or xz), or if its extension is an archive
+    extension.
     """
-    if zipfile.is_zipfile(filename):
+    try:
+        with open(filename, 'rb') as f:
+            # compressed files are decompressed
+            format, compressions, stream = identify(f, prefix_size=512)
+            header = stream.peek(512)
+    except (OSError, EOFError, zlib.error, lzma.LZMAError):
+        header = b''
+        compressions = []
+    if header.startswith(b'ustar', 257):
+        return True
+    if not compressions and header.startswith(_zip_magics):
         return True
-    else:
-        try:
-            tarfile.open(filename)
-            return True
-        except Exception:
-            pass
     if os.path.splitext(filename)[1] in get_archive_extensions():
         return True
     return False
@@ -23,78 +48,227 @@ def is_archive(filename):
 def get_archive_extensions():
     return ['.zip', '.gz', '.tar', '.bz2', '.tgz']
 
-def unpack(input_filename, extract_dir):
+def unpack(input_filename, extract_dir, members=None):
     """
     Unpacks the input_filename archive to the extract_dir directory.
+
+    members selects the extracted members (see :func:`untar`).
     """
     if zipfile.is_zipfile(input_filename):
-        unzip(input_filename, extract_dir)
+        unzip(input_filename, extract_dir, members)
     else:
-        untar(input_filename, extract_dir)
+        untar(input_filename, extract_dir, members)
 
-def pack(output_filename, sources):
+def pack(output_filename, sources, workers=None):
     """
     Packs the source_dir directory in the output_filename archive.
+
+    Compressed tar streams are compressed in parallel by workers processes
+    (see :func:`pack_tar`).
     """
     ext = os.path.splitext(output_filename)[1][1:]
     if ext == 'zip':
-        pack_zip(output_filename, sources)
+        pack_zip(output_filename, sources, workers)
     elif ext == 'gz' or ext == 'tgz' or ext == 'bz2' or ext == 'tar':
-        pack_tar(output_filename, sources, ext)
+        pack_tar(output_filename, sources, ext, workers)
+
+def _member_selector(members):
+    """
+    Return a function telling if a member name is selected by members: None
+    (all members), a function taking a member name, or a list of names or
+    :mod:`fnmatch` patterns (a directory name selects its content).
+    """
+    if members is None:
+        return lambda name: True
+    if callable(members):
+        return members
+    if isinstance(members, str):
+        members = [members]
+    patterns = [member.rstrip('/') for member in members]
+
+    def selected(name):
+        name = name.rstrip('/')
+        for pattern in patterns:
+            if fnmatch.fnmatchcase(name, pattern) \
+                    or name.startswith(pattern + '/'):
+                return True
+        return False
+    return selected
 
-def untar(input_filename, extract_dir):
+def untar(input_filename, extract_dir, members=None):
     """
     Extracts the input_filename archive to the extract_dir directory.
+
+    The archive is read as a stream, only once, and only the members
+    selected by members are written. members may be None (all members), a
+    list of member names or :mod:`fnmatch` patterns (a directory name
+    selects its content), or a function taking a member name and returning
+    True for the members to extract.
     """
+    selected = _member_selector(members)
     try:
-        tar_ds = tarfile.open(input_filename)
-    except (tarfile.TarError, EOFError):
+        # decompressors of soma.bufferandfile read concatenated compressed
+        # streams (written by pack_tar), tarfile stream mode does not.
+        format, compressions, stream = identify(input_filename)
+        with stream:
+            tar_ds = tarfile.open(fileobj=stream, mode='r|')
+            try:
+                # extractall() sets the attributes of directories after
+                # their content is extracted
+                tar_ds.extractall(path=extract_dir,
+                                  members=(tarinfo for tarinfo in tar_ds
+                                           if selected(tarinfo.name)))
+            finally:
+                tar_ds.close()
+    except (tarfile.TarError, EOFError, zlib.error, lzma.LZMAError,
+            gzip.BadGzipFile):
         raise OSError("%s is not a tar file" % (input_filename))
-    tar_ds.extractall(path=extract_dir)
-    tar_ds.close()
 
-def unzip(input_filename, extract_dir):
+def _unzip_members(input_filename, extract_dir, names):
+    # runs in a worker process
+    with zipfile.ZipFile(input_filename) as zip_ds:
+        for name in names:
+            zip_ds.extract(name, path=extract_dir)
+
+def unzip(input_filename, extract_dir, members=None, workers=None):
     """
     Extracts the input_filename archive to the extract_dir directory.
+
+    members selects the extracted members (see :func:`untar`). Members are
+    decompressed in parallel by workers processes (default:
+    :func:`os.cpu_count`), 1 means no worker process.
     """
     if not zipfile.is_zipfile(input_filename):
         raise OSError("%s is not a zip file" % (input_filename))
-    zip_ds = zipfile.ZipFile(input_filename)
-    zip_ds.extractall(path=extract_dir)
-    zip_ds.close()
+    selected = _member_selector(members)
+    with zipfile.ZipFile(input_filename) as zip_ds:
+        infos = [info for info in zip_ds.infolist()
+                 if selected(info.filename)]
+        if workers is None:
+            workers = os.cpu_count() or 1
+        total_size = sum(info.compress_size for info in infos)
+        if workers <= 1 or len(infos) < 2 \
+                or total_size < compress_chunk_size:
+            for info in infos:
+                zip_ds.extract(info, path=extract_dir)
+            return
+    # balance the compressed sizes of the members given to each worker
+    workers = min(workers, len(infos))
+    groups = [[] for i in range(workers)]
+    sizes = [0] * workers
+    for info in sorted(infos, key=lambda info: -info.compress_size):
+        i = sizes.index(min(sizes))
+        groups[i].append(info.filename)
+        sizes[i] += info.compress_size
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        for future in [executor.submit(_unzip_members, input_filename,
+                                       extract_dir, names)
+                       for names in groups]:
+            future.result()
+
+def _gzip_chunk(data):
+    return gzip.compress(data, mtime=0)
+
+class _ParallelCompressedFile(object):
+    """
+    Write-only file object compressing the written data by chunks in a pool
+    of processes. Each chunk is an independent compressed stream: gzip and
+    bz2 readers read their concatenation as a single stream.
+    """
 
-def pack_tar(output_filename, sources, type='gz'):
+    def __init__(self, fileobj, compress, executor, max_pending):
+        self.fileobj = fileobj
+        self.compress = compress
+        self.executor = executor
+        self.max_pending = max_pending
+        self.pending = collections.deque()
+        self.buffer = []
+        self.buffer_size = 0
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        self.buffer_size += len(data)
+        if self.buffer_size >= compress_chunk_size:
+            self._submit()
+        return len(data)
+
+    def _submit(self):
+        chunk = b''.join(self.buffer)
+        self.buffer = []
+        self.buffer_size = 0
+        self.pending.append(self.executor.submit(self.compress, chunk))
+        # write compressed chunks in order, keeping a bounded number of
+        # chunks in memory
+        while len(self.pending) > self.max_pending \
+                or (self.pending and self.pending[0].done()):
+            self.fileobj.write(self.pending.popleft().result())
+
+    def close(self):
+        if self.buffer_size:
+            self._submit()
+        while self.pending:
+            self.fileobj.write(self.pending.popleft().result())
+
+def pack_tar(output_filename, sources, type='gz', workers=None):
     """
     Creates a tar archive in output_filename from the source_dir directory.
+
+    With gz or bz2 compression, the tar stream is compressed by chunks in
+    parallel by workers processes (default: :func:`os.cpu_count`), 1 means
+    no worker process.
     """
     if type == 'tgz':
         type = 'gz'
     elif type == 'tar':
         type = ''
-    tar_ds = tarfile.open(output_filename, 'w:' + type)
     if not isinstance(sources, (list, tuple)) and \
        isinstance(sources, str):
         sources = [sources]
-    for source in sources:
-        tar_ds.add(source, arcname=os.path.basename(source))
-    tar_ds.close()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    compress = {'gz': _gzip_chunk, 'bz2': bz2.compress}.get(type)
+    if workers <= 1 or compress is None:
+        tar_ds = tarfile.open(output_filename, 'w:' + type)
+        for source in sources:
+            tar_ds.add(source, arcname=os.path.basename(source))
+        tar_ds.close()
+        return
+    import concurrent.futures
+    with open(output_filename, 'wb') as f, \
+            concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        compressed = _ParallelCompressedFile(f, compress, executor,
+                                             workers * 2)
+        tar_ds = tarfile.open(fileobj=compressed, mode='w|')
+        for source in sources:
+            tar_ds.add(source, arcname=os.path.basename(source))
+        tar_ds.close()
+        compressed.close()
 
-def pack_zip(output_filename, sources):
+def pack_zip(output_filename, sources, workers=None):
     """
     Creates a zip archive in output_filename from the source_dir directory.
+
+    workers is accepted for consistency with :func:`pack_tar`, but files
+    are compressed by the calling process: :mod:`zipfile` has no public API
+    to write data compressed elsewhere.
     """
-    previous_dir = os.getcwd()
     if not isinstance(sources, (list, tuple)) and \
        isinstance(sources, str):
         sources = [sources]
-    zip_ds = zipfile.ZipFile(output_filename, 'w', zipfile.ZIP_DEFLATED)
+    # (file name, name in archive)
+    files = []
     for source in sources:
-        os.chdir(os.path.dirname(source))
+        source_dir = os.path.dirname(source)
         if os.path.isdir(source):
-            for root, dirs, files in os.walk(os.path.basename(source)):
-                for file in files:
-                    zip_ds.write(os.path.join(root, file))
+            for root, dirs, dir_files in os.walk(source):
+                for file in dir_files:
+                    filename = os.path.join(root, file)
+                    files.append((filename,
+                                  os.path.relpath(filename, source_dir)))
         else:
-            zip_ds.write(os.path.basename(source))
-    zip_ds.close()
-    os.chdir(previous_dir)
+            files.append((source, os.path.basename(source)))
+    with zipfile.ZipFile(output_filename, 'w', zipfile.ZIP_DEFLATED) \
+            as zip_ds:
+        for filename, arcname in files:
+            zip_ds.write(filename, arcname)
@@ -42,6 +42,13 @@ instance for identification) and "put back" the data on the file.
 '''
 __docformat__ = 'restructuredtext en'
 
+import bz2
+import collections
+import gzip
+import io
+import itertools
+import lzma
+
 #------------------------------------------------------------------------------
 
 
@@ -53,6 +60,11 @@ class BufferAndFile(object):
     that is "read" by all subsequent read access until it is empty. When the
     buffer is empty, reading is done directly on the attached file object.
 
+    The buffer is a list of chunks: pushing data back (:py:meth:`unread`) does
+    not copy the buffer, and reading a part of a chunk does not copy the rest
+    of the chunk. Data are ``bytes`` if the file is opened in binary mode and
+    ``str`` otherwise.
+
     Example::
 
       from soma.bufferandfile import BufferAndFile
@@ -72,14 +84,23 @@ class BufferAndFile(object):
 
     '''
 
-    def __init__(self, file_object):
+    def __init__(self, file_object, read_ahead=0):
         '''
         Create a file-like object that adds an :py:meth:`unread` method to an
         opened ``file_object``.
+
+        If ``read_ahead`` is not 0, reads on the file are done by blocks of at
+        least ``read_ahead`` bytes (or characters) and what is not returned is
+        kept in the buffer. This makes small reads cheaper on unbuffered
+        streams such as pipes.
         '''
         super(BufferAndFile, self).__init__()
-        self.__buffer = ''
+        # chunks are [data, start] lists where data[start:] is not read yet
+        self.__chunks = collections.deque()
+        self.__size = 0
         self.__file = file_object
+        self.__empty = _empty_data(file_object)
+        self.read_ahead = read_ahead
         self.name = getattr(file_object, 'name', '<unknown>')
 
     def unread(self, string_value):
@@ -87,7 +108,9 @@ class BufferAndFile(object):
         Adds data at the beginning of the internal buffer. Data in the internal
         buffer will be returned by all subsequent read access until the buffer is empty.
         '''
-        self.__buffer = string_value + self.__buffer
+        if string_value:
+            self.__chunks.appendleft([string_value, 0])
+            self.__size += len(string_value)
 
     def change_file(self, file_object):
         '''
@@ -100,54 +123,151 @@ class BufferAndFile(object):
         Return a new L{BufferAndFile} instance with the same internale buffer and
         the same internal file object as C{self}.
         '''
-        result = BufferAndFile(self.__file)
-        result.__buffer = self.__buffer
+        result = BufferAndFile(self.__file, self.read_ahead)
+        result.__chunks = collections.deque(
+            [chunk[:] for chunk in self.__chunks])
+        result.__size = self.__size
+        result.__empty = self.__empty
+        return result
+
+    def buffered(self):
+        '''
+        Number of bytes (or characters) in the internal buffer.
+        '''
+        return self.__size
+
+    def _fill(self, size):
+        # read at least size bytes (or characters) from the file at the end
+        # of the buffer, return the number of read items (0 at end of file)
+        data = self.__file.read(max(size, self.read_ahead))
+        if data:
+            self.__chunks.append([data, 0])
+            self.__size += len(data)
+        return len(data)
+
+    def _take(self, size):
+        # remove size items from the beginning of the buffer and return them
+        chunks = self.__chunks
+        parts = []
+        self.__size -= size
+        while size > 0:
+            chunk = chunks[0]
+            data, start = chunk
+            end = start + size
+            if end >= len(data):
+                chunks.popleft()
+                parts.append(data[start:] if start else data)
+                size = end - len(data)
+            else:
+                parts.append(data[start:end])
+                chunk[1] = end
+                size = 0
+        if len(parts) == 1:
+            return parts[0]
+        return self.__empty.join(parts)
+
+    def peek(self, size):
+        '''
+        Return at most ``size`` bytes (or characters) without consuming them:
+        subsequent reads return the same data. Less data is returned only at
+        the end of file.
+        '''
+        while self.__size < size:
+            if not self._fill(size - self.__size):
+                break
+        result = self._take(min(size, self.__size))
+        self.unread(result)
         return result
 
     def read(self, size=None):
         '''
         Read the file
         '''
-        if size is None:
-            result = self.__buffer + self.__file.read()
+        if size is None or size < 0:
+            result = self._take(self.__size)
+            data = self.__file.read()
         else:
-            buffer_size = len(self.__buffer)
+            buffer_size = self.__size
             if buffer_size >= size:
-                result = self.__buffer[:size]
-                self.__buffer = self.__buffer[size:]
+                return self._take(size)
+            if self.read_ahead > size - buffer_size:
+                self._fill(size - buffer_size)
+                return self._take(min(size, self.__size))
+            result = self._take(buffer_size)
+            data = self.__file.read(size - buffer_size)
+        if not result:
+            return data
+        return result + data
+
+    def readinto(self, b):
+        '''
+        Read data into a pre-allocated writable bytes-like object (binary
+        files only) and return the number of bytes read. Buffered data are
+        copied without intermediate objects, the rest is read directly into
+        ``b`` when the file has a ``readinto`` method.
+        '''
+        view = memoryview(b).cast('B')
+        size = len(view)
+        n = 0
+        chunks = self.__chunks
+        while chunks and n < size:
+            chunk = chunks[0]
+            data, start = chunk
+            count = min(len(data) - start, size - n)
+            view[n:n + count] = memoryview(data)[start:start + count]
+            n += count
+            self.__size -= count
+            if start + count == len(data):
+                chunks.popleft()
             else:
-                result = self.__buffer + self.__file.read(size - buffer_size)
-                self.__buffer = ''
-        return result
+                chunk[1] = start + count
+        if n < size:
+            readinto = getattr(self.__file, 'readinto', None)
+            if readinto is not None:
+                n += readinto(view[n:]) or 0
+            else:
+                data = self.__file.read(size - n)
+                view[n:n + len(data)] = data
+                n += len(data)
+        return n
 
     def readline(self, size=None):
         '''
         Read one text line
         '''
-        buffer_eol = self.__buffer.find('\n')
+        if size is not None and size < 0:
+            size = None
+        if size == 0:
+            return self.__empty
+        newline = '\n' if isinstance(self.__empty, str) else b'\n'
+        # look for the end of line in the buffer, reading ahead if needed
+        length = 0
+        searched = 0
+        while True:
+            for data, start in itertools.islice(self.__chunks, searched,
+                                                None):
+                eol = data.find(newline, start)
+                if eol >= 0:
+                    length += eol + 1 - start
+                    if size is not None:
+                        length = min(length, size)
+                    return self._take(length)
+                length += len(data) - start
+                if size is not None and length >= size:
+                    return self._take(size)
+            searched = len(self.__chunks)
+            if not self.read_ahead:
+                break
+            if not self._fill(self.read_ahead):
+                return self._take(self.__size)
+        result = self._take(self.__size)
         if size is None:
-            if buffer_eol < 0:
-                result = self.__buffer + self.__file.readline()
-                self.__buffer = ''
-            else:
-                buffer_eol += 1
-                result = self.__buffer[:buffer_eol]
-                self.__buffer = self.__buffer[buffer_eol:]
+            data = self.__file.readline()
         else:
-            if buffer_eol < 0:
-                buffer_size = len(self.__buffer)
-                if buffer_size >= size:
-                    result = self.__buffer[:size]
-                    self.__buffer = self.__buffer[size:]
-                else:
-                    result = self.__buffer + \
-                        self.__file.readline(size - buffer_size)
-                    self.__buffer = ''
-            else:
-                size = min(size, buffer_eol + 1)
-                result = self.__buffer[:size]
-                self.__buffer = self.__buffer[size:]
-        return result
+            data = self.__file.readline(size - len(result))
+        if not result:
+            return data
+        return result + data
 
     def __iter__(self):
         '''
@@ -163,12 +283,27 @@ class BufferAndFile(object):
         if not line:
             raise StopIteration
         return line
+    __next__ = next
+
+    def close(self):
+        '''
+        Close the internal file object
+        '''
+        self.__chunks.clear()
+        self.__size = 0
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def tell(self):
         '''
         Position in file
         '''
-        return self.__file.tell() - len(self.__buffer)
+        return self.__file.tell() - self.__size
 
     def seek(self, offset, whence=0):
         '''
@@ -178,15 +313,17 @@ class BufferAndFile(object):
         internal buffer is taken into account.
         '''
         if whence == 2 or whence == 0 or offset < 0:
-            self.__buffer = ''
+            self.__chunks.clear()
+            self.__size = 0
             return self.__file.seek(offset, whence)
         else:
-            buflen = len(self.__buffer)
+            buflen = self.__size
             if offset > buflen:
-                self.__buffer = ''
+                self.__chunks.clear()
+                self.__size = 0
                 return self.__file.seek(offset - buflen, whence)
             else:
-                self.__buffer = self.__buffer[offset:]
+                self._take(offset)
 
     def open(*args, **kwargs):
         '''
@@ -195,3 +332,185 @@ class BufferAndFile(object):
         '''
         return BufferAndFile(open(*args, **kwargs))
     open = staticmethod(open)
+
+
+def _empty_data(file_object):
+    '''
+    Return ``b''`` if file_object is a binary file and ``''`` otherwise.
+    '''
+    if isinstance(file_object, io.TextIOBase):
+        return ''
+    if isinstance(file_object, (io.BufferedIOBase, io.RawIOBase)):
+        return b''
+    if 'b' in getattr(file_object, 'mode', ''):
+        return b''
+    return ''
+
+
+#------------------------------------------------------------------------------
+# Format identification
+
+class _WrapperOwner(object):
+
+    '''
+    Mixin for decompressed file objects: closing them also closes the
+    compressed file object they read.
+    '''
+
+    def close(self):
+        try:
+            super(_WrapperOwner, self).close()
+        finally:
+            self._wrapped.close()
+
+
+class _GzipFile(_WrapperOwner, gzip.GzipFile):
+
+    def __init__(self, file_object):
+        self._wrapped = file_object
+        gzip.GzipFile.__init__(self, fileobj=file_object, mode='rb')
+
+
+class _BZ2File(_WrapperOwner, bz2.BZ2File):
+
+    def __init__(self, file_object):
+        self._wrapped = file_object
+        bz2.BZ2File.__init__(self, file_object)
+
+
+class _LZMAFile(_WrapperOwner, lzma.LZMAFile):
+
+    def __init__(self, file_object):
+        self._wrapped = file_object
+        lzma.LZMAFile.__init__(self, file_object)
+
+
+_compressions = [('gzip', b'\x1f\x8b', _GzipFile),
+                 ('bz2', b'BZh', _BZ2File),
+                 ('xz', b'\xfd7zXZ\x00', _LZMAFile)]
+_formats = []
+
+
+def register_compression(name, magic, opener):
+    '''
+    Register a compression format used by :func:`identify`.
+
+    Parameters
+    ----------
+    name: str
+        name of the compression
+    magic: bytes
+        bytes at the beginning of compressed files
+    opener: callable
+        called with a binary file object positioned at the beginning of the
+        compressed data, it returns a binary file object giving the
+        decompressed data. Closing this object must close the compressed
+        file object.
+    '''
+    _compressions.insert(0, (name, magic, opener))
+
+
+def register_format(name, detector, offset=0):
+    '''
+    Register a file format identified by :func:`identify`. Formats
+    registered last are checked first.
+
+    Parameters
+    ----------
+    name: str
+        name of the format
+    detector: bytes or callable
+        either the magic bytes found at the given offset in the files of this
+        format, or a function called with the beginning of the (decompressed)
+        file (bytes) and returning True for files of this format.
+    offset: int
+        position of the magic bytes (only used if detector is bytes)
+    '''
+    if not callable(detector):
+        magic = detector
+
+        def detector(prefix):
+            return prefix.startswith(magic, offset)
+    _formats.insert(0, (name, detector))
+
+
+def find_compression(prefix):
+    '''
+    Return the pair (name, opener) of the registered compression (see
+    :func:`register_compression`) matching the beginning of a file, or
+    (None, None).
+    '''
+    for name, magic, opener in _compressions:
+        if prefix.startswith(magic):
+            return (name, opener)
+    return (None, None)
+
+
+def find_format(prefix):
+    '''
+    Return the name of the registered format (see :func:`register_format`)
+    matching the beginning of a file, or None.
+    '''
+    for name, detector in _formats:
+        if detector(prefix):
+            return name
+    return None
+
+
+def identify(source, prefix_size=1024):
+    '''
+    Identify the format of a file by looking at its first bytes only once.
+    Compressed files are transparently decompressed, even if source cannot
+    be seeked (a pipe for instance).
+
+    Example::
+
+      from soma.bufferandfile import identify
+
+      format, compressions, stream = identify('/tmp/data.tar.gz')
+      # format == 'tar', compressions == ['gzip']
+      with stream:
+          data = stream.read()
+
+    Parameters
+    ----------
+    source: str or file object
+        file name or binary file object (possibly a binary
+        :py:class:`BufferAndFile`)
+    prefix_size: int
+        number of bytes given to the format detectors
+
+    Returns
+    -------
+    format: str or None
+        name of the registered format (see :func:`register_format`) or None
+    compressions: list
+        names of the compressions (see :func:`register_compression`), the
+        outermost first
+    stream: :py:class:`BufferAndFile`
+        binary stream positioned at the beginning of the decompressed data.
+        It is opened by this function if source is a file name, otherwise
+        closing it closes source.
+    '''
+    if not hasattr(source, 'read'):
+        source = open(source, 'rb')
+    if isinstance(source, BufferAndFile):
+        stream = source
+    else:
+        stream = BufferAndFile(source)
+    compressions = []
+    while True:
+        prefix = stream.peek(prefix_size)
+        name, opener = find_compression(prefix)
+        if name is None:
+            break
+        compressions.append(name)
+        stream = BufferAndFile(opener(stream))
+    return (find_format(prefix), compressions, stream)
+
+
+register_format('xml', b'<?xml')
+register_format('hdf5', b'\x89HDF\r\n\x1a\n')
+register_format('png', b'\x89PNG\r\n\x1a\n')
+register_format('zip', b'PK\x03\x04')
+register_format('tar', b'ustar', offset=257)
@@ -7,8 +7,30 @@
 # for details.
 #
 
-from .controller import (Controller,
-                         OpenKeyController,
-                         ControllerTrait,
-                         controller_to_dict)
-from .trait_utils import trait_ids
+# The names below are imported on first access (PEP 562): importing
+# soma.controller.controller imports traits and installs the controllers JSON
+# encoder and decoder, submodules such as soma.controller.factory do not need
+# them.
+_lazy_names = {
+    'Controller': 'controller',
+    'OpenKeyController': 'controller',
+    'ControllerTrait': 'controller',
+    'controller_to_dict': 'controller',
+    'trait_ids': 'trait_utils',
+}
+
+__all__ = list(_lazy_names)
+
+
+def __getattr__(name):
+    from soma import _import_submodule
+    module = _lazy_names.get(name)
+    if module is None:
+        return _import_submodule(__name__, name)
+    value = getattr(_import_submodule(__name__, module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
@@ -10,6 +10,7 @@
 # System import
 from __future__ import absolute_import
 import logging
+import re
 import six
 import sys
 
@@ -26,6 +27,16 @@ from soma.sorted_dictionary import SortedDictionary, OrderedDict
 from soma.controller.trait_utils import _type_to_trait_id
 
 
+if sys.version_info >= (3, 7):
+    # builtin dicts keep insertion order, and are lighter than OrderedDict
+    _light_ordered_dict = dict
+else:
+    _light_ordered_dict = OrderedDict
+
+# trait names which designate a single trait in on_trait_change()
+_simple_trait_name = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
 class Controller(HasTraits):
 
     """ A Controller contains some traits: attributes typing and observer
@@ -409,9 +420,14 @@ class Controller(HasTraits):
                                     traits.List(traits.Str(), default=[],
                                                 hidden=True))
                 trait = self.trait('protected_parameters')
-            if trait is None and not isinstance(self, OpenKeyController):
-                raise KeyError(
-                    "item %s is not a trait in the Controller" % trait_name)
+            if trait is None:
+                if not isinstance(self, OpenKeyController):
+                    raise KeyError(
+                        "item %s is not a trait in the Controller"
+                        % trait_name)
+                # new item, or compact item without a trait
+                setattr(self, trait_name, value)
+                continue
             if isinstance(trait.trait_type, Instance) \
                     and issubclass(trait.trait_type.klass, Controller):
                 controller = trait.trait_type.create_default_value(
@@ -561,6 +577,24 @@ class OpenKeyController(Controller):
     >>> del dict_controller.my_item
     >>> print(dict_controller.export_to_dict())
     {}
+
+    In "compact" mode, new items do not get their own trait: their values
+    are validated by the single value trait and stored directly in the
+    instance dictionary. This is much lighter when the controller is used as
+    a generic key/value container holding many items. Real traits are only
+    created when they are actually needed, that is when
+    :meth:`user_traits` is called (typically to build a GUI), or when a
+    listener is registered on an item using :meth:`on_trait_change`. They
+    may also be created explicitly using :meth:`materialize_trait` or
+    :meth:`materialize_traits`.
+
+    >>> dict_controller = OpenKeyController(value_trait=traits.Str(),
+    ...                                     compact=True)
+    >>> dict_controller.my_item = 'bubulle'
+    >>> print(dict_controller.trait('my_item'))
+    None
+    >>> print(dict_controller.export_to_dict())
+    {'my_item': 'bubulle'}
     """
     _reserved_names = set(['trait_added'])
 
@@ -571,20 +605,55 @@ class OpenKeyController(Controller):
         ----------
         value_trait: Trait instance (optional, default: Any())
             trait type to be used when creating traits on the fly
+        compact: bool (optional keyword argument, default: False)
+            if True, items values are stored without creating a trait for
+            each of them, until traits are explicitly needed.
         """
+        compact = kwargs.pop('compact', False)
         super(OpenKeyController, self).__init__(*args, **kwargs)
         super(OpenKeyController, self).__setattr__('_value_trait', value_trait)
+        self._init_compact_storage(compact)
+
+    def _init_compact_storage(self, compact):
+        if compact:
+            # names of items which do not have a trait (yet). Values are
+            # stored in the instance __dict__.
+            compact_keys = _light_ordered_dict()
+            compact_trait = self._clone_trait(self._value_trait)
+        else:
+            compact_keys = None
+            compact_trait = None
+        super(OpenKeyController, self).__setattr__('_compact_keys',
+                                                   compact_keys)
+        super(OpenKeyController, self).__setattr__('_compact_trait',
+                                                   compact_trait)
 
     def __setattr__(self, name, value):
+        compact_keys = self.__dict__.get('_compact_keys')
+        if compact_keys is not None and name in compact_keys:
+            self.__dict__[name] = self._compact_trait.validate(
+                self, name, value)
+            return
+        # self.traits() would be O(n) here since it scans self.__dict__
         if not name.startswith('_') and name not in self.__dict__ \
-                and name not in self.traits() \
+                and name not in self._instance_traits() \
+                and name not in self.__base_traits__ \
                 and not name in OpenKeyController._reserved_names:
+            if compact_keys is not None:
+                self.__dict__[name] = self._compact_trait.validate(
+                    self, name, value)
+                compact_keys[name] = None
+                return
             cloned_trait = self._clone_trait(self._value_trait)
             self.add_trait(name, cloned_trait)
         super(OpenKeyController, self).__setattr__(name, value)
 
     def __delattr__(self, name):
-        if self.trait(name):
+        compact_keys = self.__dict__.get('_compact_keys')
+        if compact_keys is not None and name in compact_keys:
+            del compact_keys[name]
+            del self.__dict__[name]
+        elif self.trait(name):
             self.remove_trait(name)
         else:
             super(OpenKeyController, self).__delattr__(name)
@@ -592,6 +661,127 @@ class OpenKeyController(Controller):
     def __getinitargs__(self):
         return (self._value_trait, )
 
+    def is_compact(self):
+        """ Tells whether the controller stores new items in compact mode
+
+        A compact controller stops using the compact mode as soon as a
+        listener is registered on all its traits (see
+        :meth:`on_trait_change`).
+        """
+        return self.__dict__.get('_compact_keys') is not None
+
+    def materialize_trait(self, name):
+        """ Create a real trait for an item stored in compact mode.
+
+        Does nothing if the item already has a trait.
+
+        Parameters
+        ----------
+        name: str (mandatory)
+            the item name.
+        """
+        compact_keys = self.__dict__.get('_compact_keys')
+        if compact_keys is None or name not in compact_keys:
+            return
+        del compact_keys[name]
+        value = self.__dict__.pop(name)
+        self.add_trait(name, self._clone_trait(self._value_trait))
+        super(OpenKeyController, self).__setattr__(name, value)
+
+    def materialize_traits(self):
+        """ Create real traits for all items stored in compact mode.
+        """
+        compact_keys = self.__dict__.get('_compact_keys')
+        if compact_keys:
+            for name in list(compact_keys):
+                self.materialize_trait(name)
+
+    def user_traits(self):
+        """ Method to access the user parameters.
+
+        In compact mode, traits are created for all items before returning.
+
+        Returns
+        -------
+        out: dict
+            a dictionary containing class traits and instance traits
+            defined by user (i.e.  the traits that are not automatically
+            defined by HasTraits or Controller). Returned values are
+            sorted according to the 'order' trait meta-attribute.
+        """
+        self.materialize_traits()
+        return self._user_traits
+
+    def on_trait_change(self, handler, name=None, remove=False, *args,
+                        **kwargs):
+        """ Same as :meth:`HasTraits.on_trait_change`, but makes sure the
+        watched items have a real trait in compact mode.
+
+        Listening to all traits (name is None or "anytrait"), or to
+        "user_traits_changed", leaves the compact mode: all items get a real
+        trait, and so will new items.
+        """
+        if not remove and self.__dict__.get('_compact_keys') is not None:
+            if isinstance(name, six.string_types) \
+                    and _simple_trait_name.match(name) \
+                    and name not in ('anytrait', 'user_traits_changed'):
+                self.materialize_trait(name)
+            else:
+                self.materialize_traits()
+                super(OpenKeyController, self).__setattr__('_compact_keys',
+                                                           None)
+        super(OpenKeyController, self).on_trait_change(handler, name, remove,
+                                                       *args, **kwargs)
+
+    on_trait_event = on_trait_change
+
+    def copy(self, with_values=True):
+        """ Copy traits definitions to a new Controller object
+
+        In compact mode, items without traits are copied without creating
+        traits for them.
+
+        Parameters
+        ----------
+        with_values: bool (optional, default: False)
+            if True, traits values will be copied, otherwise the default trait
+            value will be left in the copy.
+
+        Returns
+        -------
+        copied: Controller instance
+            the returned copy will have the same class as the copied object
+            (which may be a derived class from Controller). Traits definitions
+            will be copied. Traits values will only be copied if with_values is
+            True.
+        """
+        compact_keys = self._compact_keys
+        if not compact_keys:
+            copied = super(OpenKeyController, self).copy(
+                with_values=with_values)
+            # copy the current mode: a controller which has left the compact
+            # mode keeps its _compact_trait but has no _compact_keys
+            if compact_keys is not None:
+                copied._init_compact_storage(True)
+            return copied
+        # hide compact items while the base class copies the traits
+        super(OpenKeyController, self).__setattr__('_compact_keys', None)
+        try:
+            copied = super(OpenKeyController, self).copy(
+                with_values=with_values)
+        finally:
+            super(OpenKeyController, self).__setattr__('_compact_keys',
+                                                       compact_keys)
+        copied._init_compact_storage(True)
+        if with_values:
+            for name in compact_keys:
+                setattr(copied, name, self.__dict__[name])
+        else:
+            default = self._compact_trait.default
+            for name in compact_keys:
+                setattr(copied, name, default)
+        return copied
+
     # this specialization does not do anything more than the base class does.
     #def copy(self, with_values=True):
         #""" Copy traits definitions to a new Controller object
@@ -663,7 +853,15 @@ class ControllerTrait(TraitType):
         if not hasattr(value, 'items'):
             raise TraitError('trait must be a Controller or a mapping type')
         new_value = getattr(object, name).copy(with_values=False)
-        if self.inner_trait:
+        if isinstance(new_value, OpenKeyController) \
+                and new_value.is_compact():
+            # compact items are created by import_from_dict() without
+            # traits: only remove the obsolete ones
+            for key in list(new_value._compact_keys) \
+                    + list(new_value._user_traits):
+                if key not in value:
+                    delattr(new_value, key)
+        elif self.inner_trait:
             for key in new_value.user_traits():
                 if key not in value:
                     new_value.remove_trait(key)
@@ -706,8 +904,18 @@ def controller_to_dict(item, exclude_undefined=False,
     """
     if isinstance(item, Controller):
         result = dict_class()
-        for name, trait in six.iteritems(item.user_traits()):
-            if exclude_transient and trait.transient:
+        if isinstance(item, OpenKeyController) and item.is_compact():
+            # don't materialize traits of compact items: they all share the
+            # same value trait
+            compact_transient = item._compact_trait.transient
+            items = [(name, trait.transient)
+                     for name, trait in six.iteritems(item._user_traits)] \
+                + [(name, compact_transient) for name in item._compact_keys]
+        else:
+            items = [(name, trait.transient)
+                     for name, trait in six.iteritems(item.user_traits())]
+        for name, transient in items:
+            if exclude_transient and transient:
                 continue
             value = getattr(item, name)
             if (exclude_undefined and value is Undefined) \
@@ -128,6 +128,72 @@ class TestController(unittest.TestCase):
             "driver: a legal value (['ControllerTrait'] - mandatory)")
         self.assertEqual(manhelp[1], "    the guy who would better take a bus")
 
+    def test_compact_open_key_controller(self):
+        c = OpenKeyController(traits.Str(), compact=True)
+        c.exhaust = 'smoking'
+        c.windshield = 'cracked'
+        self.assertTrue(c.is_compact())
+        self.assertEqual(c.exhaust, 'smoking')
+        self.assertTrue(c.trait('exhaust') is None)
+        self.assertEqual(c.export_to_dict(),
+                         {'exhaust': 'smoking', 'windshield': 'cracked'})
+        self.assertRaises(traits.TraitError, setattr, c, 'fuel', 3.5)
+        self.assertRaises(traits.TraitError, setattr, c, 'exhaust', 3.5)
+        other = c.copy()
+        self.assertTrue(other.is_compact())
+        self.assertEqual(other.export_to_dict(), c.export_to_dict())
+
+        # listeners get a real trait
+        values = []
+        c.on_trait_change(lambda obj, name, value: values.append(value),
+                          'exhaust')
+        self.assertTrue(c.trait('exhaust') is not None)
+        self.assertTrue(c.trait('windshield') is None)
+        c.exhaust = 'clean'
+        self.assertEqual(values, ['clean'])
+        self.assertEqual(list(c.user_traits().keys()),
+                         ['exhaust', 'windshield'])
+        self.assertTrue(c.trait('windshield') is not None)
+        del c.exhaust
+        c.tyres = 'flat'
+        del c.tyres
+        self.assertEqual(c.export_to_dict(), {'windshield': 'cracked'})
+
+        class Car(Controller):
+            problems = ControllerTrait(OpenKeyController(traits.Str(),
+                                                         compact=True))
+
+        my_car = Car()
+        my_car.problems = {'exhaust': 'smoking', 'windshield': 'cracked'}
+        self.assertTrue(my_car.problems.is_compact())
+        my_car.problems = {'windshield': 'broken'}
+        self.assertEqual(my_car.export_to_dict(),
+                         {'problems': {'windshield': 'broken'}})
+
+        # listening to all traits leaves the compact mode
+        c = OpenKeyController(traits.Str(), compact=True)
+        c.a = 'x'
+        events = []
+        c.on_trait_change(lambda obj, name, value: events.append(name),
+                          'anytrait')
+        self.assertFalse(c.is_compact())
+        self.assertTrue(c.trait('a') is not None)
+        c.a = 'y'
+        c.b = 'z'
+        self.assertTrue('a' in events)
+        self.assertTrue('b' in events)
+        self.assertTrue('user_traits_changed' in events)
+        self.assertEqual(c.export_to_dict(), {'a': 'y', 'b': 'z'})
+        # a copy keeps the current mode
+        other = c.copy()
+        self.assertFalse(other.is_compact())
+        other.d = 'w'
+        self.assertTrue(other.trait('d') is not None)
+        self.assertEqual(other.export_to_dict(), {'a': 'y', 'b': 'z',
+                                                  'd': 'w'})
+        self.assertTrue(OpenKeyController(traits.Str(),
+                                          compact=True).copy().is_compact())
+
 
     def test_trait_utils1(self):
         """ Method to test if we can build a string description for a trait.
@@ -156,47 +156,56 @@ import os.path as osp
 import stat
 import time
 import re
-import pprint
-import sqlite3
 import json
 import six
 from six.moves import range
-try:
-    import bz2
-except ImportError:
-    bz2 = None
 
 from collections import OrderedDict
 
 
-try:
-    import yaml
+# yaml, bz2, sqlite3 and pprint are imported when they are used: importing
+# them takes longer than importing this module.
 
-    class json_reader(object):
+def _optional_module(name):
+    '''
+    Import and return a module, or None if it is not installed.
+    '''
+    try:
+        return __import__(name)
+    except ImportError:
+        return None
 
-        '''
-        This class has a single static method load that loads an
-        JSON file with two features not provided by all JSON readers:
 
-        - JSON syntax is extended. For instance comments are allowed.
-        - The order of elements in dictionaries can be preserved by
-          using parameter object_pairs_hook=OrderedDict (as in Python
-          2.7 JSON reader).
-        '''
-        @staticmethod
-        def load(stream, object_pairs_hook=dict):
-            class OrderedLoader(yaml.Loader):
-                pass
-
-            def construct_mapping(loader, node):
-                loader.flatten_mapping(node)
-                return object_pairs_hook(loader.construct_pairs(node))
-            OrderedLoader.add_constructor(
-                yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-                construct_mapping)
-            return yaml.load(stream, OrderedLoader)
-except ImportError:
-    import json as json_reader
+class json_reader(object):
+
+    '''
+    This class has a single static method load that loads an
+    JSON file with two features not provided by all JSON readers:
+
+    - JSON syntax is extended. For instance comments are allowed.
+    - The order of elements in dictionaries can be preserved by
+      using parameter object_pairs_hook=OrderedDict (as in Python
+      2.7 JSON reader).
+
+    The extended syntax needs the yaml module, the standard json reader is
+    used if it is not installed.
+    '''
+    @staticmethod
+    def load(stream, object_pairs_hook=dict):
+        yaml = _optional_module('yaml')
+        if yaml is None:
+            return json.load(stream, object_pairs_hook=object_pairs_hook)
+
+        class OrderedLoader(yaml.Loader):
+            pass
+
+        def construct_mapping(loader, node):
+            loader.flatten_mapping(node)
+            return object_pairs_hook(loader.construct_pairs(node))
+        OrderedLoader.add_constructor(
+            yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+            construct_mapping)
+        return yaml.load(stream, OrderedLoader)
 
 from soma.path import split_path
 
@@ -224,7 +233,7 @@ def read_json(file_name):
         with open(file_name, 'r') as f:
             return json_reader.load(f, object_pairs_hook=OrderedDict)
     except ValueError as e:
-        if json_reader.__name__ != 'yaml':
+        if _optional_module('yaml') is None:
             extra_msg = ' Check your python installation, and perhaps un a "pip install PyYAML" or "easy_install PyYAML"'
         else:
             extra_msg = ''
@@ -393,6 +402,7 @@ class DirectoriesCache(object):
         return self.directories.get(directory)
 
     def save(self, path):
+        bz2 = _optional_module('bz2')
         if bz2:
             f = bz2.BZ2File(path, 'w')
         else:
@@ -403,6 +413,7 @@ class DirectoriesCache(object):
     @classmethod
     def load(cls, path):
         result = cls()
+        bz2 = _optional_module('bz2')
         if bz2:
             try:
                 with bz2.BZ2File(path, 'r') as f:
@@ -844,9 +855,10 @@ class FileOrganizationModels(object):
                     self.rules.append([pattern, rule_attributes])
 
     def pprint(self, out=sys.stdout):
+        import pprint as _pprint
         for i in ('fom_names', 'attribute_definitions', 'formats', 'format_lists', 'shared_patterns', 'patterns', 'rules'):
             print('-' * 20, i, '-' * 20, file=out)
-            pprint.pprint(getattr(self, i), out)
+            _pprint.pprint(getattr(self, i), out)
 
 
 class PathToAttributes(object):
@@ -1075,6 +1087,7 @@ class AttributesToPaths(object):
         self.foms = foms
         self.selection = selection or {}
         self.directories = directories
+        import sqlite3
         self._db = sqlite3.connect(':memory:', check_same_thread=False)
         self._db.execute('PRAGMA journal_mode = OFF;')
         self._db.execute('PRAGMA synchronous = OFF;')
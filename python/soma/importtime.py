@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# SOMA - Copyright (C) CEA, 2015
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+#
+
+'''
+Report the import time of soma modules.
+
+Each module is imported in a new Python interpreter run with ``-X
+importtime``, so that the reported time is the cost paid by a program
+importing only this module. For each module, the report gives the total
+import time, the time spent in soma modules, and the most expensive
+external modules it imports directly (the ones worth importing lazily).
+
+Usage::
+
+    python -m soma.importtime [-r REPEAT] [-s {total,soma,name}] [module ...]
+
+Without module names, all the modules of the soma package are measured.
+'''
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import pkgutil
+import subprocess
+import sys
+
+
+def soma_modules(package='soma'):
+    '''
+    Return the names of the modules of a package and of its subpackages,
+    found in the file system (modules are not imported). Test modules are
+    not listed.
+    '''
+    module = sys.modules.get(package)
+    if module is None:
+        __import__(package)
+        module = sys.modules[package]
+    return _package_modules(package, module.__path__[0])
+
+
+def _package_modules(package, directory):
+    names = [package]
+    for info in pkgutil.iter_modules([directory]):
+        name = '%s.%s' % (package, info.name)
+        if info.name in ('tests', 'test') or info.name.startswith('test_') \
+                or info.name.startswith('benchmark_'):
+            continue
+        if info.ispkg:
+            names.extend(_package_modules(
+                name, os.path.join(directory, info.name)))
+        else:
+            names.append(name)
+    return names
+
+
+def parse_importtime(output):
+    '''
+    Parse the output of ``python -X importtime``.
+
+    Returns a list of ``(name, self_us, cumulative_us, parent)`` tuples, in
+    import order, where parent is the name of the module importing this one
+    (None for the modules imported by the main program).
+    '''
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        level = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(fields[0]), int(fields[1]), level))
+    # modules are listed after the modules they import: read backwards, a
+    # module parent is the last seen module with a lower level
+    result = []
+    stack = []
+    for name, self_us, cumulative_us, level in reversed(entries):
+        while stack and stack[-1][1] >= level:
+            stack.pop()
+        parent = stack[-1][0] if stack else None
+        result.append((name, self_us, cumulative_us, parent))
+        stack.append((name, level))
+    result.reverse()
+    return result
+
+
+def measure(module, repeat=1, python=None):
+    '''
+    Import module in a new interpreter and return a dictionary with the
+    import time (in microseconds) of the module (``total``), of the soma
+    modules it imports (``soma``) and the external modules imported
+    directly by soma modules (``external``: list of ``(name, cumulative)``
+    sorted by decreasing time). The best of repeat runs is kept.
+
+    Raises ImportError if the module cannot be imported.
+    '''
+    if python is None:
+        python = sys.executable
+    best = None
+    for i in range(repeat):
+        process = subprocess.run(
+            [python, '-X', 'importtime', '-c', 'import %s' % module],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        if process.returncode != 0:
+            error = [line for line in process.stderr.splitlines()
+                     if not line.startswith('import time:')]
+            raise ImportError(error[-1] if error else
+                              'cannot import %s' % module)
+        entries = parse_importtime(process.stderr)
+        total = max((e[2] for e in entries if e[0] == module), default=0)
+        soma_time = sum(e[1] for e in entries
+                        if e[0] == 'soma' or e[0].startswith('soma.'))
+        external = {}
+        for name, self_us, cumulative_us, parent in entries:
+            if (name == 'soma' or name.startswith('soma.')) or parent is None:
+                continue
+            if parent == 'soma' or parent.startswith('soma.'):
+                external[name] = external.get(name, 0) + cumulative_us
+        if best is None or total < best['total']:
+            best = {'total': total, 'soma': soma_time,
+                    'external': sorted(external.items(),
+                                       key=lambda item: -item[1])}
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m soma.importtime',
+        description='Report the import time of soma modules, each one '
+        'imported alone in a new interpreter.')
+    parser.add_argument('modules', nargs='*',
+                        help='modules to measure (default: all soma '
+                        'modules)')
+    parser.add_argument('-r', '--repeat', type=int, default=1,
+                        help='number of imports of each module, the best '
+                        'time is kept (default: %(default)s)')
+    parser.add_argument('-s', '--sort', choices=('total', 'soma', 'name'),
+                        default='total',
+                        help='sort key of the report (default: '
+                        '%(default)s)')
+    parser.add_argument('-e', '--external', type=int, default=3,
+                        help='number of external modules listed for each '
+                        'soma module (default: %(default)s)')
+    options = parser.parse_args(argv)
+
+    modules = options.modules or soma_modules()
+    results = []
+    errors = []
+    for module in modules:
+        try:
+            results.append((module, measure(module, options.repeat)))
+        except ImportError as e:
+            errors.append((module, str(e)))
+    if options.sort == 'name':
+        results.sort()
+    else:
+        results.sort(key=lambda item: -item[1][options.sort])
+
+    width = max([len(module) for module, result in results] + [6])
+    print('%-*s %10s %10s  %s' % (width, 'module', 'total ms', 'soma ms',
+                                  'main external imports (ms)'))
+    for module, result in results:
+        external = ', '.join('%s %.1f' % (name, cumulative / 1000.)
+                             for name, cumulative
+                             in result['external'][:options.external])
+        print('%-*s %10.1f %10.1f  %s' % (width, module,
+                                          result['total'] / 1000.,
+                                          result['soma'] / 1000., external))
+    for module, error in errors:
+        print('%-*s %21s  %s' % (width, module, 'not imported', error))
+
+
+if __name__ == '__main__':
+    main()
@@ -29,7 +29,6 @@ __version__ = "%s.%s.%s%s" % (version_major,
 CLASSIFIERS = ["Development Status :: 5 - Production/Stable",
                "Environment :: Console",
                "Operating System :: OS Independent",
-               "Programming Language :: Python :: 3.6",
                "Programming Language :: Python :: 3.7",
                "Programming Language :: Python :: 3.8",
                "Programming Language :: Python :: 3.9",
@@ -69,6 +68,8 @@ PLATFORMS = "OS Independent"
 ISRELEASE = version_extra == ''
 VERSION = __version__
 PROVIDES = ["soma-base"]
+# module __getattr__ (PEP 562) is used for lazy imports
+PYTHON_REQUIRES = ">=3.7"
 REQUIRES = [
     "six >= 1.13",
     "numpy",
@@ -35,15 +35,18 @@
 '''
 This module contains all the framework necessary to customize, read and
 write minf files. A minf file is composed of structured data saved in
-XML or Python format. The minf framework provides tools to read and write
+XML, binary or Python format. The minf framework provides tools to read and write
 minf files but also to customize the way Python objects are read an written.
 
 There are several submodules in this package but main functions and classes
 can be imported from :py:mod:`soma.minf.api`:
 
-- for reading minf files: :func:`iterateMinf`, :func:`readMinf`
+- for reading minf files: :func:`iterateMinf`, :func:`readMinf`,
+  :func:`readMinfItem`
 - for writing minf files: :func:`createMinfWriter`, :func:`writeMinf`
 - for customizing minf files: :func:`createReducerAndExpander`, :func:`registerClass`, :func:`registerClassAs`
+- for reading Python minf files without importing this module (in worker
+  processes for instance): :func:`soma.minf.python_reader.readPythonMinf`
 
 * author: Yann Cointepas
 * organization: NeuroSpin
@@ -53,15 +56,22 @@ from __future__ import print_function
 from __future__ import absolute_import
 __docformat__ = "restructuredtext en"
 
+import codecs
 import gzip
+import io
+import itertools
 import six
 import sys
 
 from soma.translation import translate as _
 from soma.minf.error import MinfError
-from soma.bufferandfile import BufferAndFile
+from soma.bufferandfile import BufferAndFile, find_compression, identify, \
+    register_format
+from soma.minf.binary_tags import binaryMinfMagic
 from soma.minf.reader import MinfReader
 from soma.minf.writer import MinfWriter
+from soma.minf.python_reader import parsePythonMinf, readPythonMinf, \
+    cachedPythonMinf, copyLiteral
 from soma.minf.tree import createReducerAndExpander, registerClass, \
     registerClassAs, createMinfExpander, \
     EndStructure, MinfReducer, MinfExpander, \
@@ -69,15 +79,21 @@ from soma.minf.tree import createReducerAndExpander, registerClass, \
 from soma.undefined import Undefined
 defaultReducer = MinfReducer.defaultReducer
 
+# minf files identification with soma.bufferandfile.identify()
+register_format('minf_python', b'attributes')
+register_format('minf_xml', lambda prefix: prefix.startswith(b'<?xml')
+                and b'<minf' in prefix)
+register_format('minf_binary', binaryMinfMagic)
+
 
 #------------------------------------------------------------------------------
 def minfFormat(source):
     '''
     Return a pair (format, reduction) identifying the minf format. If
     source is not a minf file, (None, None) is returned. Otherwise,
-    format is a string representing the format of the minf file: 'XML' or
-    'python'. reduction is the name of the reducer used to write the minf
-    file or None if format is 'python'.
+    format is a string representing the format of the minf file: 'XML',
+    'binary' or 'python'. reduction is the name of the reducer used to write
+    the minf file or None if format is 'python'.
 
     Example:
 
@@ -87,8 +103,8 @@ def minfFormat(source):
       format, reduction = minfFormat('/home/me/test.minf')
 
     If source is a :class:`BufferAndFile` instance, this call behave as if nothing
-    has been read from the file. This can be useful if you have an opened file
-    that cannot be seeked backward:
+    has been read from the file (unless it is compressed). This can be useful
+    if you have an opened file that cannot be seeked backward:
 
     Example:
 
@@ -109,47 +125,174 @@ def minfFormat(source):
       Input file name or file object. If it is a file name, it is
       opened with open(source).
     '''
-    opened_source_file = None
+    if _isTextSource(source):
+        return _textMinfFormat(source)
+    opened = not hasattr(source, 'readline')
+    if not opened and not isinstance(source, BufferAndFile):
+        source.seek(0)
+    # compressed files are decompressed, the beginning of the stream is
+    # only peeked
+    format, compressions, stream = identify(source)
     try:
-        if not hasattr(source, 'readline'):
-            if six.PY2:
-                opened_source_file = open(source)
-            else:
-                opened_source_file = open(source, encoding='UTF-8')
-
-            source = BufferAndFile(opened_source_file)
+        if format == 'minf_binary':
+            r = MinfReader.createReader('binary')
+            reduction, buffer = r.reduction(stream)
+            stream.unread(buffer)
+            return ('binary', reduction)
+        elif format == 'minf_python':
+            return ('python', None)
+        elif format in ('minf_xml', 'xml'):
+            return ('XML', _xmlMinfReduction(stream))
+        raise MinfError(_('Invalid minf file: %s') % (stream.name, ))
+    finally:
+        if opened:
+            stream.close()
         elif not isinstance(source, BufferAndFile):
             source.seek(0)
-            source = BufferAndFile(source)
 
-        # Check first non white character to see if the minf file is XML or not
-        start = source.read(5)
-        if start == 'attri':
-            source.unread(start)
-            return ('python', None)
-        elif start != '<?xml':
-            # Try gzip compressed file
-            gzipSource = source.clone()
-            gzipSource.unread(start)
-            gunzipSource = gzip.GzipFile(source.name)
-            try:
-                start = gunzipSource.read(5)
-            except IOError:
-                start = ''
-            if start != '<?xml':
-                raise MinfError(_('Invalid minf file: %s') % (source.name, ))
-            source.change_file(gunzipSource)
-            source.unread(start)
-        else:
-            source.unread(start)
 
+def _isTextSource(source):
+    '''
+    True if source is a file object (possibly a :class:`BufferAndFile`)
+    opened in text mode.
+    '''
+    if isinstance(source, BufferAndFile):
+        return isinstance(source.peek(0), six.text_type)
+    return isinstance(source, io.TextIOBase)
+
+
+def _xmlMinfReduction(stream):
+    '''
+    Return the reduction of a XML minf file, parsed in the beginning of a
+    binary :class:`BufferAndFile` which is not consumed.
+    '''
+    size = 4096
+    while True:
+        prefix = stream.peek(size)
         r = MinfReader.createReader('XML')
-        reduction, buffer = r.reduction(source)
-        source.unread(buffer)
-        return('XML', reduction)
-    finally:
-        if opened_source_file is not None:
-            opened_source_file.close()
+        reduction, buffer = r.reduction(
+            io.StringIO(prefix.decode('UTF-8', 'replace')))
+        if reduction is not None or len(prefix) < size:
+            return reduction
+        size *= 4
+
+
+def _textMinfFormat(source):
+    '''
+    Same as :func:`minfFormat` for a file object opened in text mode.
+    '''
+    binary_source, opened = _binaryMinfSource(source)
+    if binary_source is not None:
+        try:
+            r = MinfReader.createReader('binary')
+            reduction, buffer = r.reduction(binary_source)
+            return ('binary', reduction)
+        finally:
+            if opened:
+                binary_source.close()
+
+    if not isinstance(source, BufferAndFile):
+        source.seek(0)
+        source = BufferAndFile(source)
+
+    # Check first non white character to see if the minf file is XML or not
+    start = source.read(5)
+    if start == 'attri':
+        source.unread(start)
+        return ('python', None)
+    elif start != '<?xml':
+        # Try gzip compressed file
+        gzipSource = source.clone()
+        gzipSource.unread(start)
+        gunzipSource = gzip.GzipFile(source.name)
+        try:
+            start = gunzipSource.read(5)
+        except IOError:
+            start = ''
+        if start != '<?xml':
+            raise MinfError(_('Invalid minf file: %s') % (source.name, ))
+        source.change_file(gunzipSource)
+        source.unread(start)
+    else:
+        source.unread(start)
+
+    r = MinfReader.createReader('XML')
+    reduction, buffer = r.reduction(source)
+    source.unread(buffer)
+    return('XML', reduction)
+
+#------------------------------------------------------------------------------
+def _openMinfFile(fileName):
+    '''
+    Open a minf file in binary mode. If the file is compressed (see
+    :func:`soma.bufferandfile.register_compression`), the returned file
+    object gives access to the decompressed content. The file is opened
+    only once, whatever its format.
+    '''
+    return _openCompressedMinfFile(fileName)[0]
+
+
+def _openCompressedMinfFile(fileName):
+    '''
+    Same as :func:`_openMinfFile` but returns a pair (file, compression)
+    where compression is None for a file which is not compressed.
+    '''
+    rawFile = open(fileName, 'rb')
+    compression, opener = find_compression(rawFile.read(8))
+    rawFile.seek(0)
+    if opener is not None:
+        return (opener(rawFile), compression)
+    return (rawFile, None)
+
+
+#------------------------------------------------------------------------------
+def _binaryMinfSource(source):
+    '''
+    If source is a binary minf file, return a pair (binary_file, opened)
+    where binary_file is a binary file object positioned at the beginning of
+    the minf file and opened is True if the file has been opened by this
+    function (and therefore must be closed by the caller). Otherwise,
+    (None, False) is returned.
+    '''
+    if not hasattr(source, 'readline'):
+        binary_file = _openMinfFile(source)
+        if _binaryMinfSource(binary_file)[0] is not None:
+            return (binary_file, True)
+        binary_file.close()
+        return (None, False)
+    if isinstance(source, BufferAndFile):
+        # the buffered header is checked, nothing is consumed
+        try:
+            start = source.peek(len(binaryMinfMagic))
+        except UnicodeDecodeError:
+            start = None
+        if start == binaryMinfMagic:
+            return (source, False)
+        if start is None or start == binaryMinfMagic.decode('ascii'):
+            name = getattr(source, 'name', None)
+            if isinstance(name, six.string_types):
+                return _binaryMinfSource(name)
+        return (None, False)
+    try:
+        source.seek(0)
+        start = source.read(len(binaryMinfMagic))
+    except UnicodeDecodeError:
+        # binary content in a file opened in text mode
+        start = None
+    except (IOError, EOFError):
+        # invalid compressed content
+        start = None
+        if not isinstance(source, io.TextIOBase):
+            return (None, False)
+    if start == binaryMinfMagic:
+        source.seek(0)
+        return (source, False)
+    if start is None or start == binaryMinfMagic.decode('ascii'):
+        name = getattr(source, 'name', None)
+        if isinstance(name, six.string_types):
+            return _binaryMinfSource(name)
+    return (None, False)
+
 
 #------------------------------------------------------------------------------
 def _setTarget(target, source):
@@ -199,96 +342,156 @@ def iterateMinf(source, targets=None, stop_on_error=True, exceptions=[]):
 
     initial_source = source
 
-    if not hasattr(initial_source, 'readline') and not six.PY2:
-        # in python3 the encoding of a file should be specified when opening
-        # it: it cannot be changed afterwards. So in python3 we cannot read
-        # the encoding within the file (for instance in a XML file).
-        # This is completely silly, but here it is...
-        # So we just have to try several encodings...
-        try_encodings = ['UTF-8', 'latin1']
-    else:
-        try_encodings = [None]
-
-    for encoding in try_encodings:
-        opened_source_file = None
-        if not hasattr(initial_source, 'readline'):
-            if six.PY2:
-                opened_source_file = open(initial_source)
-            else:
-                opened_source_file = open(initial_source, encoding=encoding)
-            source = BufferAndFile(opened_source_file)
-        elif not isinstance(source, BufferAndFile):
-            source.seek(0)
-            source = BufferAndFile(source)
-
+    if not hasattr(initial_source, 'readline'):
+        # Python minf files already read and not modified are not read again
         try:
-            # Check first non white character to see if the minf file is XML or not
-            start = source.read(5)
-            source.unread(start)
-
-            if start == 'attri':
-                try:
-                    import numpy
-                    d = {'nan': numpy.nan}
-                except Exception:
-                    d = {'nan': None}
-                try:
-                    six.exec_(source.read().replace("\r\n", "\n"), d)
-                except Exception as e:
-                    x = source
-                    if hasattr(source, '_BufferAndFile__file'):
-                        x = source._BufferAndFile__file
-                    x = 'Error in iterateMinf while reading ' + str(x) + ': '
-                    # e.args = ( x + e.args[0], ) + e.args[1:]
-                    print(x)
-                    raise
-                minf = d['attributes']
-                if targets is not None:
-                    result = next(targets)
-                    _setTarget(result, minf)
-                    yield result
-                else:
-                    yield minf
-                return
-            elif start != '<?xml':
-                # Try gzip compressed file
-                gzSource = gzip.open(source.name, mode='rt', encoding=encoding)
-                if gzSource.read(5) != '<?xml':
-                    raise MinfError(_('Invalid minf file: %s')
-                                    % (source.name, ))
-                source = BufferAndFile(gzSource)
-                source.unread('<?xml')
-
-            r = MinfReader.createReader('XML')
-            iterator = r.nodeIterator(source)
-            minfNode = next(iterator)
-            expander = createMinfExpander(minfNode.attributes['reduction'])
-            count = 0
-            for nodeItem in iterator:
-                count += 1
-                if isinstance(nodeItem, EndStructure):
-                    break
-                target = None
-                if targets is not None:
-                    try:
-                        target = next(targets)
-                    except StopIteration:
-                        targets = None
-                yield expander.expand(iterator, nodeItem, target=target,
-                                      stop_on_error=stop_on_error,
-                                      exceptions=exceptions)
-        except UnicodeDecodeError as e:
-            if encoding == try_encodings[-1]:
-                raise
-            continue
-        finally:
+            minf = cachedPythonMinf(initial_source)
+        except (KeyError, EnvironmentError):
+            pass
+        else:
+            yield _pythonMinfResult(copyLiteral(minf), targets)
+            return
+
+    opened_source_file = None
+    compression = None
+    if not hasattr(initial_source, 'readline'):
+        # the file is opened once in binary mode (decompressed if needed)
+        opened_source_file, compression \
+            = _openCompressedMinfFile(initial_source)
+        source = opened_source_file
+    try:
+        binary_source, opened = _binaryMinfSource(source)
+        if binary_source is not None:
+            try:
+                r = MinfReader.createReader('binary')
+                for item in _expandMinfNodes(r.nodeIterator(binary_source),
+                                             targets, stop_on_error,
+                                             exceptions):
+                    yield item
+            finally:
+                if opened:
+                    binary_source.close()
+            return
+
+        if opened_source_file is not None:
+            # in python3 the encoding of a file should be specified when
+            # opening it: it cannot be changed afterwards. So in python3 we
+            # cannot read the encoding within the file (for instance in a XML
+            # file). This is completely silly, but here it is...
+            # So we just have to try several encodings...
+            try_encodings = ['UTF-8', 'latin1']
+        else:
+            try_encodings = [None]
+
+        for encoding in try_encodings:
+            text_file = None
             if opened_source_file is not None:
-                opened_source_file.close()
-        break # no error, don't process next encoding
+                opened_source_file.seek(0)
+                text_file = io.TextIOWrapper(opened_source_file,
+                                             encoding=encoding)
+                source = BufferAndFile(text_file)
+            elif not isinstance(source, BufferAndFile):
+                source.seek(0)
+                source = BufferAndFile(source)
+            elif not _isTextSource(source):
+                source = BufferAndFile(codecs.getreader('UTF-8')(source))
+
+            try:
+                # Check first non white character to see if the minf file is
+                # XML or not
+                start = source.read(5)
+                source.unread(start)
+
+                if start == 'attri':
+                    try:
+                        if opened_source_file is not None:
+                            # parse the (decompressed) opened file, the
+                            # cache is only used for uncompressed files
+                            opened_source_file.seek(0)
+                            if compression is None:
+                                minf = copyLiteral(readPythonMinf(
+                                    initial_source,
+                                    fileObject=opened_source_file))
+                            else:
+                                minf = parsePythonMinf(
+                                    opened_source_file.read(),
+                                    initial_source)
+                        else:
+                            minf = parsePythonMinf(source.read(), source.name)
+                    except Exception as e:
+                        x = source
+                        if hasattr(source, '_BufferAndFile__file'):
+                            x = source._BufferAndFile__file
+                        x = 'Error in iterateMinf while reading ' + str(x) \
+                            + ': '
+                        # e.args = ( x + e.args[0], ) + e.args[1:]
+                        print(x)
+                        raise
+                    yield _pythonMinfResult(minf, targets)
+                    return
+                elif start != '<?xml':
+                    if opened_source_file is not None:
+                        raise MinfError(_('Invalid minf file: %s')
+                                        % (source.name, ))
+                    # Try gzip compressed file
+                    gzSource = gzip.open(source.name, mode='rt',
+                                         encoding=encoding)
+                    if gzSource.read(5) != '<?xml':
+                        raise MinfError(_('Invalid minf file: %s')
+                                        % (source.name, ))
+                    source = BufferAndFile(gzSource)
+                    source.unread('<?xml')
+
+                r = MinfReader.createReader('XML')
+                for item in _expandMinfNodes(r.nodeIterator(source), targets,
+                                             stop_on_error, exceptions):
+                    yield item
+            except UnicodeDecodeError as e:
+                if encoding == try_encodings[-1]:
+                    raise
+                continue
+            finally:
+                if text_file is not None:
+                    # the binary file is kept open for the next encoding
+                    text_file.detach()
+            break # no error, don't process next encoding
+    finally:
+        if opened_source_file is not None:
+            opened_source_file.close()
+
+
+#------------------------------------------------------------------------------
+def _pythonMinfResult(minf, targets):
+    if targets is not None:
+        result = next(targets)
+        _setTarget(result, minf)
+        return result
+    return minf
+
 
 #------------------------------------------------------------------------------
+def _expandMinfNodes(iterator, targets, stop_on_error, exceptions):
+    '''
+    Expand the objects of a minf nodes iterator (as returned by
+    :meth:`MinfReader.nodeIterator`).
+    '''
+    minfNode = next(iterator)
+    expander = createMinfExpander(minfNode.attributes['reduction'])
+    for nodeItem in iterator:
+        if isinstance(nodeItem, EndStructure):
+            break
+        target = None
+        if targets is not None:
+            try:
+                target = next(targets)
+            except StopIteration:
+                targets = None
+        yield expander.expand(iterator, nodeItem, target=target,
+                              stop_on_error=stop_on_error,
+                              exceptions=exceptions)
 
 
+#------------------------------------------------------------------------------
 def readMinf(source, targets=None, stop_on_error=True, exceptions=[]):
     '''
     Entirerly reads a minf file and returns its content in a tuple.
@@ -302,7 +505,74 @@ def readMinf(source, targets=None, stop_on_error=True, exceptions=[]):
 
 
 #------------------------------------------------------------------------------
-def createMinfWriter(destFile, format='XML', reducer='minf_2.0'):
+def readMinfItem(source, index):
+    '''
+    Returns one object (or a list of objects if index is a slice) of a minf
+    file containing several objects. Binary minf files contain an index of
+    their objects that is used to read only the requested ones. With other
+    formats, the file is read sequentially until the requested objects
+    are found.
+
+    Example:
+
+    ::
+
+      from soma.minf.api import readMinfItem
+
+      last = readMinfItem('log.minf', -1)
+      first_ten = readMinfItem('log.minf', slice(0, 10))
+
+    Parameters
+    ----------
+    source: string
+      Input file name or file object (see :func:`iterateMinf`).
+    index: int or slice
+      position of the object(s) to read. Negative values are counted from
+      the end of the file.
+    '''
+    binary_source, opened = _binaryMinfSource(source)
+    if binary_source is not None:
+        try:
+            r = MinfReader.createReader('binary')
+            count = r.itemCount(binary_source)
+            if count is not None:
+                if isinstance(index, slice):
+                    indices = range(*index.indices(count))
+                else:
+                    if index < 0:
+                        index += count
+                    if index < 0 or index >= count:
+                        raise IndexError(_('minf item index out of range'))
+                    indices = [index]
+                result = []
+                for i in indices:
+                    result.extend(_expandMinfNodes(
+                        r.itemNodeIterator(binary_source, i, count),
+                        None, True, []))
+                if isinstance(index, slice):
+                    return result
+                return result[0]
+        finally:
+            if opened:
+                binary_source.close()
+
+    # no index: sequential reading
+    if isinstance(index, slice):
+        if index.stop is not None and index.stop >= 0 \
+                and (index.start or 0) >= 0 and (index.step or 1) > 0:
+            return list(itertools.islice(iterateMinf(source), index.start,
+                                         index.stop, index.step))
+        return list(iterateMinf(source))[index]
+    if index >= 0:
+        for item in itertools.islice(iterateMinf(source), index, None):
+            return item
+        raise IndexError(_('minf item index out of range'))
+    return readMinf(source)[index]
+
+
+#------------------------------------------------------------------------------
+def createMinfWriter(destFile, format='XML', reducer='minf_2.0',
+                     compression=None):
     '''
     Create a writer for storing objects in destFile.
     Example:
@@ -318,16 +588,20 @@ def createMinfWriter(destFile, format='XML', reducer='minf_2.0'):
     Parameters
     ----------
     format: string
-      name of the format to write.
+      name of the format to write: 'XML' or 'binary'.
     reducer: string
       name of the reducer to use (see L{soma.minf.tree} for
       more information about reducers).
+    compression: string
+      if not None, the written stream is compressed. Only 'gzip' is
+      currently supported. Compressed minf files are transparently read by
+      :func:`readMinf` and :func:`iterateMinf`.
     '''
-    return MinfWriter.createWriter(destFile, format, reducer)
+    return MinfWriter.createWriter(destFile, format, reducer, compression)
 
 
 #------------------------------------------------------------------------------
-def writeMinf(destFile, args, format='XML', reducer=None):
+def writeMinf(destFile, args, format='XML', reducer=None, compression=None):
     '''
     Creates a minf writer with :func:`createMinfWriter` and write the content
     of args in it.
@@ -342,6 +616,8 @@ def writeMinf(destFile, args, format='XML', reducer=None):
       see :func:`createMinfWriter`
     reducer:
       see :func:`createMinfWriter`
+    compression:
+      see :func:`createMinfWriter`
     '''
     it = iter(args)
     try:
@@ -354,7 +630,7 @@ def writeMinf(destFile, args, format='XML', reducer=None):
             if reducer is None:
                 reducer = 'minf_2.0'
 
-    writer = createMinfWriter(destFile, format, reducer)
+    writer = createMinfWriter(destFile, format, reducer, compression)
     if firstItem is not Undefined:
         writer.write(firstItem)
         for item in it:
@@ -363,10 +639,12 @@ def writeMinf(destFile, args, format='XML', reducer=None):
 
 
 #------------------------------------------------------------------------------
-# xml_reader and xml_writer are not used directly but importing
-# them register the XML minf format
+# xml_reader, xml_writer, binary_reader and binary_writer are not used
+# directly but importing them register the XML and binary minf formats
 import soma.minf.xml_reader
 import soma.minf.xml_writer
+import soma.minf.binary_reader
+import soma.minf.binary_writer
 
 
 #------------------------------------------------------------------------------
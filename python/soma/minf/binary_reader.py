@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+#  This software and supporting documentation are distributed by
+#      Institut Federatif de Recherche 49
+#      CEA/NeuroSpin, Batiment 145,
+#      91191 Gif-sur-Yvette cedex
+#      France
+#
+# This software is governed by the CeCILL-B license under
+# French law and abiding by the rules of distribution of free software.
+# You can  use, modify and/or redistribute the software under the
+# terms of the CeCILL-B license as circulated by CEA, CNRS
+# and INRIA at the following URL "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading,  using,  modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean  that it is complicated to manipulate,  and  that  also
+# therefore means  that it is reserved for developers  and  experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systems and/or
+# data to be ensured and,  more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-B license and that you accept its terms.
+
+
+'''
+Reading of binary minf format.
+
+* author: Yann Cointepas
+* organization: `NeuroSpin <http://www.neurospin.org>`_
+* license: `CeCILL B <http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html>`_
+'''
+from __future__ import absolute_import
+__docformat__ = "restructuredtext en"
+
+import array
+import struct
+import sys
+import six
+from soma.translation import translate as _
+from soma.minf.error import MinfError
+
+from soma.minf.reader import MinfReader
+from soma.minf.tree import minfStructure, listStructure, \
+    StartStructure, EndStructure, Reference
+from soma.minf.xhtml import XHTML
+
+# This module only contains a definition of binary tokens.
+# It is designed to allow "import *".
+from soma.minf.binary_tags import *
+
+_uint32 = struct.Struct('<I')
+_uint64 = struct.Struct('<Q')
+_int64 = struct.Struct('<q')
+_float64 = struct.Struct('<d')
+_arrayTypes = (intArrayType, floatArrayType)
+
+
+#------------------------------------------------------------------------------
+class ChunkedInput(object):
+
+    '''
+    Read a binary file by large chunks and give access to the bytes and
+    numbers it contains.
+    '''
+
+    def __init__(self, source, chunkSize=65536):
+        self.source = source
+        self.chunkSize = chunkSize
+        self.data = bytearray()
+        self.position = 0
+
+    def _fill(self, size):
+        chunks = [bytes(self.data[self.position:])]
+        missing = size - len(chunks[0])
+        while missing > 0:
+            chunk = self.source.read(max(missing, self.chunkSize))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            missing -= len(chunk)
+        self.data = bytearray(b''.join(chunks))
+        self.position = 0
+
+    def atEnd(self):
+        if self.position >= len(self.data):
+            self._fill(1)
+        return self.position >= len(self.data)
+
+    def read(self, size):
+        end = self.position + size
+        if end > len(self.data):
+            self._fill(size)
+            end = size
+            if end > len(self.data):
+                raise MinfError(_('Unexpected end of binary minf file'))
+        result = self.data[self.position:end]
+        self.position = end
+        return result
+
+    def byte(self):
+        if self.position >= len(self.data):
+            self._fill(1)
+            if not self.data:
+                raise MinfError(_('Unexpected end of binary minf file'))
+        result = self.data[self.position]
+        self.position += 1
+        return result
+
+    def unpack(self, structure):
+        if self.position + structure.size > len(self.data):
+            self._fill(structure.size)
+            if structure.size > len(self.data):
+                raise MinfError(_('Unexpected end of binary minf file'))
+        result = structure.unpack_from(self.data, self.position)[0]
+        self.position += structure.size
+        return result
+
+    def string(self):
+        return self.read(self.unpack(_uint32)).decode('utf-8')
+
+
+#------------------------------------------------------------------------------
+class MinfBinaryReader(MinfReader):
+
+    '''
+    Specialization of L{MinfReader} class for reading binary minf format.
+    '''
+    name = 'binary'
+
+    def _readHeader(self, input):
+        magic = input.read(len(binaryMinfMagic))
+        if magic != binaryMinfMagic:
+            raise MinfError(_('Invalid binary minf file'))
+        version = input.byte()
+        if version > binaryMinfVersion:
+            raise MinfError(_('Unsupported binary minf version: %d')
+                            % (version, ))
+        return input.string()
+
+    def reduction(self, source):
+        headerSize = len(binaryMinfMagic) + 1
+        buffer = source.read(headerSize + _uint32.size)
+        if len(buffer) < headerSize + _uint32.size \
+                or not buffer.startswith(binaryMinfMagic):
+            return (None, buffer)
+        name = source.read(_uint32.unpack_from(buffer, headerSize)[0])
+        return (name.decode('utf-8'), buffer + name)
+
+    def nodeIterator(self, source):
+        input = ChunkedInput(source)
+        yield StartStructure(minfStructure, reduction=self._readHeader(input))
+        for minfNode in self._iterateNodes(input):
+            yield minfNode
+
+    def itemCount(self, source):
+        '''
+        Return the number of top-level objects recorded in the index of a
+        binary minf file. Return None if source is not seekable or has no
+        index (for instance if it is not finished).
+        '''
+        trailerSize = _uint64.size + len(binaryIndexMagic)
+        try:
+            source.seek(-trailerSize, 2)
+        except (ValueError, IOError, OSError):
+            return None
+        trailer = source.read(trailerSize)
+        if len(trailer) != trailerSize \
+                or not trailer.endswith(binaryIndexMagic):
+            return None
+        return _uint64.unpack_from(trailer)[0]
+
+    def itemNodeIterator(self, source, index, count):
+        '''
+        Same as L{nodeIterator} but only iterates over the nodes of the
+        top-level object number C{index}. Its position is read from the
+        index of the file, therefore preceding objects are not parsed.
+        @param count: number of top-level objects as returned by
+          L{itemCount}.
+        '''
+        source.seek(-(_uint64.size * (count - index + 1) +
+                      len(binaryIndexMagic)), 2)
+        offset = _uint64.unpack(source.read(_uint64.size))[0]
+        source.seek(0)
+        reduction = self._readHeader(ChunkedInput(source, chunkSize=256))
+        source.seek(offset)
+        yield StartStructure(minfStructure, reduction=reduction)
+        depth = 0
+        for minfNode in self._iterateNodes(ChunkedInput(source)):
+            if isinstance(minfNode, StartStructure):
+                depth += 1
+            elif isinstance(minfNode, EndStructure):
+                depth -= 1
+            yield minfNode
+            if depth <= 0:
+                break
+        yield EndStructure(minfStructure)
+
+    def _iterateNodes(self, input):
+        while True:
+            if input.atEnd():
+                # Files may be read while not finished, therefore the
+                # closing token is missing.
+                yield EndStructure(minfStructure)
+                break
+            token = input.byte()
+            if token == stringToken:
+                yield input.string()
+            elif token == intToken:
+                yield input.unpack(_int64)
+            elif token == floatToken:
+                yield input.unpack(_float64)
+            elif token == startToken:
+                structureType = input.string()
+                if input.byte() & identifierFlag:
+                    identifier = input.string()
+                else:
+                    identifier = None
+                attributes = {}
+                for i in range(input.unpack(_uint32)):
+                    name = input.string()
+                    attributes[str(name)] = input.string()
+                yield StartStructure(structureType, identifier=identifier,
+                                     **attributes)
+            elif token == endToken:
+                structureType = input.string()
+                yield EndStructure(structureType)
+                if structureType == minfStructure:
+                    break
+            elif token == arrayToken:
+                typeCode = chr(input.byte())
+                if typeCode not in _arrayTypes:
+                    raise MinfError(_('Invalid array type in binary minf '
+                                      'file: %s') % (repr(typeCode), ))
+                length = input.unpack(_uint32)
+                values = array.array(typeCode)
+                data = bytes(input.read(length * values.itemsize))
+                if six.PY2:
+                    values.fromstring(data)
+                else:
+                    values.frombytes(data)
+                if sys.byteorder != 'little':
+                    values.byteswap()
+                yield StartStructure(listStructure,
+                                     length=six.text_type(length))
+                for value in values.tolist():
+                    yield value
+                yield EndStructure(listStructure)
+            elif token == noneToken:
+                yield None
+            elif token == trueToken:
+                yield True
+            elif token == falseToken:
+                yield False
+            elif token == longToken:
+                yield int(input.string())
+            elif token == referenceToken:
+                yield Reference(identifier=input.string())
+            elif token == xhtmlToken:
+                yield self._expandXHTML(input.string())
+            else:
+                raise MinfError(_('Invalid token in binary minf file: %d')
+                                % (token, ))
+
+    def _expandXHTML(self, xml):
+        xhtml = XHTML.buildFromHTML(xml)
+        if len(xhtml.content) == 1 and isinstance(xhtml.content[0], XHTML):
+            return xhtml.content[0]
+        return xhtml
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+#  This software and supporting documentation are distributed by
+#      Institut Federatif de Recherche 49
+#      CEA/NeuroSpin, Batiment 145,
+#      91191 Gif-sur-Yvette cedex
+#      France
+#
+# This software is governed by the CeCILL-B license under
+# French law and abiding by the rules of distribution of free software.
+# You can  use, modify and/or redistribute the software under the
+# terms of the CeCILL-B license as circulated by CEA, CNRS
+# and INRIA at the following URL "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading,  using,  modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean  that it is complicated to manipulate,  and  that  also
+# therefore means  that it is reserved for developers  and  experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systems and/or
+# data to be ensured and,  more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-B license and that you accept its terms.
+
+
+'''
+This module defines only "constants" containing the tokens used in binary
+minf format.
+
+A binary minf file starts with :data:`binaryMinfMagic`, a version byte and
+the name of the reduction. It is followed by a series of minf tree nodes,
+each one starting with a one byte token. Strings are stored as their UTF-8
+encoding preceded by their length (32 bits unsigned integer), all numbers
+are little endian.
+
+When the writer is closed, an index is appended after the end of the minf
+tree: the offsets (from the beginning of the file) of all top-level objects,
+the number of these objects and :data:`binaryIndexMagic`. All these numbers
+are 64 bits unsigned integers. The index allows to read any top-level object
+without parsing the preceding ones (see :func:`soma.minf.api.readMinfItem`).
+
+* author: Yann Cointepas
+* organization: `NeuroSpin <http://www.neurospin.org>`_
+* license: `CeCILL B <http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html>`_
+'''
+__docformat__ = "restructuredtext en"
+
+
+#: First bytes of any binary minf file
+binaryMinfMagic = b'MINF\x00'
+#: Version of the binary minf format
+binaryMinfVersion = 1
+#: Last bytes of a binary minf file containing an index of its top-level
+#: objects
+binaryIndexMagic = b'MINFIDX\x00'
+
+noneToken = ord('N')
+trueToken = ord('T')
+falseToken = ord('F')
+#: 64 bits signed integer
+intToken = ord('i')
+#: integer that does not fit in 64 bits, stored as a decimal string
+longToken = ord('I')
+#: 64 bits float
+floatToken = ord('f')
+stringToken = ord('s')
+#: XHTML value stored as an XML string
+xhtmlToken = ord('x')
+#: StartStructure: type, flags, [identifier], attributes count, attributes
+startToken = ord('(')
+#: EndStructure: type
+endToken = ord(')')
+referenceToken = ord('r')
+#: list of numbers: array type code, length, packed values
+arrayToken = ord('a')
+
+#: flag set in StartStructure when an identifier is present
+identifierFlag = 1
+
+#: array type codes (see :mod:`array`) used for packed numbers lists
+intArrayType = 'q'
+floatArrayType = 'd'
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+#  This software and supporting documentation are distributed by
+#      Institut Federatif de Recherche 49
+#      CEA/NeuroSpin, Batiment 145,
+#      91191 Gif-sur-Yvette cedex
+#      France
+#
+# This software is governed by the CeCILL-B license under
+# French law and abiding by the rules of distribution of free software.
+# You can  use, modify and/or redistribute the software under the
+# terms of the CeCILL-B license as circulated by CEA, CNRS
+# and INRIA at the following URL "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading,  using,  modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean  that it is complicated to manipulate,  and  that  also
+# therefore means  that it is reserved for developers  and  experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systems and/or
+# data to be ensured and,  more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-B license and that you accept its terms.
+
+
+'''
+Writing of binary minf format.
+
+* author: Yann Cointepas
+* organization: `NeuroSpin <http://www.neurospin.org>`_
+* license: `CeCILL B <http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html>`_
+'''
+from __future__ import absolute_import
+__docformat__ = "restructuredtext en"
+
+import array
+import io
+import struct
+import sys
+import six
+from soma.translation import translate as _
+from soma.minf.tree import createMinfReducer
+from soma.minf.writer import MinfWriter
+from soma.minf.tree import minfStructure, listStructure, \
+    StartStructure, EndStructure, Reference
+from soma.minf.error import MinfError
+from soma.minf.xhtml import XHTML
+
+# This module only contains a definition of binary tokens.
+# It is designed to allow "import *".
+from soma.minf.binary_tags import *
+
+_uint8 = struct.Struct('<B')
+_uint32 = struct.Struct('<I')
+_uint64 = struct.Struct('<Q')
+_int64 = struct.Struct('<q')
+_float64 = struct.Struct('<d')
+_int64Range = (-2 ** 63, 2 ** 63)
+#: types of the values that can be stored in packed arrays
+_packableTypes = frozenset((float, ) + six.integer_types)
+
+
+#------------------------------------------------------------------------------
+class MinfBinaryWriter(MinfWriter):
+
+    '''
+    Specialization of L{MinfWriter} class for writing binary minf format.
+    Lists containing only integers or only floats are stored as packed arrays.
+    '''
+
+    name = 'binary'
+    fileMode = 'wb'
+
+    def __init__(self, file, reducer):
+        if isinstance(file, io.TextIOBase):
+            # binary data cannot be written in text mode
+            buffer = getattr(file, 'buffer', None)
+            if buffer is None:
+                raise MinfError(_('Binary minf format cannot be written in '
+                                  'a text stream: %s') % (repr(file), ))
+            # text already written must come first
+            file.flush()
+            file = buffer
+        self.__file = file
+        self.reducer = createMinfReducer(reducer)
+        # number of bytes written in file and offsets of top-level objects
+        self._position = 0
+        self._offsets = []
+        self._buffer = bytearray(binaryMinfMagic)
+        self._buffer += _uint8.pack(binaryMinfVersion)
+        self._writeString(reducer)
+        self._flushBuffer()
+
+    def close(self):
+        """Close the Minf syntax tree. The underlying file is NOT closed
+        unless it has been opened by L{createWriter}."""
+        if self.__file is not None:
+            self._writeNode(EndStructure(minfStructure))
+            self._writeIndex()
+            self._flushBuffer()
+            self.__file.flush()
+            self.__file = None
+            self._closeOwnedFile()
+
+    def write(self, value):
+        self._offsets.append(self._position + len(self._buffer))
+        self._writeNodes(self.reducer.reduce(value))
+        self._flushBuffer()
+
+    def flush(self):
+        self._flushBuffer()
+        self.__file.flush()
+
+    def change_file(self, file):
+        self.__file = file
+
+    def _flushBuffer(self):
+        if self._buffer:
+            self.__file.write(bytes(self._buffer))
+            self._position += len(self._buffer)
+            del self._buffer[:]
+
+    def _writeIndex(self):
+        offsets = array.array('Q', self._offsets)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        if six.PY2:
+            self._buffer += offsets.tostring()
+        else:
+            self._buffer += offsets.tobytes()
+        self._buffer += _uint64.pack(len(self._offsets))
+        self._buffer += binaryIndexMagic
+
+    def _writeString(self, value):
+        if isinstance(value, six.binary_type):
+            encoded = value
+        else:
+            encoded = six.text_type(value).encode('utf-8')
+        self._buffer += _uint32.pack(len(encoded))
+        self._buffer += encoded
+
+    def _writeNodes(self, minfNodeIterator):
+        # Items of a list are kept in `packed` until it is known whether
+        # they can all be written in a single array or not.
+        packStart = None
+        packed = []
+        packedType = None
+        for minfNode in minfNodeIterator:
+            if packStart is not None:
+                nodeType = type(minfNode)
+                if nodeType in _packableTypes \
+                        and (packedType is None or nodeType is packedType):
+                    packedType = nodeType
+                    packed.append(minfNode)
+                    continue
+                if packed and isinstance(minfNode, EndStructure) \
+                        and minfNode.type == listStructure \
+                        and self._writeArray(packedType, packed):
+                    packStart = None
+                    continue
+                self._writeNode(packStart)
+                for atom in packed:
+                    self._writeNode(atom)
+                packStart = None
+            if isinstance(minfNode, StartStructure) \
+                    and minfNode.type == listStructure \
+                    and minfNode.identifier is None:
+                packStart = minfNode
+                packed = []
+                packedType = None
+            else:
+                self._writeNode(minfNode)
+        if packStart is not None:
+            self._writeNode(packStart)
+            for atom in packed:
+                self._writeNode(atom)
+
+    def _writeArray(self, packedType, values):
+        if packedType is float:
+            typeCode = floatArrayType
+        else:
+            typeCode = intArrayType
+        try:
+            values = array.array(typeCode, values)
+        except (OverflowError, ValueError):
+            # integers too big for 64 bits, or unsupported type code
+            return False
+        if sys.byteorder != 'little':
+            values.byteswap()
+        self._buffer.append(arrayToken)
+        self._buffer.append(ord(typeCode))
+        self._buffer += _uint32.pack(len(values))
+        if six.PY2:
+            self._buffer += values.tostring()
+        else:
+            self._buffer += values.tobytes()
+        return True
+
+    def _writeNode(self, minfNode):
+        buffer = self._buffer
+        if minfNode is None:
+            buffer.append(noneToken)
+        elif minfNode is True:
+            buffer.append(trueToken)
+        elif minfNode is False:
+            buffer.append(falseToken)
+        elif isinstance(minfNode, six.integer_types) \
+                and not isinstance(minfNode, bool):
+            if _int64Range[0] <= minfNode < _int64Range[1]:
+                buffer.append(intToken)
+                buffer += _int64.pack(minfNode)
+            else:
+                buffer.append(longToken)
+                self._writeString(str(minfNode))
+        elif isinstance(minfNode, float):
+            buffer.append(floatToken)
+            buffer += _float64.pack(minfNode)
+        elif isinstance(minfNode, six.string_types):
+            if type(minfNode) is six.binary_type:
+                try:
+                    minfNode = minfNode.decode("utf-8")
+                except UnicodeDecodeError:
+                    minfNode = minfNode.decode("iso-8859-1")
+            buffer.append(stringToken)
+            self._writeString(minfNode)
+        elif isinstance(minfNode, StartStructure):
+            buffer.append(startToken)
+            self._writeString(minfNode.type)
+            if minfNode.identifier is not None:
+                buffer.append(identifierFlag)
+                self._writeString(minfNode.identifier)
+            else:
+                buffer.append(0)
+            buffer += _uint32.pack(len(minfNode.attributes))
+            for n, v in six.iteritems(minfNode.attributes):
+                self._writeString(n)
+                self._writeString(six.text_type(v))
+        elif isinstance(minfNode, EndStructure):
+            buffer.append(endToken)
+            self._writeString(minfNode.type)
+        elif isinstance(minfNode, Reference):
+            buffer.append(referenceToken)
+            self._writeString(minfNode.identifier)
+        elif isinstance(minfNode, XHTML):
+            buffer.append(xhtmlToken)
+            self._writeString(XHTML.xml(minfNode))
+        else:
+            raise MinfError(
+                _('Cannot save an object of type %s as a binary atom')
+                % (str(type(minfNode)), ))
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+#  This software and supporting documentation are distributed by
+#      Institut Federatif de Recherche 49
+#      CEA/NeuroSpin, Batiment 145,
+#      91191 Gif-sur-Yvette cedex
+#      France
+#
+# This software is governed by the CeCILL-B license under
+# French law and abiding by the rules of distribution of free software.
+# You can  use, modify and/or redistribute the software under the
+# terms of the CeCILL-B license as circulated by CEA, CNRS
+# and INRIA at the following URL "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading,  using,  modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean  that it is complicated to manipulate,  and  that  also
+# therefore means  that it is reserved for developers  and  experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systems and/or
+# data to be ensured and,  more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-B license and that you accept its terms.
+
+
+'''
+Safe reading of minf files written in Python format, that is containing a
+single ``attributes = {...}`` assignment.
+
+The file content is parsed but never executed: only literals (strings,
+numbers, lists, tuples, dictionaries, sets, ``None``, ``True``, ``False``,
+``nan`` and ``inf``) are accepted. Parsed files are cached according to their
+path, modification time, size and inode, so reading the same unchanged file
+again only costs a ``stat``.
+
+This module does not import the rest of the minf machinery, it can be used
+in worker processes that only have to read Python minf headers.
+
+* author: Yann Cointepas
+* organization: `NeuroSpin <http://www.neurospin.org>`_
+* license: `CeCILL B <http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html>`_
+'''
+from __future__ import absolute_import
+__docformat__ = "restructuredtext en"
+
+import ast
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from soma.minf.error import MinfError
+
+#: Maximum number of files kept in :func:`readPythonMinf` cache
+cacheSize = 256
+
+_cache = OrderedDict()
+_cacheLock = threading.Lock()
+
+#: Names that can be used in Python minf files
+_names = {
+    'nan': float('nan'),
+    'inf': float('inf'),
+    'None': None,
+    'True': True,
+    'False': False,
+}
+
+if sys.version_info >= (3, 8):
+    _constantAttributes = {ast.Constant: 'value'}
+else:
+    _constantAttributes = {ast.Num: 'n', ast.Str: 's'}
+    if hasattr(ast, 'Bytes'):
+        _constantAttributes[ast.Bytes] = 's'
+    if hasattr(ast, 'NameConstant'):
+        _constantAttributes[ast.NameConstant] = 'value'
+
+
+#------------------------------------------------------------------------------
+def _literal(node):
+    nodeType = type(node)
+    attribute = _constantAttributes.get(nodeType)
+    if attribute is not None:
+        return getattr(node, attribute)
+    if nodeType is ast.Dict:
+        return dict(zip([_literal(i) for i in node.keys],
+                        [_literal(i) for i in node.values]))
+    if nodeType is ast.List:
+        return [_literal(i) for i in node.elts]
+    if nodeType is ast.Tuple:
+        return tuple([_literal(i) for i in node.elts])
+    if nodeType is ast.Set:
+        return set([_literal(i) for i in node.elts])
+    if nodeType is ast.Name:
+        try:
+            return _names[node.id]
+        except KeyError:
+            raise MinfError('Unknown name in Python minf file: %s'
+                            % (node.id, ))
+    if nodeType is ast.UnaryOp and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _literal(node.operand)
+        if isinstance(operand, (int, float, complex)) \
+                and not isinstance(operand, bool):
+            if isinstance(node.op, ast.USub):
+                return -operand
+            return operand
+    raise MinfError('Forbidden expression in Python minf file: %s'
+                    % (nodeType.__name__, ))
+
+
+#------------------------------------------------------------------------------
+def parsePythonMinf(content, name='<minf>'):
+    '''
+    Return the value assigned to ``attributes`` in the content of a minf
+    file written in Python format. The content is parsed but never executed,
+    a :class:`MinfError` is raised if it contains anything else than
+    assignments of literal values to ``attributes``.
+
+    Parameters
+    ----------
+    content: string or bytes
+      content of the minf file.
+    name: string
+      name of the file, used in error messages.
+    '''
+    try:
+        tree = ast.parse(content, name)
+    except SyntaxError:
+        if not isinstance(content, bytes):
+            raise
+        # not UTF-8
+        tree = ast.parse(content.decode('latin1'), name)
+    result = None
+    found = False
+    for statement in tree.body:
+        if not isinstance(statement, ast.Assign) \
+                or len(statement.targets) != 1 \
+                or not isinstance(statement.targets[0], ast.Name) \
+                or statement.targets[0].id != 'attributes':
+            raise MinfError('Only "attributes = <value>" statements are '
+                            'allowed in Python minf files: %s' % (name, ))
+        result = _literal(statement.value)
+        found = True
+    if not found:
+        raise MinfError('No attributes in Python minf file: %s' % (name, ))
+    return result
+
+
+#------------------------------------------------------------------------------
+def _fileKey(path):
+    stat = os.stat(path)
+    return (getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size,
+            stat.st_ino)
+
+
+def cachedPythonMinf(path):
+    '''
+    Return the content of a Python minf file if it is in the cache of
+    :func:`readPythonMinf` and has not been modified since it was read.
+    Otherwise, a :class:`KeyError` is raised. The returned value is shared
+    with the cache and must not be modified (see :func:`copyLiteral`).
+    '''
+    path = os.path.abspath(path)
+    with _cacheLock:
+        entry = _cache.get(path)
+    if entry is None or entry[0] != _fileKey(path):
+        raise KeyError(path)
+    return entry[1]
+
+
+def readPythonMinf(path, useCache=True, fileObject=None):
+    '''
+    Return the value assigned to ``attributes`` in a minf file written in
+    Python format (see :func:`parsePythonMinf`).
+
+    If useCache is True, the result is kept in a cache and subsequent calls
+    for the same unchanged file return the same object without reading the
+    file. This object is shared and must not be modified; use
+    :func:`copyLiteral` to get a modifiable copy.
+
+    If fileObject is given, it is a binary file object already opened on
+    path, positioned at the beginning of the file: the content is read from
+    it instead of opening the file again.
+    '''
+    path = os.path.abspath(path)
+    key = _fileKey(path)
+    if useCache:
+        with _cacheLock:
+            entry = _cache.pop(path, None)
+            if entry is not None and entry[0] == key:
+                # move to the end of the LRU order
+                _cache[path] = entry
+                return entry[1]
+    if fileObject is None:
+        with open(path, 'rb') as f:
+            content = f.read()
+    else:
+        content = fileObject.read()
+    result = parsePythonMinf(content, path)
+    if useCache:
+        with _cacheLock:
+            _cache[path] = (key, result)
+            while len(_cache) > cacheSize:
+                _cache.popitem(last=False)
+    return result
+
+
+def clearPythonMinfCache():
+    '''
+    Empty the cache of :func:`readPythonMinf`.
+    '''
+    with _cacheLock:
+        _cache.clear()
+
+
+#------------------------------------------------------------------------------
+def copyLiteral(value):
+    '''
+    Return a copy of a value read in a Python minf file. Containers are copied
+    recursively, other values are immutable and are shared.
+    '''
+    valueType = type(value)
+    if valueType is dict:
+        return dict([(k, copyLiteral(v)) for k, v in value.items()])
+    if valueType is list:
+        return [copyLiteral(i) for i in value]
+    if valueType is tuple:
+        return tuple([copyLiteral(i) for i in value])
+    if valueType is set:
+        return set(value)
+    return value
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the reading throughput of minf files.
+
+A minf file of about the requested size (50 MB by default) is generated in a
+temporary directory, then read with the available minf readers::
+
+    python -m soma.minf.tests.benchmark_minf [size_in_MB]
+'''
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import soma.minf.api as minf
+from soma.minf.xml_reader import MinfXMLReader
+
+
+def generate_header(size_mb):
+    # about 20 bytes per number in one-line XML
+    n = int(size_mb * 1024 * 1024 / 20)
+    return {'vertices': [float(i) / 7 for i in range(n // 2)],
+            'polygons': list(range(n // 2)),
+            'name': 'benchmark'}
+
+
+def read_time(minf_file):
+    start = time.time()
+    minf.readMinf(minf_file)
+    return time.time() - start
+
+
+def main(size_mb=50):
+    directory = tempfile.mkdtemp()
+    try:
+        header = generate_header(size_mb)
+        one_line = os.path.join(directory, 'one_line.minf')
+        with open(one_line, 'w') as f:
+            writer = minf.MinfWriter.createWriter(f, 'XML', 'minf_2.0')
+            writer.level = None
+            writer.write(header)
+            writer.close()
+        indented = os.path.join(directory, 'indented.minf')
+        minf.writeMinf(indented, (header, ))
+        binary = os.path.join(directory, 'binary.minf')
+        minf.writeMinf(binary, (header, ), format='binary')
+
+        for minf_file in (one_line, indented, binary):
+            size = os.path.getsize(minf_file) / (1024. * 1024.)
+            if minf_file == binary:
+                configs = [('binary', None)]
+            else:
+                configs = [('XML/expat', True), ('XML/SAX', False)]
+            for label, use_expat in configs:
+                MinfXMLReader.useExpat = use_expat
+                duration = read_time(minf_file)
+                print('%-24s %-10s %8.1f MB %7.2f s %7.1f MB/s'
+                      % (os.path.basename(minf_file), label, size, duration,
+                         size / duration))
+    finally:
+        MinfXMLReader.useExpat = True
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(float(sys.argv[1]))
+    else:
+        main()
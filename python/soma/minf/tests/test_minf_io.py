@@ -4,9 +4,13 @@ from __future__ import print_function
 from __future__ import absolute_import
 import unittest
 import shutil
+import io
 import os
+import sys
 import tempfile
 import soma.minf.api as minf
+from soma.minf.error import MinfError
+from soma.minf.binary_tags import binaryMinfMagic
 
 
 
@@ -30,6 +34,173 @@ class TestMinfIO(unittest.TestCase):
         dd = minf.readMinf(minf_file)
         self.assertEqual(d, dd[0])
 
+    def test_minf_xml_one_line(self):
+        from soma.minf.xml_reader import MinfXMLReader
+        d = {'vertices': [float(i) for i in range(10000)],
+             'names': [str(i) for i in range(10000)]}
+        minf_file = os.path.join(self.directory, 'minf_one_line.minf')
+        with open(minf_file, 'w') as f:
+            writer = minf.createMinfWriter(f)
+            writer.level = None
+            writer.write(d)
+            writer.close()
+        block_size = MinfXMLReader.blockSize
+        try:
+            MinfXMLReader.blockSize = 1000
+            for use_expat in (True, False):
+                MinfXMLReader.useExpat = use_expat
+                self.assertEqual(minf.readMinf(minf_file), (d, ))
+        finally:
+            MinfXMLReader.blockSize = block_size
+            MinfXMLReader.useExpat = True
+
+    def test_minf_binary_io(self):
+        d = {
+            'titi': {'bubu': '50', 'turlute': 12},
+            'toto': 'val"u\'e',
+            'tutu': [0, 1, 2, [u'papa', 5]],
+            'vertices': [0.5, 1.5, -2.],
+            'mixed': [1, 2., True, None],
+            'big': [2 ** 70, 3]}
+        minf_file = os.path.join(self.directory, 'minf_binary_file.minf')
+        minf.writeMinf(minf_file, (d, [4, 5]), format='binary')
+        self.assertEqual(minf.minfFormat(minf_file), ('binary', 'minf_2.0'))
+        dd = minf.readMinf(minf_file)
+        self.assertEqual(dd, (d, [4, 5]))
+        self.assertTrue(isinstance(dd[0]['vertices'][0], float))
+        self.assertTrue(isinstance(dd[0]['tutu'][0], int))
+        with open(minf_file, 'rb') as f:
+            self.assertEqual(minf.readMinf(f), (d, [4, 5]))
+
+        # text stream: text written before comes first
+        with open(minf_file, 'w') as f:
+            f.write('header')
+            minf.writeMinf(f, (d, ), format='binary')
+        with open(minf_file, 'rb') as f:
+            self.assertEqual(f.read(6), b'header')
+            self.assertEqual(f.read(len(binaryMinfMagic)), binaryMinfMagic)
+        self.assertRaises(MinfError, minf.writeMinf, io.StringIO(), (d, ),
+                          format='binary')
+
+        # corrupt array type
+        minf.writeMinf(minf_file, ([1, 2, 3], ), format='binary')
+        with open(minf_file, 'rb') as f:
+            data = bytearray(f.read())
+        data[data.index(b'aq') + 1] = ord('u')
+        with open(minf_file, 'wb') as f:
+            f.write(data)
+        self.assertRaises(MinfError, minf.readMinf, minf_file)
+
+    def test_minf_buffer_and_file(self):
+        from soma.bufferandfile import BufferAndFile
+        d = {'titi': {'bubu': '50', 'turlute': 12},
+             'toto': u'val"u\'e <&> \xe9'}
+        minf_file = os.path.join(self.directory, 'minf_buffer.minf')
+        for format, reduction in (('binary', 'minf_2.0'),
+                                  ('XML', 'minf_2.0'),
+                                  ('python', None)):
+            if format == 'python':
+                with open(minf_file, 'w') as f:
+                    f.write('attributes = ' + repr(d) + '\n')
+            else:
+                minf.writeMinf(minf_file, (d, ), format=format)
+            with open(minf_file, 'rb') as f:
+                source = BufferAndFile(f)
+                # the header is read in the buffer, not consumed
+                self.assertEqual(minf.minfFormat(source),
+                                 (format, reduction))
+                self.assertEqual(minf.readMinf(source), (d, ))
+            with open(minf_file, 'rb') as f:
+                # the file is not seekable: a pipe for instance
+                source = BufferAndFile(io.BufferedReader(
+                    _NonSeekable(f.read())))
+                self.assertEqual(minf.minfFormat(source)[0], format)
+                self.assertEqual(minf.readMinf(source), (d, ))
+            with open(minf_file, 'rb') as f:
+                # a plain binary file object is seeked back
+                self.assertEqual(minf.minfFormat(f), (format, reduction))
+                self.assertEqual(f.tell(), 0)
+        with open(minf_file, 'wb') as f:
+            f.write(b'not a minf file')
+        self.assertRaises(MinfError, minf.minfFormat, minf_file)
+
+    def test_minf_compressed_io(self):
+        d = {'titi': {'bubu': '50', 'turlute': 12},
+             'toto': u'val"u\'e <&> \xe9',
+             'tutu': [0, 1, 2, [u'papa', 5]]}
+        minf_file = os.path.join(self.directory, 'minf_compressed.minf')
+        for format in ('XML', 'binary'):
+            minf.writeMinf(minf_file, (d, ), format=format,
+                           compression='gzip')
+            with open(minf_file, 'rb') as f:
+                self.assertEqual(f.read(2), b'\x1f\x8b')
+            self.assertEqual(minf.minfFormat(minf_file),
+                             (format, 'minf_2.0'))
+            self.assertEqual(minf.readMinf(minf_file), (d, ))
+        self.assertRaises(ValueError, minf.writeMinf, minf_file, (d, ),
+                          compression='unknown')
+        # other compressions known by soma.bufferandfile can be read
+        import lzma
+        from soma.bufferandfile import identify
+        minf.writeMinf(minf_file, (d, ))
+        with open(minf_file, 'rb') as f:
+            data = lzma.compress(f.read())
+        with open(minf_file, 'wb') as f:
+            f.write(data)
+        self.assertEqual(minf.readMinf(minf_file), (d, ))
+        format, compressions, stream = identify(minf_file)
+        stream.close()
+        self.assertEqual((format, compressions), ('minf_xml', ['xz']))
+
+    def test_minf_xml_flushed(self):
+        # each object reaches the file when it is written
+        minf_file = os.path.join(self.directory, 'minf_log.minf')
+        writer = minf.createMinfWriter(minf_file)
+        writer.write({'record': 0})
+        writer.write({'record': 1})
+        self.assertEqual(minf.readMinf(minf_file),
+                         ({'record': 0}, {'record': 1}))
+        writer.close()
+
+    def test_minf_item(self):
+        items = [{'record': i, 'values': [i, i + 0.5]} for i in range(20)] \
+            + ['last']
+        minf_file = os.path.join(self.directory, 'minf_items.minf')
+        for format in ('binary', 'XML'):
+            minf.writeMinf(minf_file, items, format=format)
+            self.assertEqual(minf.readMinfItem(minf_file, 0), items[0])
+            self.assertEqual(minf.readMinfItem(minf_file, 7), items[7])
+            self.assertEqual(minf.readMinfItem(minf_file, -1), 'last')
+            self.assertEqual(minf.readMinfItem(minf_file, slice(3, 6)),
+                             items[3:6])
+            self.assertEqual(minf.readMinfItem(minf_file, slice(-3, None)),
+                             items[-3:])
+            self.assertRaises(IndexError, minf.readMinfItem, minf_file, 21)
+            self.assertRaises(IndexError, minf.readMinfItem, minf_file, -22)
+        # unfinished binary file (no index)
+        writer = minf.createMinfWriter(minf_file, format='binary')
+        for item in items:
+            writer.write(item)
+        writer.flush()
+        self.assertEqual(minf.readMinfItem(minf_file, -1), 'last')
+        writer.close()
+
+    def test_minf_deep_structure(self):
+        depth = sys.getrecursionlimit() + 100
+        deep = []
+        current = deep
+        for i in range(depth):
+            current.append({'level': i, 'next': []})
+            current = current[0]['next']
+        for format in ('XML', 'binary'):
+            minf_file = os.path.join(self.directory, 'minf_deep.minf')
+            minf.writeMinf(minf_file, (deep, ), format=format)
+            current = minf.readMinf(minf_file)[0]
+            for i in range(depth):
+                self.assertEqual(current[0]['level'], i)
+                current = current[0]['next']
+            self.assertEqual(current, [])
+
     def test_minf_py_io(self):
         d = {
             'titi': {'bubu': '50', 'turlute': 12},
@@ -40,6 +211,65 @@ class TestMinfIO(unittest.TestCase):
         dd = minf.readMinf(minf_file)
         self.assertEqual(d, dd[0])
 
+    def test_minf_py_compressed(self):
+        import bz2
+        import gzip
+        import lzma
+        from soma.minf import python_reader
+        d = {'a': [1, 2.5], 'b': u'\xe9t\xe9'}
+        content = ('attributes = ' + repr(d) + '\n').encode('utf-8')
+        minf_file = os.path.join(self.directory, 'minf_py_compressed.minf')
+        for compress in (gzip.compress, bz2.compress, lzma.compress):
+            with open(minf_file, 'wb') as f:
+                f.write(compress(content))
+            self.assertEqual(minf.minfFormat(minf_file)[0], 'python')
+            self.assertEqual(minf.readMinf(minf_file), (d, ))
+            # compressed files are not cached
+            self.assertRaises(KeyError, python_reader.cachedPythonMinf,
+                              minf_file)
+        with open(minf_file, 'wb') as f:
+            f.write(content)
+        self.assertEqual(minf.readMinf(minf_file), (d, ))
+        self.assertEqual(python_reader.cachedPythonMinf(minf_file), d)
+
+    def test_minf_py_safe_and_cached(self):
+        from soma.minf.error import MinfError
+        from soma.minf import python_reader
+        minf_file = os.path.join(self.directory, 'minf_py_cached.minf')
+        with open(minf_file, 'w') as f:
+            f.write("attributes = {'a': [1, -2.5, nan], 'b': (None, True)}\n")
+        dd = python_reader.readPythonMinf(minf_file)
+        self.assertEqual(dd['a'][:2], [1, -2.5])
+        self.assertTrue(dd['a'][2] != dd['a'][2])  # nan
+        self.assertTrue(python_reader.readPythonMinf(minf_file) is dd)
+        # readMinf returns a copy which can be modified
+        d = minf.readMinf(minf_file)[0]
+        self.assertTrue(d is not dd)
+        d['a'].append(3)
+        self.assertEqual(len(dd['a']), 3)
+        with open(minf_file, 'w') as f:
+            f.write("attributes = {'a': 'modified file'}\n")
+        self.assertEqual(minf.readMinf(minf_file), ({'a': 'modified file'}, ))
+        with open(minf_file, 'w') as f:
+            f.write("attributes = __import__('os').getcwd()\n")
+        self.assertRaises(MinfError, minf.readMinf, minf_file)
+        with open(minf_file, 'w') as f:
+            f.write("attributes = {}\nimport os\n")
+        self.assertRaises(MinfError, minf.readMinf, minf_file)
+
+
+class _NonSeekable(io.RawIOBase):
+    # raw stream which cannot be seeked, as a pipe
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.data.readinto(buffer)
+
 
 def test():
     suite = unittest.TestLoader().loadTestsFromTestCase(TestMinfIO)
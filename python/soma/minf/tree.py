@@ -227,34 +227,97 @@ class MinfReducer(object):
         self.name = name
         self.bases = tuple([self._allReducers[i] for i in bases])
         self.typeReducers = {}
+        # type reducers already found for a class (see getTypeReducer)
+        self._classReducers = {}
         self._allReducers[name] = self
 
     def getTypeReducer(self, classOrName):
         if not isinstance(classOrName, six.string_types):
+            reducer = self._classReducers.get(classOrName)
+            if reducer is not None:
+                return reducer
             className = classOrName.__module__ + '.' + classOrName.__name__
         else:
             className = classOrName
         reducer = self.typeReducers.get(className)
         if reducer is None:
             for base in self.bases:
-                reducer = base.getTypeReducer(className)
+                try:
+                    reducer = base.getTypeReducer(classOrName)
+                except MinfError:
+                    continue
                 if reducer is not None:
                     break
             else:
-                if issubclass(classOrName, HasSignature):
-                    return self.hasSignatureReducer
-                    raise MinfError(
-                        _('Automatic reduction of HasSignature not implemented'))
-                raise MinfError(_('Object of type %(class)s cannot be reduced '
-                                  'in Minf "%(minf)s" structure') %
-                                {'class': className, 'minf': self.name})
+                if not isinstance(classOrName, six.string_types) \
+                        and issubclass(classOrName, HasSignature):
+                    reducer = self.hasSignatureReducer
+                else:
+                    raise MinfError(_('Object of type %(class)s cannot be '
+                                      'reduced in Minf "%(minf)s" structure')
+                                    % {'class': className, 'minf': self.name})
+        if not isinstance(classOrName, six.string_types):
+            self._classReducers[classOrName] = reducer
         return reducer
 
+    def _clearClassReducers(self):
+        # registering a class in a reducer may change the type reducers of
+        # the reducers using it as a base.
+        for reducer in six.itervalues(self._allReducers):
+            reducer._classReducers.clear()
+
     def reduce(self, *args):
-        for o in args:
-            typeReducer = self.getTypeReducer(o.__class__)
-            for minfNode in typeReducer(self, o):
-                yield minfNode
+        # Lists and dictionaries are reduced here using a stack of iterators
+        # instead of recursive generators. Other types are reduced by their
+        # type reducer.
+        classReducers = self._classReducers
+        getTypeReducer = self.getTypeReducer
+        atomReducer = MinfReducer.atomReducer
+        sequenceReducer = MinfReducer.sequenceReducer
+        dictReducer = MinfReducer.dictReducer
+        stack = [iter(args)]
+        ends = [None]
+        while stack:
+            for o in stack[-1]:
+                typeReducer = classReducers.get(o.__class__)
+                if typeReducer is None:
+                    typeReducer = getTypeReducer(o.__class__)
+                if typeReducer is atomReducer:
+                    yield o
+                elif typeReducer is sequenceReducer:
+                    try:
+                        yield StartStructure(listStructure, length=len(o))
+                    except TypeError:
+                        yield StartStructure(listStructure)
+                    if isinstance(o, (list, tuple)):
+                        itemTypes = set([i.__class__ for i in o])
+                        for itemType in itemTypes:
+                            if (classReducers.get(itemType)
+                                    or getTypeReducer(itemType)) \
+                                    is not atomReducer:
+                                break
+                        else:
+                            # homogeneous list of atoms
+                            for item in o:
+                                yield item
+                            yield EndStructure(listStructure)
+                            continue
+                    stack.append(iter(o))
+                    ends.append(EndStructure(listStructure))
+                    break
+                elif typeReducer is dictReducer:
+                    yield StartStructure(dictStructure)
+                    stack.append(_iterateItems(o))
+                    ends.append(EndStructure(dictStructure))
+                    break
+                else:
+                    for minfNode in typeReducer(self, o):
+                        yield minfNode
+            else:
+                stack.pop()
+                end = ends.pop()
+                if end is not None:
+                    yield end
 
     def atomReducer(reducer, atom):
         return (atom, )
@@ -316,11 +379,13 @@ class MinfReducer(object):
         self.typeReducers[
             cls.__module__ + '.' + cls.__name__] = self.atomReducer
         self._defaultClassReducer[className] = self.name
+        self._clearClassReducers()
 
     def registerClass(self, cls, reducer):
         className = cls.__module__ + '.' + cls.__name__
         self.typeReducers[className] = reducer
         self._defaultClassReducer[className] = self.name
+        self._clearClassReducers()
 
     def defaultReducer(value):
         '''
@@ -338,6 +403,12 @@ class MinfReducer(object):
     defaultReducer = staticmethod(defaultReducer)
 
 
+def _iterateItems(dict):
+    for key, value in six.iteritems(dict):
+        yield key
+        yield value
+
+
 #------------------------------------------------------------------------------
 def createMinfExpander(name):
     '''
@@ -419,6 +490,10 @@ class MinfExpander(object):
         if isinstance(minfNode, StartStructure):
             identifier = minfNode.identifier
             typeExpander = self.getTypeExpander(minfNode.type)
+            if stop_on_error and target is None and targetType is Undefined \
+                    and typeExpander in _builtinStructureExpanders:
+                return self._expandBuiltinStructures(minfNodeIterator,
+                                                     minfNode)
             try:
                 result = typeExpander(
                     self, minfNode, minfNodeIterator, target=target,
@@ -440,6 +515,65 @@ class MinfExpander(object):
         else:
             return minfNode
 
+    def _expandBuiltinStructures(self, minfNodeIterator, minfNode):
+        # Iterative expansion of lists and dictionaries (and of the lists and
+        # dictionaries they contain) using a stack instead of recursive
+        # calls. It is equivalent to sequenceExpander and dictExpander
+        # when there is no target and errors are not ignored.
+        # Each stack item is [result, structure type, identifier, isList,
+        # key] where key is _noKey for dictionaries waiting for a key.
+        sequenceExpander = MinfExpander.sequenceExpander
+        dictExpander = MinfExpander.dictExpander
+        stack = []
+        item = None
+        while True:
+            if isinstance(minfNode, _structureNodeTypes):
+                if isinstance(minfNode, StartStructure):
+                    typeExpander = self.getTypeExpander(minfNode.type)
+                    if typeExpander is sequenceExpander:
+                        item = [[], listStructure, minfNode.identifier, True,
+                                _noKey]
+                        stack.append(item)
+                        minfNode = next(minfNodeIterator)
+                        continue
+                    elif typeExpander is dictExpander:
+                        item = [{}, dictStructure, minfNode.identifier, False,
+                                _noKey]
+                        stack.append(item)
+                        minfNode = next(minfNodeIterator)
+                        continue
+                    value = self.expand(minfNodeIterator, minfNode)
+                elif isinstance(minfNode, EndStructure):
+                    if item[4] is not _noKey:
+                        raise MinfError(_('Minf structure %s ended but not started') %
+                                        (minfNode.type, ))
+                    if minfNode.type != item[1]:
+                        raise MinfError(_('Wrong Minf structure ending, expecting %(exp)s instead of %(rcv)s') %
+                                        {'exp': item[1], 'rcv': minfNode.type})
+                    stack.pop()
+                    value = item[0]
+                    if item[2] is not None:
+                        self.objectsWithIdentifier[item[2]] = value
+                    if not stack:
+                        return value
+                    item = stack[-1]
+                else:
+                    value = self.objectsWithIdentifier[minfNode.identifier]
+            else:
+                value = minfNode
+            if item[3]:
+                item[0].append(value)
+            elif item[4] is _noKey:
+                if isinstance(value, list):
+                    # list objects are unhashable and cannot be used as
+                    # dictionary key in this case they are converted to tuple
+                    value = tuple(value)
+                item[4] = value
+            else:
+                item[0][item[4]] = value
+                item[4] = _noKey
+            minfNode = next(minfNodeIterator)
+
     def sequenceExpander(expander, minfNode, minfNodeIterator, target,
                          targetType, stop_on_error=True, exceptions=[]):
         if target is None:
@@ -543,6 +677,12 @@ class MinfExpander(object):
         self.typeExpanders[typeName] = expander
 
 
+_builtinStructureExpanders = (MinfExpander.sequenceExpander,
+                              MinfExpander.dictExpander)
+_structureNodeTypes = (StartStructure, EndStructure, Reference)
+_noKey = object()
+
+
 #------------------------------------------------------------------------------
 def createReducerAndExpander(name, *bases):
     '''
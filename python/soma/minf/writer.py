@@ -43,10 +43,21 @@ Base classes for writing various minf formats (XML, HDF5, Python's pickle, etc.)
 from __future__ import absolute_import
 __docformat__ = "restructuredtext en"
 
+import gzip
 import six
 from soma.translation import translate as _
 
 
+#: Functions used to open a compressed output stream. Keys are compression
+#: names and values are functions taking a file name or a file object opened
+#: in binary mode and returning a file object opened in binary mode.
+compressedWriters = {
+    'gzip': lambda destFile: (
+        gzip.GzipFile(fileobj=destFile, mode='wb')
+        if hasattr(destFile, 'write') else gzip.open(destFile, 'wb')),
+}
+
+
 #------------------------------------------------------------------------------
 class RegisterMinfWriterClass(type):
 
@@ -83,6 +94,12 @@ class MinfWriter(six.with_metaclass(RegisterMinfWriterClass, object)):
     #: class derived from L{MinfWriter} must set a format name in this attribute.
     name = None
 
+    #: mode used to open the file when L{createWriter} is given a file name.
+    fileMode = 'w'
+
+    #: file object opened by L{createWriter} and closed by L{close}.
+    _ownedFile = None
+
     def __init__(self, file, reducer):
         '''
         Constructor of classes derived from L{MinfWriter} must be callable with two
@@ -104,10 +121,20 @@ class MinfWriter(six.with_metaclass(RegisterMinfWriterClass, object)):
     def close(self):
         '''
         Close the writer, further calls to L{write} method will lead to an error.
-        The underlying file is NOT closed.
+        The underlying file is NOT closed unless it has been opened by
+        L{createWriter}.
+        '''
+
+    def _closeOwnedFile(self):
+        '''
+        Close the file opened by L{createWriter}, if any. Must be called by
+        L{close} once everything has been written.
         '''
+        if self._ownedFile is not None:
+            self._ownedFile.close()
+            self._ownedFile = None
 
-    def createWriter(destFile, format, reducer):
+    def createWriter(destFile, format, reducer, compression=None):
         '''
         This static method create a L{MinfWriter} instance by looking for a
         registered L{MinfWriter} derived class named C{format}. Parameters
@@ -117,11 +144,16 @@ class MinfWriter(six.with_metaclass(RegisterMinfWriterClass, object)):
         @returns: L{MinfWriter} derived class instance.
         @param file: file name or file object (opened for writing) where the minf
           file is written. If it is a file name, it is opened with
-          C{open( destFile, 'wb' )}.
+          C{open( destFile, writerClass.fileMode )}.
         @type  file: string or any object respecting Python file object API
         @param reducer: name of the reducer to use (see L{soma.minf.tree} for
           more information about reducers).
         @type  reducer: string
+        @param compression: if not None, name of a compression (a key of
+          L{compressedWriters}, for instance C{'gzip'}) applied to the written
+          stream. If C{destFile} is a file object, it must be opened in binary
+          mode; it is not closed by the writer.
+        @type  compression: string
         '''
         writer = MinfWriter._allWriterClasses.get(format)
         if writer is None:
@@ -132,7 +164,20 @@ class MinfWriter(six.with_metaclass(RegisterMinfWriterClass, object)):
                  'possible': ', '.join(['"' + i + '"'
                                         for i in
                                         MinfWriter._allWriterClasses])})
-        if not hasattr(destFile, 'write'):
-            destFile = open(destFile, 'w')
-        return writer(destFile, reducer, )
+        ownedFile = None
+        if compression is not None:
+            compressedWriter = compressedWriters.get(compression)
+            if compressedWriter is None:
+                raise ValueError(
+                    _('Unknown minf compression "%(compression)s", possible '
+                      'compressions are: %(possible)s')
+                    % {'compression': compression,
+                       'possible': ', '.join(['"' + i + '"'
+                                              for i in compressedWriters])})
+            destFile = ownedFile = compressedWriter(destFile)
+        elif not hasattr(destFile, 'write'):
+            destFile = ownedFile = open(destFile, writer.fileMode)
+        result = writer(destFile, reducer, )
+        result._ownedFile = ownedFile
+        return result
     createWriter = staticmethod(createWriter)
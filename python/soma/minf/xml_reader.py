@@ -49,6 +49,8 @@ import operator
 import codecs
 import types
 import gzip
+from collections import deque
+from xml.parsers import expat
 from xml.sax.saxutils import quoteattr as xml_quoteattr
 from xml.sax.saxutils import escape as xml_escape
 from xml.sax import make_parser
@@ -101,15 +103,57 @@ class MinfXMLReader(MinfReader, ErrorHandler):
         def characters(self, content):
             self.parser._handler.characters(self.parser, six.text_type(content))
 
-    def reduction(self, source):
-        self._nodesToProduce = []
+    #: size of the blocks of data read from the source and fed to the XML
+    #: parser by :meth:`nodeIterator`.
+    blockSize = 65536
+
+    #: if True, use :mod:`xml.parsers.expat` directly instead of the generic
+    #: SAX layer.
+    useExpat = True
+
+    def _createParser(self):
+        """
+        Initialize the parsing state and return a function feeding the
+        XML parser with data.
+        """
+        self._nodesToProduce = deque()
+        self._minfStarted = False
+        self._minfFinished = False
+        self._nodeIdentifier = 0
+        if self.useExpat:
+            self._handler = MinfXMLHandler(self)
+            self._stack = []
+            self._expat_parser = expat.ParserCreate()
+            self._expat_parser.buffer_text = True
+            self._expat_parser.StartElementHandler = self._startElement
+            self._expat_parser.EndElementHandler = self._endElement
+            self._expat_parser.CharacterDataHandler = self._characters
+            return self._expatFeed
         self._sax_parser = make_parser()
         self._sax_parser.setContentHandler(MinfXMLReader.SaxHandler(self))
         self._sax_parser.setErrorHandler(self)
         self._sax_parser.reset()
-        self._minfStarted = False
-        self._minfFinished = False
-        self._nodeIdentifier = 0
+        return self._sax_parser.feed
+
+    def _expatFeed(self, data):
+        try:
+            self._expat_parser.Parse(data, False)
+        except expat.ExpatError as e:
+            self.fatalError(e)
+
+    def _startElement(self, name, attrs):
+        self._stack.append(name)
+        self._handler.startElement(self, name, attrs)
+
+    def _endElement(self, name):
+        self._handler.endElement(self, name)
+        self._stack.pop()
+
+    def _characters(self, content):
+        self._handler.characters(self, content)
+
+    def reduction(self, source):
+        feed = self._createParser()
         buffer = []
         while not self._nodesToProduce:
             line = source.readline()
@@ -117,39 +161,31 @@ class MinfXMLReader(MinfReader, ErrorHandler):
             if not line:
                 # end of file
                 break
-            self._sax_parser.feed(line)
+            feed(line)
         if self._nodesToProduce:
             return (self._nodesToProduce[0].attributes['reduction'], ''.join(buffer))
         return (None, ''.join(buffer))
 
     def nodeIterator(self, source):
-        self._nodesToProduce = []
-        self._sax_parser = make_parser()
-        self._sax_parser.setContentHandler(MinfXMLReader.SaxHandler(self))
-        self._sax_parser.setErrorHandler(self)
-        self._sax_parser.reset()
-        # self._sax_parser.feed( encodingLine )
-        self._minfStarted = False
-        self._minfFinished = False
-        self._nodeIdentifier = 0
+        feed = self._createParser()
+        nodesToProduce = self._nodesToProduce
+        popNode = nodesToProduce.popleft
         while not self._minfFinished:
-            while self._nodesToProduce:
-                node = self._nodesToProduce.pop(0)
-                yield node
-            line = source.readline()
-            if not line:
+            while nodesToProduce:
+                yield popNode()
+            data = source.read(self.blockSize)
+            if not data:
                 # end of file
                 if not self._minfStarted:
                     # Log files may be read while not finished, therefore the closing
                     # tag is missing. It is append to avoid XML parser error
                     # message.
-                    self._sax_parser.feed('<' + minfTag + '/>')
+                    feed('<' + minfTag + '/>')
                 self._minfFinished = True
                 break
-            self._sax_parser.feed(line)
-        while self._nodesToProduce:
-            node = self._nodesToProduce.pop(0)
-            yield node
+            feed(data)
+        while nodesToProduce:
+            yield popNode()
 
     def parseError(self, errorMessage):
         self.fatalError(errorMessage)
@@ -68,6 +68,30 @@ del xml_replacement['\x09']
 del xml_replacement['\x0a']
 del xml_replacement['\x0d']
 
+#: Translation table (see str.translate) escaping XML text content and
+#: removing characters that are not allowed in XML. Equivalent to
+#: xml_escape(value, xml_replacement).
+xml_escape_table = dict([(ord(c), None) for c in xml_replacement])
+xml_escape_table.update({ord('&'): u'&amp;', ord('<'): u'&lt;',
+                         ord('>'): u'&gt;'})
+
+#: Translation table escaping attribute values (see xml_quoteattr).
+xml_attribute_table = {ord('&'): u'&amp;', ord('<'): u'&lt;',
+                       ord('>'): u'&gt;', ord('\n'): u'&#10;',
+                       ord('\r'): u'&#13;', ord('\t'): u'&#9;'}
+
+
+def _quoteattr(value):
+    '''
+    Same as xml.sax.saxutils.quoteattr(value) but faster.
+    '''
+    value = value.translate(xml_attribute_table)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', '&quot;') + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
 
 #------------------------------------------------------------------------------
 class MinfXMLWriter(MinfWriter):
@@ -78,154 +102,192 @@ class MinfXMLWriter(MinfWriter):
 
     name = 'XML'
 
+    #: Lines written for one object are kept in a buffer which is written in
+    #: the file when its size reaches bufferSize characters. The file is
+    #: always flushed at the end of L{write}, so that each object reaches the
+    #: file as soon as it is written (minf files may be read before they are
+    #: finished).
+    bufferSize = 65536
+
     def __init__(self, file, reducer,
                  encoding='utf-8',
                  level=0,
                  append=False):
         self.__file = file
         self.reducer = createMinfReducer(reducer)
+        self.encoding = encoding
         self.encoder = codecs.getencoder(encoding)
         self.level = level
         self.indentString = '  '
+        self._buffer = []
+        self._bufferLength = 0
+        # None until the first write tells if file expects bytes or text
+        self._binaryFile = None
         if not append:
             self._writeLine('<?xml version="1.0" encoding=' +
                             xml_quoteattr(encoding) + ' ?>')
             self._encodeAndWriteLine('<' + minfTag + ' ' + expanderAttribute +
                                      '=' + xml_quoteattr(reducer) + '>')
+            self._flushBuffer()
 
     def close(self):
-        """Close the Minf syntax tree. The underlying file is NOT closed."""
+        """Close the Minf syntax tree. The underlying file is NOT closed
+        unless it has been opened by L{createWriter}."""
         if self.__file is not None:
-            self.__file.flush()
             self._encodeAndWriteLine('</' + minfTag + '>')
+            self._flushBuffer()
+            self.__file.flush()
             self.__file = None
+            self._closeOwnedFile()
 
     def write(self, value):
-        minfNodeIterator = self.reducer.reduce(value)
+        self._writeNodes(self.reducer.reduce(value))
+        self.flush()
+
+    def _writeNodes(self, minfNodeIterator):
+        # Structures are written using a stack instead of recursive calls.
+        # Each stack item is [tag, structure type, naming, stringNaming,
+        # keyExpected]. For naming structures (dictionaries and objects),
+        # keyExpected tells whether the next node is a key or a value.
+        stack = []
+        name = None
         for minfNode in minfNodeIterator:
-            self._write(minfNodeIterator, minfNode, 0, None)
-
-    def _write(self, minfNodeIterator, minfNode, level, name):
-        if minfNode is Undefined:
-            minfNode = next(minfNodeIterator)
-        attributes = {}
-        if name is not None:
-            attributes[nameAttribute] = name
-        if isinstance(minfNode, StartStructure):
-            if minfNode.type == listStructure:
-                naming = False
-                stringNaming = False
-                length = minfNode.attributes.get('length')
-                if length:
-                    attributes[lengthAttribute] = length
-                tag = listTag
-            elif minfNode.type == dictStructure:
-                naming = True
-                stringNaming = False
-                length = minfNode.attributes.get('length')
-                if length:
-                    attributes[lengthAttribute] = length
-                tag = dictionaryTag
-            else:
-                naming = True
-                stringNaming = True
-                tag = factoryTag
-                attributes[objectTypeAttribute] = minfNode.type
-            if attributes:
-                attributes = ' ' + \
-                    ' '.join([n + '=' + xml_quoteattr(six.text_type(v))
-                             for n, v in six.iteritems(attributes)])
-            else:
-                attributes = ''
-            self._encodeAndWriteLine('<' + tag + attributes + '>', level)
-            ntype = minfNode.type
-            for minfNode in minfNodeIterator:
+            if stack:
+                item = stack[-1]
                 if isinstance(minfNode, EndStructure):
-                    if ntype != minfNode.type:
+                    if item[1] != minfNode.type:
                         raise MinfError(_('Wrong Minf structure ending, expecting %(exp)s instead of %(rcv)s') %
-                                        {'exp': ntype, 'rcv': minfNode.type})
-                    self._encodeAndWriteLine('</' + tag + '>', level)
-                    break
-                elif naming:
+                                        {'exp': item[1], 'rcv': minfNode.type})
+                    stack.pop()
+                    self._encodeAndWriteLine('</' + item[0] + '>', len(stack))
+                    if stack and stack[-1][2]:
+                        stack[-1][4] = not stack[-1][4]
+                    continue
+                if item[2] and item[4]:
                     if isinstance(minfNode, six.string_types):
-                        self._write(
-                            minfNodeIterator, Undefined, level + 1, minfNode)
+                        name = minfNode
+                        item[4] = False
+                        continue
                     elif minfNode is None:
-                        if not stringNaming:
-                            self._write(
-                                minfNodeIterator, minfNode, level + 1, None)
-                        self._write(
-                            minfNodeIterator, Undefined, level + 1, None)
-                    else:
-                        self._write(
-                            minfNodeIterator, minfNode, level + 1, None)
-                        self._write(
-                            minfNodeIterator, Undefined, level + 1, None)
+                        item[4] = False
+                        if not item[3]:
+                            self._writeAtom(None, {}, len(stack))
+                        continue
+            elif isinstance(minfNode, EndStructure):
+                raise MinfError(
+                    _('Unexpected Minf structure ending: %s') % (minfNode.type, ))
+            attributes = {}
+            if name is not None:
+                attributes[nameAttribute] = name
+                name = None
+            level = len(stack)
+            if isinstance(minfNode, StartStructure):
+                if minfNode.type == listStructure:
+                    naming = False
+                    stringNaming = False
+                    length = minfNode.attributes.get('length')
+                    if length:
+                        attributes[lengthAttribute] = length
+                    tag = listTag
+                elif minfNode.type == dictStructure:
+                    naming = True
+                    stringNaming = False
+                    length = minfNode.attributes.get('length')
+                    if length:
+                        attributes[lengthAttribute] = length
+                    tag = dictionaryTag
                 else:
-                    self._write(minfNodeIterator, minfNode, level + 1, None)
-        elif isinstance(minfNode, EndStructure):
-            raise MinfError(
-                _('Unexpected Minf structure ending: %s') % (minfNode.type, ))
-            level -= 1
-        else:
-            if attributes:
-                attributesXML = ' ' + \
-                    ' '.join([n + '=' + xml_quoteattr(six.text_type(v))
-                             for n, v in six.iteritems(attributes)])
+                    naming = True
+                    stringNaming = True
+                    tag = factoryTag
+                    attributes[objectTypeAttribute] = minfNode.type
+                if attributes:
+                    attributes = ' ' + \
+                        ' '.join([n + '=' + _quoteattr(six.text_type(v))
+                                 for n, v in six.iteritems(attributes)])
+                else:
+                    attributes = ''
+                self._encodeAndWriteLine('<' + tag + attributes + '>', level)
+                stack.append([tag, minfNode.type, naming, stringNaming, True])
             else:
-                attributesXML = ''
-            if minfNode is None:
+                self._writeAtom(minfNode, attributes, level)
+                if stack and stack[-1][2]:
+                    stack[-1][4] = not stack[-1][4]
+
+    def _writeAtom(self, minfNode, attributes, level):
+        if attributes:
+            attributesXML = ' ' + \
+                ' '.join([n + '=' + _quoteattr(six.text_type(v))
+                         for n, v in six.iteritems(attributes)])
+        else:
+            attributesXML = ''
+        if minfNode is None:
+            self._encodeAndWriteLine(
+                '<' + noneTag + attributesXML + '/>', level)
+        elif isinstance(minfNode, bool):
+            if minfNode:
                 self._encodeAndWriteLine(
-                    '<' + noneTag + attributesXML + '/>', level)
-            elif isinstance(minfNode, bool):
-                if minfNode:
-                    self._encodeAndWriteLine(
-                        '<' + trueTag + attributesXML + '/>', level)
-                else:
-                    self._encodeAndWriteLine(
-                        '<' + falseTag + attributesXML + '/>', level)
-            elif isinstance(minfNode, (float,) + six.integer_types):
-                self._encodeAndWriteLine('<' + numberTag + attributesXML + '>' + six.text_type(minfNode) + '</' +
-                                         numberTag + '>', level)
-            elif isinstance(minfNode, six.string_types):
-
-                if type(minfNode) is six.binary_type:
-                    try:
-                        minfNode = minfNode.decode("utf-8")
-                    except UnicodeDecodeError:
-                        minfNode = minfNode.decode("iso-8859-1")
-                self._encodeAndWriteLine('<' + stringTag + attributesXML + '>' +
-                                         xml_escape(minfNode, xml_replacement) + '</' + stringTag + '>', level)
-            elif hasattr(minfNode, '__minfxml__'):
-                minfNode.__minfxml__(self, attributes, level)
+                    '<' + trueTag + attributesXML + '/>', level)
             else:
-                raise MinfError(
-                    _('Cannot save an object of type %s as an XML atom') % (str(type(minfNode)), ))
+                self._encodeAndWriteLine(
+                    '<' + falseTag + attributesXML + '/>', level)
+        elif isinstance(minfNode, (float,) + six.integer_types):
+            self._encodeAndWriteLine('<' + numberTag + attributesXML + '>' + six.text_type(minfNode) + '</' +
+                                     numberTag + '>', level)
+        elif isinstance(minfNode, six.string_types):
+
+            if type(minfNode) is six.binary_type:
+                try:
+                    minfNode = minfNode.decode("utf-8")
+                except UnicodeDecodeError:
+                    minfNode = minfNode.decode("iso-8859-1")
+            self._encodeAndWriteLine('<' + stringTag + attributesXML + '>' +
+                                     minfNode.translate(xml_escape_table) + '</' + stringTag + '>', level)
+        elif hasattr(minfNode, '__minfxml__'):
+            minfNode.__minfxml__(self, attributes, level)
+        else:
+            raise MinfError(
+                _('Cannot save an object of type %s as an XML atom') % (str(type(minfNode)), ))
 
     def _encodeAndWriteLine(self, line, level=0):
-        self._writeLine(self.encoder(line)[0], level=level)
+        self._writeLine(line, level=level)
 
     def _writeLine(self, line, level=0):
-        if self.level is None:
-            indent = ''
-            nl = ''
-            level = None
-        else:
-            indent = self.indentString * (self.level + level)
-            nl = '\n'
-        line = six.ensure_text(line, 'utf8')
-        try:
-            self.__file.write(indent + line + nl)
-        except TypeError:
-            # in python3 writing in a binary stream needs to write byte
-            # objects, not strings.
-            # however there is no [obvious] way to know if the file object
-            # is open in string or binary mode, and thus what it expects.
-            # if you want my opinion, it's completely crazy...
-            self.__file.write((indent + line + nl).encode())
+        if not isinstance(line, six.text_type):
+            line = six.ensure_text(line, 'utf8')
+        if self.level is not None:
+            line = self.indentString * (self.level + level) + line + '\n'
+        self._buffer.append(line)
+        self._bufferLength += len(line)
+        if self._bufferLength >= self.bufferSize:
+            self._flushBuffer()
+
+    def _flushBuffer(self):
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = []
+        self._bufferLength = 0
+        if not self._binaryFile:
+            try:
+                self.__file.write(data)
+                self._binaryFile = False
+                return
+            except TypeError:
+                # in python3 writing in a binary stream needs to write byte
+                # objects, not strings.
+                # however there is no [obvious] way to know if the file object
+                # is open in string or binary mode, and thus what it expects.
+                # if you want my opinion, it's completely crazy...
+                self._binaryFile = True
+        self.__file.write(data.encode(self.encoding))
 
     def flush(self):
+        self._flushBuffer()
         self.__file.flush()
 
     def change_file(self, file):
+        if self.__file is not None:
+            self._flushBuffer()
         self.__file = file
+        self._binaryFile = None
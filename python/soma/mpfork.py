@@ -48,16 +48,68 @@ Use:
 
 In case of error, the job result will be an exception with stack information: (exception type, exception instance, stack_info)
 
+Jobs may declare the resources they need by adding a dict as a sixth item
+to the job tuple: (job_index, function, args, kwargs, results_list,
+resources). resources may contain "cpu" (number of cores, 1 by default) and
+"memory" (in bytes, 0 by default). Such jobs only start when
+:data:`resource_budget` allows it (see :func:`set_resource_budget`), thus
+memory-hungry jobs do not run together beyond the memory available, while
+small jobs keep the cores busy. Once a job running in a forked process is
+finished, the peak resident memory size of the process (in bytes) is
+stored in the "max_rss" item of its resources dict (this is not available
+with :func:`allocate_pool_workers`, which processes run many jobs).
+
+::
+
+    set_resource_budget(cpu=8, memory=64 * 1024 ** 3, pin_cpus=True)
+    resources = {'cpu': 2, 'memory': 30 * 1024 ** 3}
+    q.put((0, big_processing, (), {}, res, resources))
+
+The :class:`ForkExecutor` class offers the same processing through the
+:class:`concurrent.futures.Executor` API, without managing queues, results
+lists and worker threads:
+
+::
+
+    with ForkExecutor(nworker=0) as executor:
+        futures = [executor.submit(sum, (i, i)) for i in range(njobs)]
+        for future in concurrent.futures.as_completed(futures):
+            print('result:', future.result())
+
+Large binary buffers in job results (the data of NumPy arrays for instance)
+are not copied through pickles: using pickle protocol 5 out-of-band buffers,
+the child process writes them once in a shared memory file (in
+``/dev/shm`` when available, in the default temporary directory when it is
+not or when it is full) which is memory-mapped in the parent process.
+Arrays returned to the parent are backed by this mapping, without copy.
+Buffers smaller than :data:`shared_memory_threshold` bytes are pickled
+normally. This requires Python >= 3.8.
+
+Forking a new process for each job has a cost which is significant for
+small jobs. :func:`allocate_pool_workers` is used exactly like
+:func:`allocate_workers`, but forks one long-lived process per worker when
+it is called (thus after heavy objects have been loaded, which are shared
+with the children). Jobs are then sent to these processes through pipes.
+This requires job functions and arguments to be picklable: jobs which
+cannot be pickled are run in a newly forked process, as with
+:func:`allocate_workers`.
+
 
 Availability: Unix
 '''
 
 from __future__ import print_function
 from __future__ import absolute_import
+import collections
+import concurrent.futures
+import errno
+import itertools
+import mmap
 import multiprocessing
 import threading
 import queue
 import os
+import signal
 import tempfile
 import sys
 from six.moves import range
@@ -66,29 +118,210 @@ try:
 except ImportError:
     import pickle
 
+#: results buffers of at least this size (in bytes) are transferred through
+#: shared memory instead of being pickled (see pickle protocol 5).
+shared_memory_threshold = 1 << 16
+
+if os.path.isdir('/dev/shm'):
+    _shm_dir = '/dev/shm'
+else:
+    _shm_dir = None
+# alignment of buffers in shared memory files
+_shm_alignment = 64
+# numbers the files prefixes of jobs
+_job_counter = itertools.count()
+# ru_maxrss is given in kilobytes, except on MacOS
+if sys.platform == 'darwin':
+    _max_rss_unit = 1
+else:
+    _max_rss_unit = 1024
+
+# processes forked by allocate_pool_workers()
+_pool_processes = set()
+_pool_lock = threading.Lock()
+
+
+def _aligned_size(size):
+    return (size + _shm_alignment - 1) // _shm_alignment * _shm_alignment
+
+
+def _job_prefix():
+    ''' Internal function: return a new prefix for the files of a job (or
+    of a pool process), used to remove them if the job does not complete.
+    '''
+    return 'mpfork_%d_%d_' % (os.getpid(), next(_job_counter))
+
+
+def _remove_job_files(prefix):
+    ''' Internal function: remove the files left by a job (or a pool
+    process) which has been killed or whose result could not be read.
+    '''
+    directories = set([tempfile.gettempdir()])
+    if _shm_dir is not None:
+        directories.add(_shm_dir)
+    for directory in directories:
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            continue
+        for name in names:
+            if name.startswith(prefix):
+                try:
+                    os.unlink(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+
+def _dump_result(result, prefix='mpfork_'):
+    ''' Internal function: serialize a job result. Large out-of-band
+    buffers are written in a shared memory file which is read by
+    :func:`_load_result`. If the shared memory is full, the file is written
+    in the default temporary directory.
+    '''
+    if pickle.HIGHEST_PROTOCOL < 5:
+        return pickle.dumps((pickle.dumps(result, protocol=2), None, ()),
+                            protocol=2)
+    buffers = []
+
+    def buffer_callback(buffer):
+        if buffer.raw().nbytes < max(shared_memory_threshold, 1):
+            # serialized in-band
+            return True
+        buffers.append(buffer)
+        return False
+
+    data = pickle.dumps(result, protocol=5, buffer_callback=buffer_callback)
+    if not buffers:
+        return pickle.dumps((data, None, ()), protocol=5)
+    if _shm_dir is not None:
+        directories = (_shm_dir, None)
+    else:
+        directories = (None, )
+    for directory in directories:
+        shm_file = None
+        try:
+            fd, shm_file = tempfile.mkstemp(prefix=prefix, dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                sizes = []
+                for buffer in buffers:
+                    raw = buffer.raw()
+                    f.write(raw)
+                    f.write(b'\0' * (_aligned_size(raw.nbytes) - raw.nbytes))
+                    sizes.append(raw.nbytes)
+        except Exception as e:
+            if shm_file is not None:
+                os.unlink(shm_file)
+            if directory is None or getattr(e, 'errno', None) != errno.ENOSPC:
+                raise
+            # shared memory is full: use the default temporary directory
+            continue
+        return pickle.dumps((data, shm_file, sizes), protocol=5)
+
+
+def _load_result(payload):
+    ''' Internal function: rebuild a job result serialized by
+    :func:`_dump_result`. Out-of-band buffers are memory-mapped, not copied.
+    '''
+    data, shm_file, sizes = pickle.loads(payload)
+    if shm_file is None:
+        return pickle.loads(data)
+    try:
+        with open(shm_file, 'r+b') as f:
+            mapping = mmap.mmap(f.fileno(), 0)
+    finally:
+        # the memory is freed when the mapping is not used any longer
+        os.unlink(shm_file)
+    view = memoryview(mapping)
+    buffers = []
+    offset = 0
+    for size in sizes:
+        buffers.append(view[offset:offset + size])
+        offset += _aligned_size(size)
+    return pickle.loads(data, buffers=buffers)
+
+
 def run_job(f, *args, **kwargs):
     ''' Internal function, runs the function in a remote process.
     Uses fork() to perform it.
 
     Availability: Unix
     '''
-    out_file = tempfile.mkstemp()
+    return _run_job(f, args, kwargs)
+
+
+class _JobTimer(object):
+    ''' Internal class: kills a process if a job lasts more than timeout
+    seconds. :meth:`finish` must be called before the process is reaped,
+    so that a reused pid is never killed.
+    '''
+
+    def __init__(self, pid, timeout):
+        self.lock = threading.Lock()
+        self.done = False
+        self.timed_out = False
+        self.timer = threading.Timer(timeout, self._kill, (pid, ))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _kill(self, pid):
+        with self.lock:
+            if not self.done:
+                self.timed_out = True
+                os.kill(pid, signal.SIGKILL)
+
+    def finish(self):
+        ''' Stop the timer. Returns True if the process has been killed. '''
+        self.timer.cancel()
+        with self.lock:
+            self.done = True
+        return self.timed_out
+
+
+def _run_job(f, args, kwargs, timeout=None, cpus=None, stats=None):
+    ''' Internal function: same as :func:`run_job`. If timeout is not None,
+    the process is killed after timeout seconds and
+    :class:`concurrent.futures.TimeoutError` is raised. If cpus is not None,
+    the process is pinned on these CPU cores. If stats is a dict, the peak
+    resident memory size of the process (in bytes) is stored in its
+    "max_rss" item.
+    '''
+    # the pickled result is small: only large buffers go in shared memory
+    out_file = tempfile.mkstemp(prefix='mpfork_')
+    prefix = _job_prefix()
     os.close(out_file[0])
     pid = os.fork()
     if pid != 0:
         # parent: wait for the child
-        pid, status = os.waitpid(pid, 0)
-        # read output file
-        #print('read from', os.getpid(), ':', out_file[1])
-        if os.stat(out_file[1]).st_size == 0:
-            # child did not write anything
-            os.unlink(out_file[1])
-            raise OSError('child did not output anything')
-        if status != 0:
+        if timeout is not None:
+            timer = _JobTimer(pid, timeout)
+            # wait without reaping the child
+            os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+            timed_out = timer.finish()
+        else:
+            timed_out = False
+        pid, status, rusage = os.wait4(pid, 0)
+        if stats is not None:
+            stats['max_rss'] = rusage.ru_maxrss * _max_rss_unit
+        try:
+            if timed_out:
+                raise concurrent.futures.TimeoutError(
+                    'job timeout (%s s) reached' % timeout)
+            # read output file
+            #print('read from', os.getpid(), ':', out_file[1])
+            if os.stat(out_file[1]).st_size == 0:
+                # child did not write anything
+                raise OSError('child did not output anything')
+            if status != 0:
+                raise RuntimeError('subprocess error: %d' % status)
+            with open(out_file[1], 'rb') as f:
+                payload = f.read()
+            result = _load_result(payload)
+        except Exception:
+            # a killed child may leave a shared memory file
+            _remove_job_files(prefix)
+            raise
+        finally:
             os.unlink(out_file[1])
-            raise RuntimeError('subprocess error: %d' % status)
-        result = pickle.load(open(out_file[1], 'rb'))
-        os.unlink(out_file[1])
         # traceback objects cannot be pickled...
         #if isinstance(result, tuple) and len(result) == 3 \
                 #and isinstance(result[1], Exception):
@@ -101,6 +334,8 @@ def run_job(f, *args, **kwargs):
     # child process
     try:
         try:
+            if cpus is not None:
+                os.sched_setaffinity(0, cpus)
             #print('exec in', os.getpid(), ':', f, args, kwargs)
             result = f(*args, **kwargs)
             #print('OK')
@@ -110,7 +345,9 @@ def run_job(f, *args, **kwargs):
             result = e
         #print('write:', out_file[1], ':', result)
         try:
-            pickle.dump(result, open(out_file[1], 'wb'), protocol=2)
+            payload = _dump_result(result, prefix)
+            with open(out_file[1], 'wb') as f:
+                f.write(payload)
         except Exception as e:
             print('pickle failed:', e, '\nfor object:', type(result))
     finally:
@@ -118,20 +355,264 @@ def run_job(f, *args, **kwargs):
         os._exit(0)
 
 
-def worker(q, thread_only, *args, **kwargs):
-    ''' Internal function: worker thread loop:
-    * pick a job in the queue q
-    * execute it, either in the current thread, or in a remote process (using
-      run_job()), depending on the thread_only parameter value
-    * store the result in the result list
-    * start again with another job
+class ResourceBudget(object):
+    ''' CPU and memory budget shared by all workers of the process. Jobs
+    declaring their requirements (see :func:`allocate_workers`) only start
+    when the budget allows it, in the order of their requests: a job
+    waiting for a large part of the budget is not overtaken by smaller
+    jobs. A job requiring more than the whole budget runs alone.
 
-    The loop ends when a job in the queue is None.
+    The budget used by workers is :data:`resource_budget`, see
+    :func:`set_resource_budget`.
+    '''
 
-    .. warning::
-        Here we are making use of fork() (Unix only) inside a thread. Some systems do not behave well in this situation.
-        See :func:`the os.fork() doc <os.fork>`
+    def __init__(self, cpu=None, memory=None, pin_cpus=False):
+        '''
+        Parameters
+        ----------
+        cpu: int
+            number of CPU cores available for jobs. None means no limit
+            (unless pin_cpus is True).
+        memory: int
+            memory (in bytes) available for jobs. None means no limit.
+        pin_cpus: bool
+            if True, forked job processes are pinned on their own CPU cores
+            (using :func:`os.sched_setaffinity`). Cores are taken in the
+            affinity of the current process, and cpu defaults to their
+            number.
+        '''
+        self.pin_cpus = pin_cpus
+        self._free_cpus = None
+        if pin_cpus:
+            self._free_cpus = sorted(os.sched_getaffinity(0))
+            if cpu is None or cpu > len(self._free_cpus):
+                cpu = len(self._free_cpus)
+            del self._free_cpus[cpu:]
+        self.cpu = cpu
+        self.memory = memory
+        self.used_cpu = 0
+        self.used_memory = 0
+        self._condition = threading.Condition()
+        # waiting acquire() calls, served in order
+        self._waiters = collections.deque()
+
+    def acquire(self, cpu=1, memory=0):
+        ''' Wait until cpu cores and memory bytes are available, and
+        reserve them. Returns a token to give to :meth:`release`. A job
+        requiring no CPU core (cpu=0) is not pinned. '''
+        if self.cpu is not None:
+            cpu = min(cpu, self.cpu)
+        if self.memory is not None:
+            memory = min(memory, self.memory)
+        with self._condition:
+            waiter = object()
+            self._waiters.append(waiter)
+            try:
+                while self._waiters[0] is not waiter \
+                        or (self.cpu is not None
+                            and self.used_cpu + cpu > self.cpu) \
+                        or (self.memory is not None
+                            and self.used_memory + memory > self.memory):
+                    self._condition.wait()
+            finally:
+                self._waiters.remove(waiter)
+                # the next waiter may fit in the remaining budget
+                self._condition.notify_all()
+            self.used_cpu += cpu
+            self.used_memory += memory
+            cpus = None
+            if self._free_cpus is not None and cpu > 0:
+                cpus = self._free_cpus[:cpu]
+                del self._free_cpus[:cpu]
+            return (cpu, memory, cpus)
+
+    def release(self, token):
+        ''' Give back resources reserved by :meth:`acquire`. '''
+        cpu, memory, cpus = token
+        with self._condition:
+            self.used_cpu -= cpu
+            self.used_memory -= memory
+            if cpus is not None:
+                self._free_cpus.extend(cpus)
+            self._condition.notify_all()
+
+
+#: budget used by workers for jobs declaring their requirements. It has no
+#: limit by default.
+resource_budget = ResourceBudget()
+
+
+def set_resource_budget(cpu=None, memory=None, pin_cpus=False):
+    ''' Replace :data:`resource_budget`. Parameters are those of
+    :class:`ResourceBudget`. Jobs already started keep the previous budget.
     '''
+    global resource_budget
+    resource_budget = ResourceBudget(cpu=cpu, memory=memory,
+                                     pin_cpus=pin_cpus)
+    return resource_budget
+
+
+def _run_in_thread(f, *args, **kwargs):
+    try:
+        return f(*args, **kwargs)
+    except Exception as e:
+        return e
+
+
+def _pool_child_loop(jobs_fd, results_fd, prefix):
+    ''' Internal function: loop of a process forked by
+    :class:`PoolProcess`. Jobs (function, args, kwargs) are read from the
+    jobs pipe and their results written to the results pipe. Shared memory
+    files are named using prefix.
+    '''
+    try:
+        jobs = os.fdopen(jobs_fd, 'rb')
+        results = os.fdopen(results_fd, 'wb')
+        while True:
+            try:
+                job = pickle.load(jobs)
+            except EOFError:
+                break
+            if job is None:
+                break
+            f, args, kwargs = job
+            try:
+                result = f(*args, **kwargs)
+            except Exception as e:
+                result = e
+            try:
+                payload = _dump_result(result, prefix)
+            except Exception as e:
+                print('pickle failed:', e, '\nfor object:', type(result))
+                payload = _dump_result(
+                    RuntimeError('result pickle failed: %s' % e), prefix)
+            pickle.dump(payload, results, protocol=pickle.HIGHEST_PROTOCOL)
+            results.flush()
+    finally:
+        # sys.exit() is not enough
+        os._exit(0)
+
+
+class PoolProcess(object):
+    ''' A forked process running jobs sent through a pipe. Used by
+    :func:`allocate_pool_workers`.
+
+    Availability: Unix
+    '''
+
+    def __init__(self):
+        self.pid = None
+        self.start()
+
+    def start(self):
+        ''' Fork the process. '''
+        # forks are serialized so that every child knows the pipes of all
+        # other pool processes
+        with _pool_lock:
+            self.prefix = _job_prefix()
+            jobs_r, jobs_w = os.pipe()
+            results_r, results_w = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                # child process: pipes of other pool processes must be
+                # closed, otherwise their end would not be noticed by the
+                # parent. Only file descriptors are closed: the file objects
+                # may be locked by another thread of the parent at fork time.
+                os.close(jobs_w)
+                os.close(results_r)
+                for process in list(_pool_processes):
+                    for fd in process.fds:
+                        try:
+                            os.close(fd)
+                        except OSError:
+                            pass
+                _pool_child_loop(jobs_r, results_w, self.prefix)
+            os.close(jobs_r)
+            os.close(results_w)
+            self.pid = pid
+            self.pinned = False
+            self.fds = (jobs_w, results_r)
+            self.jobs = os.fdopen(jobs_w, 'wb')
+            self.results = os.fdopen(results_r, 'rb')
+            _pool_processes.add(self)
+
+    def _close_pipes(self):
+        for f in (self.jobs, self.results):
+            try:
+                f.close()
+            except (IOError, OSError):
+                pass
+
+    def stop(self):
+        ''' Terminate the process once the current job is done. '''
+        if self.pid is None:
+            return
+        with _pool_lock:
+            _pool_processes.discard(self)
+        try:
+            pickle.dump(None, self.jobs, protocol=2)
+            self.jobs.flush()
+        except (IOError, OSError):
+            pass
+        self._close_pipes()
+        os.waitpid(self.pid, 0)
+        self.pid = None
+
+    def restart(self):
+        self.stop()
+        # the process may have been killed while writing a result
+        _remove_job_files(self.prefix)
+        self.start()
+
+    def run_job(self, f, *args, **kwargs):
+        ''' Same as :func:`run_job` but runs the function in this process.
+        If the function or its parameters cannot be pickled, it is run using
+        :func:`run_job` instead.
+        '''
+        return self._run_job(f, args, kwargs)
+
+    def _run_job(self, f, args, kwargs, timeout=None, cpus=None):
+        try:
+            data = pickle.dumps((f, args, kwargs),
+                                protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return _run_job(f, args, kwargs, timeout, cpus)
+        if cpus is not None:
+            os.sched_setaffinity(self.pid, cpus)
+        elif self.pinned:
+            os.sched_setaffinity(self.pid, os.sched_getaffinity(0))
+        self.pinned = (cpus is not None)
+        timer = None
+        try:
+            self.jobs.write(data)
+            self.jobs.flush()
+            if timeout is not None:
+                timer = _JobTimer(self.pid, timeout)
+            payload = pickle.load(self.results)
+        except (EOFError, IOError, OSError, pickle.UnpicklingError):
+            # the process died (sys.exit(), crash, timeout...): replace it
+            timed_out = timer is not None and timer.finish()
+            self.restart()
+            if timed_out:
+                raise concurrent.futures.TimeoutError('job timeout (%s s) reached' % timeout)
+            raise OSError('child did not output anything')
+        killed = timer is not None and timer.finish()
+        try:
+            result = _load_result(payload)
+        except Exception:
+            _remove_job_files(self.prefix)
+            raise
+        finally:
+            if killed:
+                # killed just after the result was sent: the result files
+                # are read before the process files are cleaned
+                self.restart()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def _worker_loop(q, run, args, kwargs):
     while True:
         item = q.get()
         if item is None:
@@ -140,18 +621,24 @@ def worker(q, thread_only, *args, **kwargs):
         try:
             #print('run item in', os.getpid(), ':', item[:-1])
             sys.stdout.flush()
-            i, f, argsi, kwargsi, res = item
+            if len(item) > 5:
+                i, f, argsi, kwargsi, res, resources = item
+            else:
+                i, f, argsi, kwargsi, res = item
+                resources = None
             argsi = argsi + args
-            kwargs = dict(kwargs)
-            kwargs.update(kwargsi)
+            kwargsi = dict(kwargs, **kwargsi)
             try:
-                if thread_only:
-                    try:
-                        result = f(*argsi, **kwargs)
-                    except Exception as e:
-                        result = e
+                if resources is None:
+                    result = run(f, argsi, kwargsi, None, None)
                 else:
-                    result = run_job(f, *argsi, **kwargs)
+                    budget = resource_budget
+                    token = budget.acquire(resources.get('cpu', 1),
+                                           resources.get('memory', 0))
+                    try:
+                        result = run(f, argsi, kwargsi, token[2], resources)
+                    finally:
+                        budget.release(token)
                 #print('result:', i, result)
                 res[i] = result
             except Exception as e:
@@ -163,6 +650,53 @@ def worker(q, thread_only, *args, **kwargs):
             sys.stdout.flush()
 
 
+def worker(q, thread_only, *args, **kwargs):
+    ''' Internal function: worker thread loop:
+    * pick a job in the queue q
+    * execute it, either in the current thread, or in a remote process (using
+      run_job()), depending on the thread_only parameter value
+    * store the result in the result list
+    * start again with another job
+
+    The loop ends when a job in the queue is None.
+
+    .. warning::
+        Here we are making use of fork() (Unix only) inside a thread. Some systems do not behave well in this situation.
+        See :func:`the os.fork() doc <os.fork>`
+    '''
+    if thread_only:
+        def run(f, args, kwargs, cpus, stats):
+            return _run_in_thread(f, *args, **kwargs)
+    else:
+        def run(f, args, kwargs, cpus, stats):
+            return _run_job(f, args, kwargs, cpus=cpus, stats=stats)
+    _worker_loop(q, run, args, kwargs)
+
+
+def pool_worker(q, process, *args, **kwargs):
+    ''' Internal function: same as :func:`worker` but jobs are run in the
+    :class:`PoolProcess` process. Jobs which cannot be pickled are run using
+    :func:`run_job`. The process is stopped when the loop ends.
+    '''
+    def run(f, args, kwargs, cpus, stats):
+        return process._run_job(f, args, kwargs, cpus=cpus)
+
+    try:
+        _worker_loop(q, run, args, kwargs)
+    finally:
+        process.stop()
+
+
+def _workers_number(nworker):
+    if nworker == 0:
+        nworker = multiprocessing.cpu_count()
+    elif nworker < 0:
+        nworker = multiprocessing.cpu_count() + nworker
+        if nworker < 1:
+            nworker = 1
+    return nworker
+
+
 def allocate_workers(q, nworker=0, thread_only=False, *args, **kwargs):
     ''' Utility function to allocate worker threads.
 
@@ -183,18 +717,17 @@ def allocate_workers(q, nworker=0, thread_only=False, *args, **kwargs):
         additional arguments will be passed to the job function(s) after
         individual jobs arguments: they are args common to all jobs (if any)
 
+    Jobs may have a sixth item, a dict of required resources (see
+    :class:`ResourceBudget`): {'cpu': n_cores, 'memory': n_bytes}. The peak
+    resident memory size of the job process is stored in its 'max_rss' item.
+
     Returns
     -------
     workers: list
         workers list, each is a :class:`thread <threading.Thread>` instance
         running the worker loop function. Threads are already started (ie.
     '''
-    if nworker == 0:
-        nworker = multiprocessing.cpu_count()
-    elif nworker < 0:
-        nworker = multiprocessing.cpu_count() + nworker
-        if nworker < 1:
-            nworker = 1
+    nworker = _workers_number(nworker)
     workers = []
     for i in range(nworker):
         w = threading.Thread(target=worker, args=(q, thread_only) + args,
@@ -202,3 +735,162 @@ def allocate_workers(q, nworker=0, thread_only=False, *args, **kwargs):
         w.start()
         workers.append(w)
     return workers
+
+
+def allocate_pool_workers(q, nworker=0, *args, **kwargs):
+    ''' Same as :func:`allocate_workers` (with thread_only=False), but
+    each worker thread sends its jobs to a long-lived forked process
+    (:class:`PoolProcess`) instead of forking a new process for each job.
+    Processes are forked when this function is called, thus objects loaded
+    before are shared with them. The processes end with their worker thread.
+
+    Job functions, arguments and results are passed through pipes using
+    pickles. Jobs which cannot be pickled are run in a new forked process,
+    as in :func:`allocate_workers`.
+
+    Returns
+    -------
+    workers: list
+        workers list, each is a :class:`thread <threading.Thread>` instance
+        running the :func:`pool_worker` loop function. Threads are already
+        started.
+
+    Availability: Unix
+    '''
+    nworker = _workers_number(nworker)
+    # fork all processes before starting threads
+    processes = [PoolProcess() for i in range(nworker)]
+    workers = []
+    for process in processes:
+        w = threading.Thread(target=pool_worker, args=(q, process) + args,
+                             kwargs=kwargs)
+        w.start()
+        workers.append(w)
+    return workers
+
+
+# marks the default value of ForkExecutor.submit_job() timeout
+_default_timeout = object()
+
+
+class ForkExecutor(concurrent.futures.Executor):
+    ''' :class:`concurrent.futures.Executor` running jobs in forked
+    processes, using the same mechanisms as :func:`allocate_workers` and
+    :func:`allocate_pool_workers`.
+
+    Jobs are run by worker threads. Each job returns a
+    :class:`concurrent.futures.Future`, thus results may be consumed as they
+    are completed (see :func:`concurrent.futures.as_completed`). Jobs which
+    are still queued may be cancelled using :meth:`Future.cancel()
+    <concurrent.futures.Future.cancel>`. The process of a job which exceeds
+    its timeout is killed, and its future gets a
+    :class:`concurrent.futures.TimeoutError` exception.
+
+    Availability: Unix
+    '''
+
+    def __init__(self, nworker=0, thread_only=False, pool=False,
+                 timeout=None):
+        '''
+        Parameters
+        ----------
+        nworker: int
+            number of worker threads, see :func:`allocate_workers`.
+        thread_only: bool
+            if True, jobs run in the worker threads, not in forked processes.
+            Timeouts are not supported in this mode.
+        pool: bool
+            if True, each worker sends its jobs to a long-lived forked
+            process (see :func:`allocate_pool_workers`), forked in this
+            constructor. Otherwise a process is forked for each job.
+        timeout: float
+            default timeout (in seconds) of jobs, None means no timeout.
+        '''
+        self.thread_only = thread_only
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._shutdown = False
+        self._shutdown_lock = threading.Lock()
+        nworker = _workers_number(nworker)
+        if pool and not thread_only:
+            processes = [PoolProcess() for i in range(nworker)]
+        else:
+            processes = [None] * nworker
+        self._workers = []
+        for process in processes:
+            w = threading.Thread(target=self._worker, args=(process, ))
+            w.daemon = True
+            w.start()
+            self._workers.append(w)
+
+    def submit(self, fn, *args, **kwargs):
+        ''' Schedule the job fn(*args, **kwargs) and return a
+        :class:`concurrent.futures.Future` instance. The executor default
+        timeout applies.
+        '''
+        return self.submit_job(fn, args, kwargs)
+
+    def submit_job(self, fn, args=(), kwargs={}, timeout=_default_timeout):
+        ''' Same as :meth:`submit`, with a specific timeout for this job
+        (None means no timeout).
+        '''
+        if timeout is _default_timeout:
+            timeout = self.timeout
+        future = concurrent.futures.Future()
+        with self._shutdown_lock:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new jobs after shutdown')
+            self._queue.put((future, fn, args, kwargs, timeout))
+        return future
+
+    def submit_async(self, fn, *args, **kwargs):
+        ''' Same as :meth:`submit` but returns an :mod:`asyncio` future,
+        to be awaited in a coroutine of the running event loop.
+        '''
+        import asyncio
+        return asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        ''' Stop the workers once queued jobs are done. If cancel_futures
+        is True, queued jobs are cancelled instead. '''
+        with self._shutdown_lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    item[0].cancel()
+            for w in self._workers:
+                self._queue.put(None)
+        if wait:
+            for w in self._workers:
+                w.join()
+
+    def _worker(self, process):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                future, f, args, kwargs, timeout = item
+                if not future.set_running_or_notify_cancel():
+                    # cancelled
+                    continue
+                try:
+                    if self.thread_only:
+                        result = f(*args, **kwargs)
+                    elif process is not None:
+                        result = process._run_job(f, args, kwargs, timeout)
+                    else:
+                        result = _run_job(f, args, kwargs, timeout)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            if process is not None:
+                process.stop()
@@ -47,11 +47,143 @@ __docformat__ = "restructuredtext en"
 import six
 from six.moves import range
 import sys
+import weakref
 
 from soma.translation import translate as _
 from soma.functiontools import checkParameterCount, numberOfParameterRange
 from soma.undefined import Undefined
 from soma.sorted_dictionary import SortedDictionary
+from soma.utils.weak_proxy import get_ref, proxy_method
+
+#-------------------------------------------------------------------------
+
+
+def _isHashable(key):
+    try:
+        hash(key)
+    except TypeError:
+        return False
+    return True
+
+
+def _referent(proxy):
+    '''
+    Object referenced by a weak proxy, or None if it has been deleted.
+    '''
+    try:
+        return get_ref(proxy)
+    except (ReferenceError, AttributeError):
+        return None
+
+
+def _isBoundMethod(listener):
+    return getattr(listener, '__self__', None) is not None \
+        and hasattr(listener, '__func__')
+
+
+def _listenerEntry(listener, weak):
+    '''
+    Returns the key identifying a listener in a notifier, the callable to
+    register and the object whose deletion must remove the listener (None if
+    the listener is not a weak reference).
+
+    If *weak* is True and *listener* is a bound method, the registered
+    callable is a :class:`proxy_method <soma.utils.weak_proxy.proxy_method>`
+    which does not keep a reference to the method object. Listeners which
+    are already weak (:class:`proxy_method
+    <soma.utils.weak_proxy.proxy_method>` or weak proxies) are watched too.
+    '''
+    if weak and _isBoundMethod(listener):
+        obj = listener.__self__
+        return (('weak', id(obj), listener.__func__),
+                proxy_method(listener), obj)
+    watched = None
+    if isinstance(listener, proxy_method):
+        watched = _referent(listener.proxy)
+    elif isinstance(listener, weakref.ProxyTypes):
+        watched = _referent(listener)
+    return listener, listener, watched
+
+
+def _isDead(listener):
+    '''
+    True if *listener* is a weak proxy (or uses one) whose object has been
+    deleted.
+    '''
+    try:
+        # isinstance() raises ReferenceError on a dead weak proxy
+        if isinstance(listener, ReorderedCall):
+            listener = listener._function
+        if isinstance(listener, proxy_method):
+            listener.proxy.__class__
+        elif isinstance(listener, weakref.ProxyTypes):
+            listener.__class__
+    except ReferenceError:
+        return True
+    return False
+
+
+class ListenerHandle(object):
+
+    '''
+    Registration of a listener in a :class:`Notifier`, returned by
+    :meth:`Notifier.add` and :meth:`ObservableAttributes.onAttributeChange`.
+    :meth:`close` removes the listener in constant time. A handle is also a
+    context manager removing the listener at the end of the ``with`` block.
+
+    A handle does not keep its notifier alive. When the listener is a weak
+    reference, it is removed as soon as the referenced object is deleted,
+    without waiting for a notification.
+    '''
+
+    __slots__ = ('_notifier', 'listener', '_key', '_watch', '__weakref__')
+
+    def __init__(self, notifier, listener, key, watched=None):
+        self._notifier = weakref.ref(notifier)
+        #: registered callable (or :class:`Notifier`)
+        self.listener = listener
+        self._key = key
+        self._watch = None
+        if watched is not None:
+            handle = weakref.ref(self)
+
+            def deleted(ref):
+                handle_ = handle()
+                if handle_ is not None:
+                    handle_.close()
+            try:
+                self._watch = weakref.ref(watched, deleted)
+            except TypeError:
+                # watched does not support weak references: the listener
+                # will be removed on notification (ReferenceError)
+                pass
+
+    def isActive(self):
+        '''
+        True if the listener is still registered.
+        '''
+        notifier = self._notifier()
+        return notifier is not None and self in notifier._handles
+
+    def close(self):
+        '''
+        Remove the listener from its notifier.
+
+        Returns
+        -------
+        bool:
+            *True* if the listener was registered, *False* otherwise.
+        '''
+        notifier = self._notifier()
+        if notifier is None:
+            return False
+        return notifier._removeHandle(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 #-------------------------------------------------------------------------
 
@@ -73,11 +205,19 @@ class Notifier(object):
             if not None, each registered function must be callable with that
             number of arguments (checking is done on registration).
         '''
-        self._listeners = []
+        # ListenerHandle -> registered listener, in registration order
+        self._handles = {}
+        # listener key -> ListenerHandle, for hashable listeners
+        self._index = {}
         self._parameterCount = parameterCount
         self._delayedNotification = None
 
-    def add(self, listener):
+    @property
+    def _listeners(self):
+        # registered listeners, in registration order
+        return list(self._handles.values())
+
+    def add(self, listener, weak=False):
         '''
         Register a callable or a Notifier that will be called whenever
         :meth:`notify` is called. If the notifier has a *parameterCount*,
@@ -88,9 +228,23 @@ class Notifier(object):
         ----------
         listener: Python callable (function, method, *etc*.) or :class:`Notifier` instance
             item to add to the notification list.
-        '''
+        weak: bool
+            if *True* and *listener* is a bound method, the notifier does not
+            keep its object alive: the listener is removed when the object is
+            deleted. Listeners which are :class:`proxy_method
+            <soma.utils.weak_proxy.proxy_method>` or weak proxies are also
+            removed when their object is deleted.
 
-        if listener not in self._listeners:
+        Returns
+        -------
+        :class:`ListenerHandle`:
+            registration of the listener (the existing one if *listener* is
+            already registered, weakly or not), :meth:`ListenerHandle.close`
+            removes it.
+        '''
+        key, registered, watched = _listenerEntry(listener, weak)
+        handle = self._lookupListener(listener, key)
+        if handle is None:
             if self._parameterCount is not None:
                 if isinstance(listener, Notifier):
                     if listener._parameterCount is not None and \
@@ -102,7 +256,45 @@ class Notifier(object):
                                               'other': listener._parameterCount})
                 else:
                     checkParameterCount(listener, self._parameterCount)
-            self._listeners.append(listener)
+            handle = self._register(key, registered, watched)
+        return handle
+
+    def _lookup(self, key):
+        if _isHashable(key):
+            return self._index.get(key)
+        for handle in self._handles:
+            if handle._key == key:
+                return handle
+        return None
+
+    def _lookupListener(self, listener, key=None):
+        # a bound method is registered once, either strongly or weakly
+        if key is not None:
+            handle = self._lookup(key)
+            if handle is not None:
+                return handle
+        handle = self._lookup(listener)
+        if handle is None and _isBoundMethod(listener):
+            handle = self._lookup(_listenerEntry(listener, True)[0])
+        return handle
+
+    def _register(self, key, listener, watched):
+        handle = ListenerHandle(self, listener, key, watched)
+        self._handles[handle] = listener
+        if _isHashable(key):
+            self._index[key] = handle
+        return handle
+
+    def _removeHandle(self, handle):
+        try:
+            del self._handles[handle]
+        except KeyError:
+            return False
+        key = handle._key
+        if _isHashable(key) and self._index.get(key) is handle:
+            del self._index[key]
+        handle._watch = None
+        return True
 
     def remove(self, listener):
         '''
@@ -118,13 +310,33 @@ class Notifier(object):
         bool:
             *True* if a listener has been removed, *False* otherwise.
         '''
+        handle = self._lookupListener(listener)
+        if handle is None:
+            return False
+        return self._removeHandle(handle)
 
-        try:
-            self._listeners.remove(listener)
-            result = True
-        except ValueError:
-            result = False
-        return result
+    def removeDeadListeners(self):
+        '''
+        Remove the listeners which are weak proxies (or :class:`proxy_method
+        <soma.utils.weak_proxy.proxy_method>`) on deleted objects, without
+        notification. Weak listeners are normally removed as soon as their
+        object is deleted: this is only needed for weak listeners whose object
+        could not be found at registration. Registered notifiers are also
+        cleaned.
+
+        Returns
+        -------
+        int:
+            number of removed listeners.
+        '''
+        count = 0
+        for handle, listener in tuple(self._handles.items()):
+            if _isDead(listener):
+                if self._removeHandle(handle):
+                    count += 1
+            elif isinstance(listener, Notifier):
+                count += listener.removeDeadListeners()
+        return count
 
     def notify(self, *args):
         '''
@@ -136,11 +348,9 @@ class Notifier(object):
         .. seealso:: :meth:`delayNotification`, :meth:`restartNotification`
         '''
         if self._delayedNotification is None:
-            # if self._listeners: print '!notify!', self, ':', args, '(' + str(len( self._listeners )), 'listeners)'
-            # Iterate on a copy of self._listeners because this list can be modified
+            # Iterate on a copy of self._handles because it can be modified
             # by a listener during notification loop.
-            for listener in tuple(self._listeners):
-                # print '!notify!  -->', listener
+            for handle, listener in tuple(self._handles.items()):
                 try:
                     if isinstance(listener, Notifier):
                         listener.notify(*args)
@@ -148,7 +358,7 @@ class Notifier(object):
                         listener(*args)
                 except ReferenceError:
                     # listener is deleted in a weak ref/proxy
-                    self._listeners.remove(listener)
+                    self._removeHandle(handle)
 
         else:
             if self._delayedNotificationIgnoreDoubles:
@@ -240,15 +450,20 @@ class VariableParametersNotifier(Notifier):
                 mainParameters.index(i) for i in p]
             self.__min = min(self.__min, len(mainParameters))
 
-    def add(self, listener):
+    def add(self, listener, weak=False):
         '''
         .. seealso:: :meth:`Notifier.add`
 
-        **todo:** documentation
+        The listener is called with the parameters corresponding to its
+        parameters count. The returned :class:`ListenerHandle` and
+        :meth:`remove` use the listener itself, not the wrapper reordering
+        the parameters.
         '''
         if isinstance(listener, Notifier):
-            realListener = listener
-        else:
+            return Notifier.add(self, listener)
+        key, registered, watched = _listenerEntry(listener, weak)
+        handle = self._lookupListener(listener, key)
+        if handle is None:
             min, max = numberOfParameterRange(listener)
             if max is None:
                 paramCount = self.__max
@@ -259,23 +474,9 @@ class VariableParametersNotifier(Notifier):
                 raise RuntimeError(_('%(f)s has an invalid parameter count '
                                      '(%(c)d)') %
                                    {'f': str(listener), 'c': paramCount})
-            realListener = ReorderedCall(listener, paramOrder)
-        Notifier.add(self, realListener)
-
-    def remove(self, listener):
-        '''
-        .. seealso:: :meth:`Notifier.remove`
-
-        **todo:** documentation
-        '''
-
-        for i in range(len(self._listeners)):
-            c = self._listeners[i]
-            if ( isinstance( c, ReorderedCall ) and c._function == listener ) or \
-                    c == listener:
-                del self._listeners[i]
-                return True
-        return False
+            handle = self._register(key, ReorderedCall(registered, paramOrder),
+                                    watched)
+        return handle
 
 
 #-------------------------------------------------------------------------
@@ -361,7 +562,7 @@ class ObservableAttributes(object):
         # Delete notifier for the deleted attribute
         self._onAttributeChange.pop(name, None)
 
-    def onAttributeChange(self, first, second=None):
+    def onAttributeChange(self, first, second=None, weak=False):
         '''
         Registers a function to be called when an attribute is modified or
         deleted. To call the function for any attribute modification, use the
@@ -394,17 +595,26 @@ class ObservableAttributes(object):
 
         If the function accepts a variable number of parameters, it will be
         called with the maximum number of arguments possible.
+
+        If *weak* is True and the function is a bound method, its object is
+        not kept alive by the registration: the function is removed when the
+        object is deleted (see :meth:`Notifier.add`). Use it for listeners
+        which belong to views or other short lived objects.
+
+        Returns a :class:`ListenerHandle` whose
+        :meth:`close <ListenerHandle.close>` method removes the function.
         '''
         if second is None:
             if hasattr(self, '_onAnyAttributeChange'):
-                self._onAnyAttributeChange.add(first)
+                return self._onAnyAttributeChange.add(first, weak)
         else:
             if hasattr(self, '_onAttributeChange'):
                 notifier = self._onAttributeChange.get(first)
                 if notifier is None:
                     notifier = self._createAttributeNotifier()
                     self._onAttributeChange[first] = notifier
-                notifier.add(second)
+                return notifier.add(second, weak)
+        return None
 
     def removeOnAttributeChange(self, first, second=None):
         '''
@@ -1467,16 +1677,17 @@ class ObservableNotifier(Notifier):
         self.onAddFirstListener = Notifier()
         self.onRemoveLastListener = Notifier()
 
-    def add(self, listener):
-        nbListenersBefore = len(self._listeners)
-        Notifier.add(self, listener)
+    def add(self, listener, weak=False):
+        nbListenersBefore = len(self._handles)
+        handle = Notifier.add(self, listener, weak)
         if nbListenersBefore == 0:  # before add : 0 listener, after : 1 listener -> add first listener
-            if len(self._listeners) == 1:
+            if len(self._handles) == 1:
                 self.onAddFirstListener.notify()
+        return handle
 
-    def remove(self, listener):
-        nbListenersBefore = len(self._listeners)
-        Notifier.remove(self, listener)
-        if nbListenersBefore == 1:  # before add : 1 listener, after : 0 listener -> remove last listener
-            if len(self._listeners) == 0:
-                self.onRemoveLastListener.notify()
+    def _removeHandle(self, handle):
+        # called by remove(), by handles and when weak listeners are deleted
+        result = Notifier._removeHandle(self, handle)
+        if result and len(self._handles) == 0:  # last listener removed
+            self.onRemoveLastListener.notify()
+        return result
@@ -43,14 +43,15 @@ Some useful functions to manage file or directorie names.
 __docformat__ = "restructuredtext en"
 
 import os
-import platform
 import fnmatch
+import functools
 import glob
 import hashlib
 import re
-import shutil
 import six
 import sys
+import threading
+import time
 
 
 def split_path(path):
@@ -396,6 +397,79 @@ def update_query_string(
     return urlparse.urlunparse(url_new)
 
 
+# directory -> (mtime, sorted names, set of names)
+_directory_index = {}
+_directory_index_lock = threading.Lock()
+
+
+def directory_index(directory):
+    '''
+    Return the sorted list and the set of the names of the entries of a
+    directory. The listing is read with :func:`os.scandir` and kept in a
+    process-wide cache until the modification time of the directory
+    changes. A directory which cannot be read gives empty results.
+
+    Returns
+    -------
+    names: tuple
+        sorted names of the directory entries
+    name_set: frozenset
+        the same names, for fast membership tests
+    '''
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return ((), frozenset())
+    cached = _directory_index.get(directory)
+    if cached is not None and cached[0] == mtime:
+        return cached[1:]
+    try:
+        with os.scandir(directory) as entries:
+            names = tuple(sorted(entry.name for entry in entries))
+    except OSError:
+        names = ()
+    index = (mtime, names, frozenset(names))
+    # a directory modified in the same (possibly coarse) time unit as the
+    # listing could change again without changing its modification time
+    if time.time() - mtime * 1e-9 > 2.:
+        with _directory_index_lock:
+            _directory_index[directory] = index
+    return index[1:]
+
+
+def clear_directory_index():
+    '''
+    Empty the cache of :func:`directory_index`.
+    '''
+    with _directory_index_lock:
+        _directory_index.clear()
+
+
+def match_in_directory(directory, pattern):
+    '''
+    Return the sorted names of the entries of a directory matching a
+    :mod:`glob` pattern without directory separator (as
+    :func:`glob.glob` does: ``*`` does not match a leading dot), using
+    the cached listing of :func:`directory_index`.
+    '''
+    names, name_set = directory_index(directory)
+    if not glob.has_magic(pattern):
+        if pattern in name_set:
+            return [pattern]
+        return []
+    matches = fnmatch.filter(names, pattern)
+    if not pattern.startswith('.'):
+        matches = [name for name in matches if not name.startswith('.')]
+    return matches
+
+
+@functools.lru_cache(maxsize=64)
+def _path_directories(path, cwd):
+    # directories of a path variable value (relative to cwd)
+    return tuple(p for p in (os.path.normpath(os.path.abspath(i))
+                             for i in path.split(os.pathsep)) if p)
+
+
 def find_in_path(file, path=None):
     '''
     Look for a file in a series of directories. By default, directories are
@@ -403,24 +477,34 @@ def find_in_path(file, path=None):
     variable name or a sequence of directories names can be given in *path*
     parameter.
 
+    Directory contents are read once and cached (see
+    :func:`directory_index`).
+
     Examples::
 
       find_in_path('sh') could return '/bin/sh'
       find_in_path('libpython3.10.so', 'LD_LIBRARY_PATH') could return '/usr/lib/x86_64-linux-gnu/libpython3.10.so'
     '''
     if path is None:
-        path = os.environ.get('PATH').split(os.pathsep)
+        path = _path_directories(os.environ.get('PATH'), os.getcwd())
     elif isinstance(path, six.string_types):
         var = os.environ.get(path)
         if var is None:
             var = path
-        path = var.split(os.pathsep)
-    for i in path:
-        p = os.path.normpath(os.path.abspath(i))
-        if p:
+        path = _path_directories(var, os.getcwd())
+    else:
+        path = [p for p in (os.path.normpath(os.path.abspath(i))
+                            for i in path) if p]
+    if os.sep in file or (os.altsep and os.altsep in file):
+        for p in path:
             r = glob.glob(os.path.join(p, file))
             if r:
                 return r[0]
+        return None
+    for p in path:
+        r = match_in_directory(p, file)
+        if r:
+            return os.path.join(p, r[0])
 
 
 def locate_file(pattern, root=os.curdir):
@@ -441,31 +525,184 @@ def locate_file(pattern, root=os.curdir):
             return os.path.join(path, filename)
 
 
-def update_hash_from_directory(directory, hash):
+#: size of the blocks read to compute file digests
+hash_block_size = 1 << 20
+
+
+def _update_hash_from_file(file_name, hash):
+    # read the file by blocks in a reused buffer
+    buffer = bytearray(hash_block_size)
+    view = memoryview(buffer)
+    with open(file_name, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hash.update(view[:n])
+
+
+class FileDigestCache(object):
+    '''
+    Cache of file digests used by :func:`path_hash` and
+    :func:`update_hash_from_directory`. A digest is reused as long as the
+    size, modification time and inode of the file are unchanged, so
+    unchanged files are not read again.
+
+    If a file name is given, the cache is read from this file and
+    :meth:`save` writes it back (in JSON format).
+    '''
+
+    def __init__(self, file_name=None):
+        self.file_name = file_name
+        self._lock = threading.Lock()
+        self._modified = False
+        # (algorithm, path) -> (size, mtime_ns, inode, hexdigest)
+        self._digests = {}
+        if file_name is not None and os.path.exists(file_name):
+            import json
+            with open(file_name) as f:
+                for algorithm, path, size, mtime, inode, digest \
+                        in json.load(f):
+                    self._digests[(algorithm, path)] = (size, mtime, inode,
+                                                        digest)
+
+    def digest(self, file_name, algorithm, stat=None):
+        '''
+        Return the digest (bytes) of the content of a file, computed with
+        the given algorithm (a name accepted by :func:`hashlib.new`).
+        '''
+        if stat is None:
+            stat = os.stat(file_name)
+        key = (algorithm, os.path.abspath(file_name))
+        state = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        with self._lock:
+            cached = self._digests.get(key)
+        if cached is not None and cached[:3] == state:
+            return bytes.fromhex(cached[3])
+        hash = hashlib.new(algorithm)
+        _update_hash_from_file(file_name, hash)
+        digest = hash.digest()
+        with self._lock:
+            self._digests[key] = state + (digest.hex(), )
+            self._modified = True
+        return digest
+
+    def save(self):
+        '''
+        Write the cache in its file, if it has been modified.
+        '''
+        if self.file_name is None or not self._modified:
+            return
+        with self._lock:
+            items = [key + value for key, value in self._digests.items()]
+            self._modified = False
+        import json
+        tmp = '%s.%d.tmp' % (self.file_name, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(items, f)
+        os.replace(tmp, self.file_name)
+
+
+def _file_digest(file_name, algorithm, cache):
+    if cache is not None:
+        return cache.digest(file_name, algorithm)
+    hash = hashlib.new(algorithm)
+    _update_hash_from_file(file_name, hash)
+    return hash.digest()
+
+
+def update_hash_from_directory(directory, hash, cache=None, threads=None):
     '''
     Update a hash object from the content of a directory. The hash will
     reflect the recursive content of all files as well as the paths in all
     directories.
-    '''
-    for root, dirs, files in sorted(os.walk(directory)):
-        for file in sorted(files):
-            hash.update(file.encode('utf-8'))
-            hash.update(open(os.path.join(root, file), 'rb').read())
-        for dir in sorted(dirs):
-            hash.update(dir.encode('utf-8'))
-            update_hash_from_directory(os.path.join(root, dir), hash)
 
+    The directory tree is walked once. Files are read by blocks, and their
+    digests (computed with the algorithm of hash) are computed in a pool of
+    threads, then combined in a deterministic order.
 
-def path_hash(path, hash=None):
+    Parameters
+    ----------
+    directory: str
+        directory to hash
+    hash: hash object
+        :mod:`hashlib` hash object updated by this function
+    cache: :class:`FileDigestCache`
+        if not None, file digests are taken from this cache
+    threads: int
+        number of threads used to compute file digests (default:
+        :class:`concurrent.futures.ThreadPoolExecutor` default). 1 means no
+        thread.
+    '''
+    # list of (relative path, file name or None for directories)
+    entries = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        relative_root = os.path.relpath(root, directory)
+        if relative_root == os.curdir:
+            relative_root = ''
+        else:
+            relative_root = relative_root.replace(os.sep, '/') + '/'
+        for dir in dirs:
+            entries.append((relative_root + dir + '/', None))
+        for file in sorted(files):
+            entries.append((relative_root + file, os.path.join(root, file)))
+    entries.sort()
+    file_names = [file_name for path, file_name in entries
+                  if file_name is not None]
+    algorithm = hash.name
+
+    def digest(file_name):
+        return _file_digest(file_name, algorithm, cache)
+    executor = None
+    if threads == 1 or len(file_names) < 2:
+        digests = map(digest, file_names)
+    else:
+        import concurrent.futures
+        executor = concurrent.futures.ThreadPoolExecutor(threads)
+        digests = executor.map(digest, file_names)
+    try:
+        for path, file_name in entries:
+            hash.update(path.encode('utf-8'))
+            hash.update(b'\0')
+            if file_name is not None:
+                hash.update(next(digests))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def path_hash(path, hash=None, algorithm='md5', cache=None, threads=None):
     '''
     Return a hash hexdigest for a file or a directory.
+
+    Parameters
+    ----------
+    path: str
+        file or directory to hash
+    hash: hash object
+        :mod:`hashlib` hash object to update. If None, a new one is created
+        with the given algorithm.
+    algorithm: str
+        name of the hash algorithm (``'md5'``, ``'sha256'``, ``'blake2b'``...
+        see :func:`hashlib.new`), used when hash is None.
+    cache: :class:`FileDigestCache`
+        if not None, file digests are taken from this cache
+    threads: int
+        number of threads hashing the files of a directory (see
+        :func:`update_hash_from_directory`)
     '''
-    if hash is None:
-        hash = hashlib.md5()
     if os.path.isdir(path):
-        update_hash_from_directory(path, hash)
+        if hash is None:
+            hash = hashlib.new(algorithm)
+        update_hash_from_directory(path, hash, cache=cache, threads=threads)
+    elif hash is None:
+        if cache is not None:
+            return cache.digest(path, algorithm).hex()
+        hash = hashlib.new(algorithm)
+        _update_hash_from_file(path, hash)
     else:
-        hash.update(open(path, 'rb').read())
+        _update_hash_from_file(path, hash)
     return hash.hexdigest()
 
 
@@ -474,5 +711,6 @@ def ensure_is_dir(d, clear_dir=False):
     if not os.path.exists(d):
         os.makedirs(d)
     elif clear_dir:
+        import shutil
         shutil.rmtree(d)
         os.makedirs(d)
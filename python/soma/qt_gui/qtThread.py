@@ -43,11 +43,14 @@ It enables to do thread safe calls because all tasks sent are executed in the sa
 
 __docformat__ = "restructuredtext en"
 
+import concurrent.futures
 import sys
 import threading
+import time
 import six
 from soma.qt_gui.qt_backend.QtCore import QObject, QTimer, QEvent, QCoreApplication
 from soma import singleton
+from soma.thread_calls import _runInFuture
 
 
 class FakeQtThreadCall(QObject):
@@ -73,6 +76,25 @@ class FakeQtThreadCall(QObject):
             return function(*args, **kwargs)
     call = staticmethod(call)
 
+    def submit(function, *args, **kwargs):
+        future = concurrent.futures.Future()
+        _runInFuture(future, function, args, kwargs)
+        return future
+    submit = staticmethod(submit)
+
+    def submit_async(function, *args, **kwargs):
+        import asyncio
+        return asyncio.wrap_future(
+            FakeQtThreadCall.submit(function, *args, **kwargs))
+    submit_async = staticmethod(submit_async)
+
+
+class QtThreadCallEvent(QEvent):
+
+    def __init__(self, qthreadcall):
+        QEvent.__init__(self, QEvent.Type(QEvent.User + 24))
+        self.qthreadcall = qthreadcall
+
 
 class QtThreadCall(QObject, singleton.Singleton):
 
@@ -83,7 +105,11 @@ class QtThreadCall(QObject, singleton.Singleton):
     This object must be initialized in the qt thread (normally the main
     thread).
 
-    It starts a QTimer and periodically execute tasks in its actions list.
+    Queued tasks are executed in the main thread by :meth:`doAction`. Only
+    one Qt event is posted for all the tasks queued before it is processed,
+    so that many tasks pushed from other threads do not flood the Qt event
+    queue. Repeated updates of the same target can be merged using
+    :meth:`push_latest`.
 
     Attributes
     ----------
@@ -91,6 +117,16 @@ class QtThreadCall(QObject, singleton.Singleton):
         lock to prevent concurrent access to actions list
     actions: list
         tasks to execute
+    keyedActions: dict
+        latest task for each key used in :meth:`push_latest`
+    minInterval: float
+        minimum time, in seconds, between two executions of
+        :meth:`doAction` (0, the default, means no limit). It bounds the time
+        spent in queued tasks, at the cost of their latency.
+    priority: int
+        priority of the posted Qt events (see
+        :meth:`QCoreApplication.postEvent`). A negative value lets other
+        events (painting) be processed first.
     mainThread: Thread
         current thread at object initialisation
     timer: QTimer
@@ -108,6 +144,11 @@ class QtThreadCall(QObject, singleton.Singleton):
         super().__singleton_init__()
         self.lock = threading.RLock()
         self.actions = []
+        self.keyedActions = {}
+        self.minInterval = 0.
+        self.priority = 0
+        self._eventPending = False
+        self._lastAction = 0.
         # look for the main thread
         mainthreadfound = False
         for thread in threading.enumerate():
@@ -129,13 +170,13 @@ class QtThreadCall(QObject, singleton.Singleton):
         return super().__getattr__(attr)
 
     def _postEvent(self):
-        class QtThreadCallEvent(QEvent):
-
-            def __init__(self, qthreadcall):
-                QEvent.__init__(self, QEvent.Type(QEvent.User + 24))
-                self.qthreadcall = qthreadcall
-        QCoreApplication.instance().postEvent(self,
-                                              QtThreadCallEvent(self))
+        # must be called with self.lock held: a single wake-up event is
+        # pending at a time, doAction() processes all the queued actions.
+        if self._eventPending:
+            return
+        self._eventPending = True
+        QCoreApplication.instance().postEvent(self, QtThreadCallEvent(self),
+                                              self.priority)
 
     def event(self, e):
         sys.stdout.flush()
@@ -166,6 +207,41 @@ class QtThreadCall(QObject, singleton.Singleton):
             finally:
                 self.lock.release()
 
+    def push_latest(self, key, function, *args, **kwargs):
+        """
+        Same as :meth:`push` but, if a call pushed with the same key is still
+        waiting to be executed, it is replaced by this one. This merges
+        redundant updates of the same target (a widget displaying a
+        progression for instance): only the latest one is executed, at the
+        position of the first one in the actions list.
+
+        Parameters
+        ----------
+        key: hashable
+            identifies the updated target
+        function: function
+            the function to call in main thread.
+        """
+        if self.isInMainThread():
+            function(*args, **kwargs)
+        else:
+            self.lock.acquire()
+            try:
+                if key not in self.keyedActions:
+                    self.actions.append((self._doKeyedAction, (key, ), None))
+                    self._postEvent()
+                self.keyedActions[key] = (function, args, kwargs)
+            finally:
+                self.lock.release()
+
+    def _doKeyedAction(self, key):
+        self.lock.acquire()
+        try:
+            function, args, kwargs = self.keyedActions.pop(key)
+        finally:
+            self.lock.release()
+        function(*args, **kwargs)
+
     def call(self, function, *args, **kwargs):
         """
         Send the function call to be executed in the qt main thread and wait for the result. The result will be returned to the calling thread.
@@ -208,6 +284,36 @@ class QtThreadCall(QObject, singleton.Singleton):
                 six.reraise(*exception)
             return result
 
+    def submit(self, function, *args, **kwargs):
+        """
+        Send the function call to be executed in the qt main thread and
+        returns immediately a :class:`concurrent.futures.Future` which will
+        get the result of the function (or its exception, with its
+        traceback). The call is executed immediately if current thread is
+        main thread.
+
+        Parameters
+        ----------
+        function: function
+            the function to call in main thread.
+
+        Returns
+        -------
+        :class:`concurrent.futures.Future`
+        """
+        future = concurrent.futures.Future()
+        self.push(_runInFuture, future, function, args, kwargs)
+        return future
+
+    def submit_async(self, function, *args, **kwargs):
+        """
+        Same as :meth:`submit` but returns an :mod:`asyncio` future, to be
+        awaited in a coroutine of the event loop running in the current
+        (non-GUI) thread.
+        """
+        import asyncio
+        return asyncio.wrap_future(self.submit(function, *args, **kwargs))
+
     def _callAndWakeUp(self, semaphore, function, args, kwargs):
         """
         Call the function, set the result in semaphore attributes and release the semaphore.
@@ -243,23 +349,42 @@ class QtThreadCall(QObject, singleton.Singleton):
 
     def doAction(self):
         """
-        This method is called each time the timer timeout.
+        This method is called in the main thread when an event has been
+        posted by :meth:`push` or :meth:`call`.
         It executes all functions in actions list.
         """
+        if self.minInterval > 0:
+            delay = self._lastAction + self.minInterval - time.time()
+            if delay > 0:
+                # the event stays pending: actions pushed until then will
+                # be executed by the delayed call
+                QTimer.singleShot(int(delay * 1000) + 1, self.doAction)
+                return
+            self._lastAction = time.time()
         self.lock.acquire()
         try:
             actions = self.actions
             # print("actions to do", self.actions)
             self.actions = []
+            # actions pushed from now on need a new event
+            self._eventPending = False
         finally:
             self.lock.release()
-        for (function, args, kwargs) in actions:
+        for i, (function, args, kwargs) in enumerate(actions):
             try:
                 if kwargs is None or len(kwargs) == 0:
                     function(*args)
                 else:
                     function(*args, **kwargs)
             except:  # noqa: E722
+                # keep the remaining actions for the next event
+                self.lock.acquire()
+                try:
+                    self.actions[:0] = actions[i + 1:]
+                    if self.actions:
+                        self._postEvent()
+                finally:
+                    self.lock.release()
                 # Should call a customizable function here
                 raise
 
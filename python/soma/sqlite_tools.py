@@ -44,10 +44,15 @@ from __future__ import print_function
 __docformat__ = "restructuredtext en"
 
 
+import contextlib
+import itertools
 import sys
 import threading
+import time
 import sqlite3
 
+from six.moves import queue
+
 #------------------------------------------------------------------------------
 
 
@@ -57,6 +62,18 @@ class ThreadSafeSQLiteConnection(object):
     Python wrapping of SQLite do not allow sharing of database connection between
     threads. This class allows to automatically create a connection for each
     thread.
+
+    Connections are pooled: the connection of a thread which has ended (or
+    which called :meth:`delete_connection`) is reused by other threads, and
+    the number of connections can be bounded. Database modifications can
+    also go through a single writer connection shared by all threads (see
+    :meth:`write_transaction`) while the connections returned by
+    :meth:`get_connection` are used for reading: with the WAL journal mode
+    (enabled by default for database files), readers and the writer do not
+    block each other.
+
+    Each connection to an in-memory database would open a distinct
+    database: all threads, and the writer, use a single shared connection.
     '''
     _currentId = 0
     _classLock = threading.RLock()
@@ -65,14 +82,50 @@ class ThreadSafeSQLiteConnection(object):
         '''
         A ThreadSafeSQLiteConnection is created with the parameters that
         would be used for a call to sqlite3.connect() in a single thread
-        system. These parameters are stored to allow to create a separate
-        SQLite connection for any thread with get_connection().
+        system (including ``cached_statements``, the size of the statement
+        cache of each connection). These parameters are stored to allow to
+        create a separate SQLite connection for any thread with
+        get_connection().
+
+        The following keyword parameters are specific to
+        ThreadSafeSQLiteConnection:
+
+        max_connections: int
+            maximum number of connections used by get_connection(). When it
+            is reached, threads wait for a connection to be released. The
+            default (None) means no limit.
+        wal: bool
+            if True (the default), the database file (not an in-memory
+            database) is switched to the WAL journal mode, unless it is
+            opened read-only.
+        mmap_size: int
+            if not None, maximum size (in bytes) of the database file mapped
+            in memory by each connection (``PRAGMA mmap_size``).
+        busy_timeout: int
+            if not None, time (in milliseconds) a connection waits for a lock
+            held by another connection (``PRAGMA busy_timeout``). This
+            overrides the ``timeout`` parameter of sqlite3.connect().
         '''
         super(ThreadSafeSQLiteConnection, self).__init__()
+        self.max_connections = kwargs.pop('max_connections', None)
+        self.wal = kwargs.pop('wal', True)
+        self.mmap_size = kwargs.pop('mmap_size', None)
+        self.busy_timeout = kwargs.pop('busy_timeout', None)
+        # connections move from thread to thread
+        kwargs.setdefault('check_same_thread', False)
         self.__args = args
         self.__kwargs = kwargs
         self._instanceLock = threading.RLock()
+        self._released = threading.Condition(self._instanceLock)
+        # thread -> (connection, connectionClosed)
         self.connections = {}
+        self._idle = []
+        self._writer = None
+        self._writeLock = threading.Lock()
+        self._walChecked = False
+        # connection used by all threads for an in-memory database
+        self._shared = None
+        self._memory = not self._is_file_database()
         self._classLock.acquire()
         try:
             self._id = ThreadSafeSQLiteConnection._currentId
@@ -86,74 +139,190 @@ class ThreadSafeSQLiteConnection(object):
             # module. We cannot do anything.
             return
         if self.__args is not None:
-            sqliteFile = self.__args[0]
+            sqliteFile = self.__args[0] if self.__args \
+                else self.__kwargs.get('database')
             try:
                 self.close()
                 for thread in self.connections.keys():
                     connection, connectionClosed = self.connections[thread]
-                    if connection is not None:
+                    if connection is not None and thread.is_alive():
                         currentThread = threading.current_thread().getName()
                         print('WARNING: internal error: an sqlite connection on',
-                              repr(sqliteFile), 'is opened for thread', thread,
+                              repr(sqliteFile), 'is opened for thread',
+                              thread.name,
                               'but the corresponding ThreadSafeSQLiteConnection instance (number '
                               + str(self._id)
                               + ') is being deleted in thread', currentThread
                               + '. Method currentThreadCleanup() should have been called from',
-                              thread, 'to suppress this warning.', file=sys.stderr)
+                              thread.name, 'to suppress this warning.',
+                              file=sys.stderr)
             except ImportError:
                 # python is shutting down
                 pass
 
+    def _is_file_database(self):
+        database = self.__args[0] if self.__args \
+            else self.__kwargs.get('database', '')
+        if not isinstance(database, str):
+            # path-like object
+            return True
+        if database in ('', ':memory:'):
+            return False
+        if self.__kwargs.get('uri') and (database.startswith('file::memory:')
+                                         or 'mode=memory' in database):
+            return False
+        return True
+
+    def _is_read_only(self):
+        database = self.__args[0] if self.__args \
+            else self.__kwargs.get('database', '')
+        return bool(self.__kwargs.get('uri')) and isinstance(database, str) \
+            and ('mode=ro' in database or 'immutable=1' in database)
+
+    def _connect(self):
+        connection = sqlite3.connect(*self.__args, **self.__kwargs)
+        if self.busy_timeout is not None:
+            connection.execute('PRAGMA busy_timeout=%d'
+                               % int(self.busy_timeout))
+        if self.mmap_size is not None:
+            connection.execute('PRAGMA mmap_size=%d' % int(self.mmap_size))
+        if not self._walChecked:
+            # the journal mode is stored in the database file
+            self._walChecked = True
+            if self.wal and not self._memory and not self._is_read_only():
+                try:
+                    connection.execute('PRAGMA journal_mode=WAL')
+                except sqlite3.OperationalError:
+                    # read-only file or file system: keep the journal mode
+                    pass
+        return connection
+
+    def _shared_connection(self):
+        # in-memory database: the same connection is used everywhere
+        self._instanceLock.acquire()
+        try:
+            if self._shared is None:
+                self._shared = self._connect()
+            return self._shared
+        finally:
+            self._instanceLock.release()
+
+    def _reclaim_connections(self):
+        '''
+        Put the connections of the threads that have ended in the pool of
+        idle connections. Must be called with self._instanceLock held.
+        Returns the number of reclaimed connections.
+        '''
+        dead = [thread for thread in self.connections
+                if not thread.is_alive()]
+        for thread in dead:
+            connection, connectionClosed = self.connections.pop(thread)
+            self._release(connection, connectionClosed)
+        return len(dead)
+
+    def _release(self, connection, connectionClosed):
+        if connectionClosed or self.__args is None:
+            connection.close()
+        else:
+            if connection.in_transaction:
+                connection.rollback()
+            self._idle.append(connection)
+        self._released.notify()
+
     def get_connection(self):
         '''
         Returns a SQLite connection (i.e. the result of sqlite3.connect)
-        for the current thread. If it does not already exists, it is created
-        and stored for the current thread. In order to destroy this connection
-        it is necessary to call self.delete_connection() from the current
-        thread. If a ThreadSafeSQLiteConnection is destroyed in a thread,
-        all connections opened in other threads must have been deleted.
+        for the current thread. If it does not already exists, it is taken
+        from the pool of idle connections or created, and stored for the
+        current thread. The connection goes back to the pool when the thread
+        ends or calls self.delete_connection(). If a
+        ThreadSafeSQLiteConnection is destroyed in a thread, all connections
+        used in other running threads must have been deleted.
+
+        For an in-memory database, the same connection is returned to all
+        threads.
         '''
         if self.__args is None:
             raise RuntimeError(
                 'Attempt to access to a closed ThreadSafeSQLiteConnection')
-        currentThread = threading.current_thread().getName()
-        # print('!ThreadSafeSQLiteConnection:' + currentThread + '!')
-        # _getConnection( id =', self._id, ')', self.__args
+        if self._memory:
+            return self._shared_connection()
+        currentThread = threading.current_thread()
         self._instanceLock.acquire()
         try:
-            # currentThreadConnections = self.connections.setdefault( currentThread, {} )
-            # print('!ThreadSafeSQLiteConnection:' + currentThread + '!')
-            # currentThreadConnections =', currentThreadConnections
             connection, connectionClosed = self.connections.get(
                 currentThread, (None, True))
             if connectionClosed:
                 if connection is not None:
+                    del self.connections[currentThread]
                     connection.close()
-                connection = sqlite3.connect(*self.__args, **self.__kwargs)
-                # print('!ThreadSafeSQLiteConnection:' + currentThread + '!'
-                # opened', connection)
+                connection = self._acquire_connection()
                 self.connections[currentThread] = (connection, False)
         finally:
             self._instanceLock.release()
         return connection
 
+    def _acquire_connection(self):
+        # called with self._instanceLock held
+        while True:
+            if not self._idle:
+                self._reclaim_connections()
+            if self._idle:
+                return self._idle.pop()
+            if self.max_connections is None \
+                    or len(self.connections) < self.max_connections:
+                return self._connect()
+            # threads may end without notifying: check them regularly
+            self._released.wait(0.1)
+            if self.__args is None:
+                raise RuntimeError(
+                    'Attempt to access to a closed ThreadSafeSQLiteConnection')
+
     def delete_connection(self):
         '''
-        Delete the connection previously created for the current thread with
-        get_connection()
+        Release the connection previously obtained for the current thread
+        with get_connection(). It is put back in the pool of idle
+        connections unless it has been marked as closed.
         '''
         if threading.current_thread is None:
             # exiting, threading attributes have become None
             return
-        currentThread = threading.current_thread().getName()
+        currentThread = threading.current_thread()
         self._instanceLock.acquire()
         try:
             connection, connectionClosed = self.connections.pop(
                 currentThread, (None, True))
+            if connection is not None:
+                self._release(connection, connectionClosed)
         finally:
             self._instanceLock.release()
-        if connection is not None:
-            connection.close()
+
+    @contextlib.contextmanager
+    def write_transaction(self):
+        '''
+        Context manager giving the writer connection, shared by all threads.
+        Only one thread at a time can use it (it is not reentrant). The
+        transaction is committed at the end of the block, or rolled back if
+        an exception is raised. For an in-memory database, it is the
+        connection returned by :meth:`get_connection`.
+
+        ::
+
+            with db.write_transaction() as connection:
+                connection.executemany('INSERT INTO files VALUES (?, ?)',
+                                       rows)
+        '''
+        with self._writeLock:
+            if self.__args is None:
+                raise RuntimeError(
+                    'Attempt to access to a closed ThreadSafeSQLiteConnection')
+            if self._writer is None:
+                if self._memory:
+                    self._writer = self._shared_connection()
+                else:
+                    self._writer = self._connect()
+            with self._writer:
+                yield self._writer
 
     def close(self):
         '''
@@ -170,23 +339,223 @@ class ThreadSafeSQLiteConnection(object):
         Subsequent calls to get_connection() will have to
         recreate the sqlite connection with sqlite3.connect().
         This method does not delete the connection of the current
-        thread.
+        thread. Idle connections and the writer connection are closed.
         '''
         if self.__args is not None:
             if threading.current_thread is None:
                 # exiting, threading attributes have become None
                 return
             self.currentThreadCleanup()
-            currentThread = threading.current_thread().getName()
             self._instanceLock.acquire()
             try:
                 for thread in self.connections.keys():
                     connection, connectionClosed = self.connections[thread]
                     self.connections[thread] = (connection, True)
+                for connection in self._idle:
+                    connection.close()
+                self._idle = []
+                self._reclaim_connections()
+                if self._shared is not None:
+                    self._shared.close()
+                    self._shared = None
             finally:
                 self._instanceLock.release()
+            with self._writeLock:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+
+    def batch_writer(self, **kwargs):
+        '''
+        Returns a :class:`BatchWriter` using the writer connection of this
+        object. Parameters are passed to the :class:`BatchWriter` constructor.
+        '''
+        return BatchWriter(self, **kwargs)
 
     # For backward compatibility
     _getConnection = get_connection
     currentThreadCleanup = delete_connection
     closeSqliteConnections = close_connections
+
+
+#------------------------------------------------------------------------------
+
+
+class BatchWriter(object):
+
+    '''
+    Background thread writing to a database in large transactions.
+
+    Any thread can queue modifications with :meth:`execute` and
+    :meth:`executemany`; they return immediately. The background thread
+    groups them in a single transaction, using the writer connection of a
+    :class:`ThreadSafeSQLiteConnection` (see
+    :meth:`ThreadSafeSQLiteConnection.write_transaction`), when
+    *batch_size* rows are waiting or *delay* seconds after the first of
+    them has been queued. Consecutive rows using the same SQL statement are
+    written with a single call to executemany().
+
+    Modifications are not visible to readers until they are committed: a
+    thread calls :meth:`flush` to wait until all the modifications it has
+    queued before are committed (:meth:`fence` does the same without
+    blocking).
+
+    ::
+
+        writer = db.batch_writer()
+        for path, size in files:
+            writer.execute('INSERT INTO files VALUES (?, ?)', (path, size))
+        writer.flush()
+        ...
+        writer.close()
+
+    If a transaction fails, its modifications are lost and the exception is
+    raised by the following calls to :meth:`flush`, :meth:`execute`,
+    :meth:`executemany` or :meth:`close`.
+    '''
+
+    def __init__(self, connection, batch_size=10000, delay=1.,
+                 max_pending=0):
+        '''
+        Parameters
+        ----------
+        connection: :class:`ThreadSafeSQLiteConnection`
+            database to write to
+        batch_size: int
+            number of rows written in a transaction
+        delay: float
+            maximum time (in seconds) a row waits before being committed
+        max_pending: int
+            if greater than 0, maximum number of queued requests (calls to
+            :meth:`execute` or :meth:`executemany`). Threads queuing
+            requests wait when it is reached.
+        '''
+        self.connection = connection
+        self.batch_size = batch_size
+        self.delay = delay
+        self.error = None
+        self._queue = queue.Queue(max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._write_loop,
+                                        name='BatchWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _check(self):
+        if self._closed:
+            raise RuntimeError('Attempt to use a closed BatchWriter')
+        error = self.error
+        if error is not None:
+            self.error = None
+            raise error
+
+    def execute(self, sql, parameters=()):
+        '''
+        Queue the execution of a SQL statement with its parameters.
+        '''
+        self._check()
+        self._queue.put((sql, [parameters]))
+
+    def executemany(self, sql, seq_of_parameters):
+        '''
+        Queue the execution of a SQL statement for each item of
+        seq_of_parameters.
+        '''
+        self._check()
+        self._queue.put((sql, list(seq_of_parameters)))
+
+    def fence(self):
+        '''
+        Returns a :class:`concurrent.futures.Future` which is done when all
+        the modifications queued before have been committed. If their
+        transaction failed, the exception is set in the future.
+        '''
+        import concurrent.futures
+        self._check()
+        future = concurrent.futures.Future()
+        self._queue.put(future)
+        return future
+
+    def flush(self, timeout=None):
+        '''
+        Wait until all the modifications queued before are committed.
+        '''
+        self.fence().result(timeout)
+        self._check()
+
+    def close(self):
+        '''
+        Commit the queued modifications and stop the background thread.
+        '''
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+            error = self.error
+            if error is not None:
+                self.error = None
+                raise error
+
+    def _write_loop(self):
+        pending = []
+        count = 0
+        deadline = None
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0., deadline - time.time())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            fences = []
+            while item is not None:
+                if not isinstance(item, tuple):
+                    # a future returned by fence()
+                    fences.append(item)
+                elif item:
+                    if not pending:
+                        deadline = time.time() + self.delay
+                    pending.append(item)
+                    count += len(item[1])
+                # take what is already queued without waiting
+                if count >= self.batch_size or not item:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if pending and (fences or item is None
+                            or count >= self.batch_size
+                            or time.time() >= deadline):
+                error = self._commit(pending)
+                pending = []
+                count = 0
+            else:
+                error = None
+            if error is not None and fences:
+                # reported by the fences
+                self.error = None
+            for future in fences:
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+            if item is None:
+                break
+
+    def _commit(self, pending):
+        try:
+            with self.connection.write_transaction() as connection:
+                for sql, group in itertools.groupby(pending,
+                                                    key=lambda i: i[0]):
+                    rows = [row for s, rows in group for row in rows]
+                    if len(rows) == 1:
+                        # executemany() only accepts DML statements
+                        connection.execute(sql, rows[0])
+                    else:
+                        connection.executemany(sql, rows)
+        except Exception as e:
+            self.error = e
+            return e
+        return None
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the cost of the path lookups done at start-up by plugin-heavy
+applications: :func:`soma.path.find_in_path` on ``PATH`` and
+:func:`soma.utils.find_library.find_library`, with and without the cache
+of directory listings::
+
+    python -m soma.tests.benchmark_find_in_path [lookups]
+'''
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import sys
+import time
+
+from soma import path
+from soma.utils import find_library
+
+commands = ['python', 'sh', 'ls', 'git', 'gcc', 'matlab', 'spm12', 'fsl',
+            'freesurfer', 'AimsFileInfo']
+libraries = ['c', 'm', 'z', 'ssl', 'hdf5', 'netcdf', 'gfortran', 'blas']
+
+
+def lookups(count, cached):
+    start = time.time()
+    for i in range(count):
+        if not cached:
+            path.clear_directory_index()
+            find_library._ctypes_results.clear()
+        path.find_in_path(commands[i % len(commands)])
+        find_library.find_library(libraries[i % len(libraries)])
+    return (time.time() - start) / count
+
+
+def main(count=200):
+    lookups(1, True)
+    for cached in (False, True):
+        print('%-8s %8.3f ms per find_in_path + find_library'
+              % ('cached' if cached else 'uncached',
+                 lookups(count, cached) * 1000))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
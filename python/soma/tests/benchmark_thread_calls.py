@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the throughput of :class:`soma.thread_calls.SingleThreadCalls`.
+
+Several producer threads (8 by default) register calls with
+:meth:`~soma.thread_calls.SingleThreadCalls.push`,
+:meth:`~soma.thread_calls.SingleThreadCalls.push_many` and
+:meth:`~soma.thread_calls.SingleThreadCalls.call`::
+
+    python -m soma.tests.benchmark_thread_calls [producers]
+'''
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import sys
+import threading
+import time
+
+from soma.thread_calls import SingleThreadCalls
+
+
+def nothing(*args):
+    pass
+
+
+def run(producers, count, mode, maxsize=0):
+    stc = SingleThreadCalls(maxsize=maxsize)
+    processing = threading.Thread(target=stc.processingLoop)
+    stc.setProcessingThread(processing)
+    processing.start()
+
+    def produce():
+        if mode == 'push':
+            for i in range(count):
+                stc.push(nothing, i)
+        elif mode == 'push_many':
+            for i in range(0, count, 100):
+                stc.push_many([(nothing, (j, )) for j in range(i, i + 100)])
+        else:
+            for i in range(count // 10):
+                stc.call(nothing, i)
+
+    threads = [threading.Thread(target=produce) for i in range(producers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stc.stop()
+    processing.join()
+    duration = time.time() - start
+    if mode == 'call':
+        count //= 10
+    return producers * count / duration
+
+
+def main(producers=8, count=50000):
+    for mode, maxsize in (('push', 0), ('push', 1000), ('push_many', 0),
+                          ('call', 0)):
+        print('%-10s maxsize=%-5d %10.0f calls/s'
+              % (mode, maxsize, run(producers, count, mode, maxsize)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
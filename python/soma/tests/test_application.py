@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from soma.application import Application
+
+
+plugin_with_hooks = '''
+calls = []
+
+def call_before_application_initialization(application):
+    calls.append(('before', application.name))
+
+def call_after_application_initialization(application):
+    calls.append(('after', application.name))
+'''
+
+
+class TestApplication(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='soma_test_application')
+        for name, content in (('plugin_hooks', plugin_with_hooks),
+                              ('plugin_nohook', 'value = 1\n'),
+                              ('plugin_deferred', plugin_with_hooks),
+                              ('plugin_error', 'raise ValueError("bad")\n')):
+            with open(os.path.join(self.directory, name + '.py'), 'w') as f:
+                f.write(content)
+        sys.path.insert(0, self.directory)
+        self.manifest = os.path.join(self.directory, 'cache',
+                                     'plugins.json')
+
+    def tearDown(self):
+        sys.path.remove(self.directory)
+        for name in ('plugin_hooks', 'plugin_nohook', 'plugin_deferred',
+                     'plugin_error'):
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.directory)
+
+    def new_application(self):
+        # Application is a singleton: use a new subclass for each instance
+        class TestApp(Application):
+            pass
+        app = TestApp('test_application',
+                      plugin_modules=['plugin_hooks', 'plugin_nohook',
+                                      'plugin_deferred', 'plugin_error'],
+                      deferred_plugin_modules=['plugin_deferred'])
+        app.plugin_manifest_file = self.manifest
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            app.initialize()
+            errors = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        # a failing plugin is imported (and its error printed) once
+        self.assertEqual(errors.count('ValueError: bad'), 1)
+        return app
+
+    def test_plugins(self):
+        app = self.new_application()
+        plugin_hooks = sys.modules['plugin_hooks']
+        self.assertEqual(plugin_hooks.calls,
+                         [('before', 'test_application'),
+                          ('after', 'test_application')])
+        self.assertTrue(app.loaded_plugin_modules['plugin_hooks']
+                        is plugin_hooks)
+        self.assertTrue('plugin_nohook' in sys.modules)
+        self.assertFalse('plugin_error' in app.loaded_plugin_modules)
+        self.assertEqual(sorted(app.plugin_timings['plugin_hooks']),
+                         ['call_after_application_initialization',
+                          'call_before_application_initialization',
+                          'import'])
+
+        # deferred plugins are loaded when they are looked for
+        self.assertFalse('plugin_deferred' in sys.modules)
+        self.assertTrue('plugin_deferred' in app.loaded_plugin_modules)
+        module = app.loaded_plugin_modules['plugin_deferred']
+        self.assertEqual(module.calls, [('before', 'test_application'),
+                                        ('after', 'test_application')])
+        self.assertTrue(app.loaded_plugin_modules.get('plugin_deferred')
+                        is module)
+        self.assertEqual(module.calls, [('before', 'test_application'),
+                                        ('after', 'test_application')])
+
+        with open(self.manifest) as f:
+            manifest = json.load(f)
+        self.assertEqual(sorted(manifest), ['plugin_deferred',
+                                            'plugin_hooks', 'plugin_nohook'])
+        self.assertEqual(manifest['plugin_nohook']['hooks'], [])
+        self.assertEqual(len(manifest['plugin_hooks']['hooks']), 2)
+        self.assertTrue(manifest['plugin_hooks']['import_time'] >= 0)
+        out = io.StringIO()
+        app.print_plugin_timings(out)
+        self.assertTrue('plugin_hooks' in out.getvalue())
+
+        # the manifest does not change which plugins are imported: a plugin
+        # without initialization function is still imported by initialize()
+        for name in ('plugin_hooks', 'plugin_nohook', 'plugin_deferred'):
+            del sys.modules[name]
+        app = self.new_application()
+        self.assertTrue('plugin_nohook' in sys.modules)
+        self.assertEqual(app.loaded_plugin_modules.deferred,
+                         ['plugin_deferred'])
+        self.assertEqual(app.loaded_plugin_modules['plugin_nohook'].value, 1)
+        # the last import time of deferred plugins is reported
+        out = io.StringIO()
+        app.print_plugin_timings(out)
+        self.assertTrue('plugin_deferred (last import' in out.getvalue())
+        app.load_deferred_plugin_modules()
+        self.assertEqual(app.loaded_plugin_modules.deferred, [])
+        self.assertTrue('plugin_deferred' in sys.modules)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+import bz2
+import gzip
+import io
+import lzma
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import unittest
+
+from soma import bufferandfile
+from soma.bufferandfile import BufferAndFile, identify, register_format
+
+
+class TestBufferAndFile(unittest.TestCase):
+
+    def test_text(self):
+        for read_ahead in (0, 3, 1000):
+            f = BufferAndFile(io.StringIO(u'line 1\nline 2\nend'),
+                              read_ahead=read_ahead)
+            self.assertEqual(f.peek(4), 'line')
+            self.assertEqual(f.read(5), 'line ')
+            f.unread('e ')
+            f.unread('lin')
+            self.assertEqual(f.readline(), 'line 1\n')
+            self.assertEqual(f.readline(3), 'lin')
+            f.unread('lin')
+            self.assertEqual(list(f), ['line 2\n', 'end'])
+            self.assertEqual(f.read(), '')
+
+    def test_binary(self):
+        data = bytes(bytearray(range(256))) * 10
+        for read_ahead in (0, 100):
+            f = BufferAndFile(io.BytesIO(data), read_ahead=read_ahead)
+            self.assertEqual(f.read(0), b'')
+            start = f.read(10)
+            self.assertEqual(start, data[:10])
+            f.unread(start)
+            self.assertEqual(f.tell(), 0)
+            f.seek(5, 1)
+            self.assertEqual(f.tell(), 5)
+            f.unread(data[:5])
+            b = bytearray(300)
+            self.assertEqual(f.readinto(b), 300)
+            self.assertEqual(bytes(b), data[:300])
+            self.assertEqual(f.readline(), data[300:512 + 11])
+            self.assertEqual(f.read(), data[512 + 11:])
+
+    def test_many_unread(self):
+        # peeking many times in a large stream does not copy the buffer
+        f = BufferAndFile(io.BytesIO(b'x' * 1000000 + b'\n'))
+        f.unread(f.read(1000000))
+        for i in range(10000):
+            f.unread(f.read(100))
+        self.assertEqual(f.buffered(), 1000000)
+        self.assertEqual(len(f.readline()), 1000001)
+
+    def test_identify(self):
+        directory = tempfile.mkdtemp()
+        try:
+            content = b'<?xml version="1.0"?>\n<data/>\n'
+            xml_file = os.path.join(directory, 'data.xml')
+            with open(xml_file, 'wb') as f:
+                f.write(content)
+            self.assertEqual(identify(xml_file)[:2], ('xml', []))
+            for compress, name in ((gzip.compress, 'gzip'),
+                                   (bz2.compress, 'bz2'),
+                                   (lzma.compress, 'xz')):
+                # layered compressions, read from a pipe
+                data = compress(gzip.compress(content))
+                r, w = os.pipe()
+                writer = threading.Thread(target=self.write_pipe,
+                                          args=(w, data))
+                writer.start()
+                format, compressions, stream = identify(
+                    io.open(r, 'rb', buffering=0))
+                with stream:
+                    self.assertEqual(format, 'xml')
+                    self.assertEqual(compressions, [name, 'gzip'])
+                    self.assertEqual(stream.read(), content)
+                writer.join()
+            tar_file = os.path.join(directory, 'data.tar.gz')
+            with tarfile.open(tar_file, 'w:gz') as tar:
+                tar.add(xml_file, 'data.xml')
+            format, compressions, stream = identify(tar_file)
+            stream.close()
+            self.assertEqual((format, compressions), ('tar', ['gzip']))
+            register_format('test_data', lambda prefix: b'<data/>' in prefix)
+            try:
+                self.assertEqual(identify(xml_file)[0], 'test_data')
+            finally:
+                bufferandfile._formats.pop(0)
+        finally:
+            shutil.rmtree(directory)
+
+    @staticmethod
+    def write_pipe(fd, data):
+        with io.open(fd, 'wb') as f:
+            f.write(data)
+
+
+if __name__ == "__main__":
+    unittest.main()
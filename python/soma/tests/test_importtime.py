@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+import subprocess
+import sys
+import unittest
+
+from soma import importtime
+
+
+class TestImportTime(unittest.TestCase):
+
+    def check_modules(self, code):
+        # run in a new interpreter, to start without imported modules
+        process = subprocess.run([sys.executable, '-c', code],
+                                 stdout=subprocess.PIPE,
+                                 universal_newlines=True)
+        self.assertEqual(process.returncode, 0)
+        return process.stdout.split()
+
+    def test_lazy_imports(self):
+        modules = self.check_modules(
+            'import sys, soma, soma.controller, soma.utils\n'
+            'soma.path.split_path, soma.uuid.Uuid\n'
+            'for m in ("traits", "concurrent.futures", "yaml", '
+            '"soma.controller.controller", "soma.utils.loader"):\n'
+            '    print(m in sys.modules)')
+        self.assertEqual(modules, ['False'] * 5)
+        modules = self.check_modules(
+            'import sys\n'
+            'from soma.controller import Controller\n'
+            'from soma.utils import load_objects\n'
+            'print("soma.controller.controller" in sys.modules, '
+            '"soma.utils.loader" in sys.modules)')
+        self.assertEqual(modules, ['True', 'True'])
+        import soma
+        self.assertRaises(AttributeError, getattr, soma, 'not_a_module')
+
+    def test_parse_importtime(self):
+        output = '''import time: self [us] | cumulative | imported package
+import time:        10 |         10 |     _b
+import time:        20 |         30 |   b
+import time:         5 |          5 |   c
+import time:       100 |        135 | a
+import time:         7 |          7 | d
+'''
+        self.assertEqual(importtime.parse_importtime(output),
+                         [('_b', 10, 10, 'b'),
+                          ('b', 20, 30, 'a'),
+                          ('c', 5, 5, 'a'),
+                          ('a', 100, 135, None),
+                          ('d', 7, 7, None)])
+
+    def test_measure(self):
+        result = importtime.measure('soma.uuid')
+        self.assertTrue(result['total'] > 0)
+        self.assertTrue(0 < result['soma'] <= result['total'])
+        # external modules depend on the environment: check the structure
+        external = result['external']
+        self.assertTrue(isinstance(external, list))
+        for name, cumulative in external:
+            self.assertFalse(name == 'soma' or name.startswith('soma.'))
+            self.assertTrue(cumulative >= 0)
+        self.assertEqual(external, sorted(external, key=lambda e: -e[1]))
+        self.assertRaises(ImportError, importtime.measure, 'soma.not_a_module')
+        self.assertTrue('soma.path' in importtime.soma_modules())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -204,6 +204,101 @@ class TestSomaMisc(unittest.TestCase):
         finally:
             shutil.rmtree(d)
 
+    def test_archive_parallel(self):
+        d = tempfile.mkdtemp()
+        chunk_size = archive.compress_chunk_size
+        try:
+            archive.compress_chunk_size = 1000
+            source = os.path.join(d, 'subject')
+            os.makedirs(os.path.join(source, 'anat'))
+            os.makedirs(os.path.join(source, 'func'))
+            contents = {}
+            for i in range(6):
+                for sub in ('anat', 'func'):
+                    name = 'subject/%s/file%d.txt' % (sub, i)
+                    contents[name] = (u'content %d ' % i * 500).encode()
+                    with open(os.path.join(d, name), 'wb') as f:
+                        f.write(contents[name])
+            for ext in ('.zip', '.tar.gz', '.tar.bz2'):
+                arfile = os.path.join(d, 'archive' + ext)
+                archive.pack(arfile, [source], workers=2)
+                self.assertTrue(archive.is_archive(arfile))
+                unpacked = os.path.join(d, 'unpacked')
+                # all members
+                if ext == '.zip':
+                    archive.unzip(arfile, unpacked, workers=2)
+                else:
+                    archive.unpack(arfile, unpacked)
+                for name, content in contents.items():
+                    with open(os.path.join(unpacked, name), 'rb') as f:
+                        self.assertEqual(f.read(), content)
+                shutil.rmtree(unpacked)
+                # selected members
+                archive.unpack(arfile, unpacked,
+                               ['subject/anat', 'subject/*/file1.txt'])
+                extracted = set()
+                for root, dirs, files in os.walk(unpacked):
+                    for file in files:
+                        extracted.add(os.path.relpath(
+                            os.path.join(root, file),
+                            unpacked).replace(os.sep, '/'))
+                self.assertEqual(extracted, set(
+                    [name for name in contents if '/anat/' in name]
+                    + ['subject/func/file1.txt']))
+                shutil.rmtree(unpacked)
+        finally:
+            archive.compress_chunk_size = chunk_size
+            shutil.rmtree(d)
+
+    def test_archive_attributes(self):
+        import bz2
+        import gzip
+        import lzma
+        d = tempfile.mkdtemp()
+        try:
+            # compressed files which are not tar archives
+            for compress in (gzip.compress, bz2.compress, lzma.compress):
+                filename = os.path.join(d, 'data.bin')
+                with open(filename, 'wb') as f:
+                    f.write(compress(b'bloblop' * 100))
+                self.assertFalse(archive.is_archive(filename))
+            source = os.path.join(d, 'subject')
+            os.makedirs(os.path.join(source, 'anat'))
+            with open(os.path.join(source, 'anat', 'file.txt'), 'w') as f:
+                f.write(u'content')
+            mtime = 1000000000
+            for directory in (os.path.join(source, 'anat'), source):
+                os.utime(directory, (mtime, mtime))
+            os.chmod(os.path.join(source, 'anat'), 0o555)
+            try:
+                for ext in ('.tar.gz', '.tar.xz'):
+                    arfile = os.path.join(d, 'archive_data' + ext)
+                    if ext == '.tar.xz':
+                        archive.pack_tar(arfile, [source], type='xz')
+                    else:
+                        archive.pack(arfile, [source])
+                    self.assertTrue(archive.is_archive(arfile))
+                    unpacked = os.path.join(d, 'unpacked')
+                    archive.unpack(arfile, unpacked)
+                    anat = os.path.join(unpacked, 'subject', 'anat')
+                    try:
+                        # the read-only directory got its content
+                        with open(os.path.join(anat, 'file.txt')) as f:
+                            self.assertEqual(f.read(), u'content')
+                        # directories attributes are set after their content
+                        self.assertEqual(os.stat(anat).st_mode & 0o777,
+                                         0o555)
+                        self.assertEqual(os.stat(anat).st_mtime, mtime)
+                        self.assertEqual(os.stat(os.path.dirname(
+                            anat)).st_mtime, mtime)
+                    finally:
+                        os.chmod(anat, 0o755)
+                        shutil.rmtree(unpacked)
+            finally:
+                os.chmod(os.path.join(source, 'anat'), 0o755)
+        finally:
+            shutil.rmtree(d)
+
 
 
 def test():
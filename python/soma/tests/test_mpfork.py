@@ -97,6 +97,293 @@ class TestMPFork(unittest.TestCase):
             self.assertTrue(res[1][0] is OSError)
             self.assertEqual(res[2:], [i + 2 for i in range(njobs - 2)])
 
+        def test_mpfork_pool(self):
+            njobs = 20
+            q = queue.Queue()
+            res = [None] * njobs
+            workers = mpfork.allocate_pool_workers(q, 3)
+            self.assertEqual(len(workers), 3)
+
+            def local_func(x):
+                # cannot be pickled: run in a forked process
+                return -x
+
+            for i in range(njobs):
+                if i < 2:
+                    job = (i, math.sqrt, (i-2, ), {}, res)
+                elif i < 4:
+                    # kills the pool process, which is replaced
+                    job = (i, sys.exit, (i, ), {}, res)
+                elif i < 6:
+                    job = (i, local_func, (i, ), {}, res)
+                else:
+                    job = (i, sum, ((i, i), ), {}, res)
+                q.put(job)
+
+            for i in range(len(workers)):
+                q.put(None)
+            q.join()
+            for w in workers:
+                w.join()
+
+            for i in range(2):
+                self.assertTrue(isinstance(res[i], tuple))
+                self.assertTrue(res[i][0] is ValueError)
+            for i in range(2, 4):
+                self.assertTrue(isinstance(res[i], tuple))
+                self.assertTrue(res[i][0] is OSError)
+            self.assertEqual(res[4:6], [-4, -5])
+            self.assertEqual(res[6:], [i*2 for i in range(6, njobs)])
+            self.assertEqual(len(mpfork._pool_processes), 0)
+
+        def test_mpfork_shared_memory_results(self):
+            try:
+                import numpy
+            except ImportError:
+                self.skipTest('numpy is not available')
+            njobs = 4
+            q = queue.Queue()
+            res = [None] * njobs
+            for allocate in (mpfork.allocate_workers,
+                             mpfork.allocate_pool_workers):
+                workers = allocate(q, 2)
+                for i in range(njobs):
+                    # large and small arrays in a result structure
+                    job = (i, _arrays_result, (i, ), {}, res)
+                    q.put(job)
+                for i in range(len(workers)):
+                    q.put(None)
+                q.join()
+                for w in workers:
+                    w.join()
+                for i in range(njobs):
+                    result = res[i]
+                    self.assertEqual(result['name'], 'job %d' % i)
+                    self.assertTrue(numpy.all(result['big'] == i))
+                    self.assertEqual(result['big'].shape, (300, 400))
+                    self.assertEqual(result['small'].tolist(), [i, i + 1])
+                    result['big'][0, 0] = -1
+                    if sys.version_info >= (3, 8):
+                        # backed by a memory mapping, not copied
+                        self.assertFalse(result['big'].flags.owndata)
+
+        def test_fork_executor(self):
+            import concurrent.futures
+            import time
+            for pool in (False, True):
+                with mpfork.ForkExecutor(2, pool=pool) as executor:
+                    futures = [executor.submit(sum, (i, i))
+                               for i in range(10)]
+                    self.assertEqual(
+                        sorted(f.result() for f in
+                               concurrent.futures.as_completed(futures)),
+                        [i * 2 for i in range(10)])
+                    self.assertEqual(list(executor.map(abs, [-1, -2])),
+                                     [1, 2])
+                    future = executor.submit(math.sqrt, -1)
+                    self.assertRaises(ValueError, future.result)
+                    # the child is killed by the timeout
+                    start = time.time()
+                    slow = executor.submit_job(time.sleep, (30, ),
+                                               timeout=0.5)
+                    self.assertRaises(concurrent.futures.TimeoutError,
+                                      slow.result)
+                    self.assertTrue(time.time() - start < 10)
+                    # workers are still usable
+                    self.assertEqual(executor.submit(sum, (1, 2)).result(),
+                                     3)
+                    # queued jobs can be cancelled
+                    blockers = [executor.submit(time.sleep, 0.5)
+                                for i in range(2)]
+                    queued = executor.submit(sum, (1, 1))
+                    self.assertTrue(queued.cancel())
+                    for blocker in blockers:
+                        blocker.result()
+                    self.assertTrue(queued.cancelled())
+            self.assertEqual(len(mpfork._pool_processes), 0)
+
+        def test_fork_executor_asyncio(self):
+            import asyncio
+
+            async def main(executor):
+                results = await asyncio.gather(
+                    *[executor.submit_async(sum, (i, i)) for i in range(4)])
+                return results
+
+            with mpfork.ForkExecutor(2) as executor:
+                self.assertEqual(asyncio.run(main(executor)), [0, 2, 4, 6])
+
+        def test_shared_memory_fallback(self):
+            import errno
+            import pickle
+            import tempfile
+            from unittest import mock
+            if pickle.HIGHEST_PROTOCOL < 5:
+                self.skipTest('pickle protocol 5 is not available')
+            mkstemp = tempfile.mkstemp
+            shm_dir = tempfile.mkdtemp(prefix='soma_test_mpfork')
+            used = []
+
+            def full_shm_mkstemp(*args, **kwargs):
+                if kwargs.get('dir') == shm_dir:
+                    raise OSError(errno.ENOSPC, 'No space left on device')
+                fd, filename = mkstemp(*args, **kwargs)
+                used.append(os.path.dirname(filename))
+                return fd, filename
+
+            try:
+                with mock.patch.object(mpfork, '_shm_dir', shm_dir), \
+                        mock.patch.object(tempfile, 'mkstemp',
+                                          full_shm_mkstemp):
+                    data = b'x' * mpfork.shared_memory_threshold
+                    payload = mpfork._dump_result(
+                        pickle.PickleBuffer(bytearray(data)))
+                    self.assertEqual(used, [tempfile.gettempdir()])
+                    self.assertEqual(bytes(mpfork._load_result(payload)),
+                                     data)
+                    # small results do not use files
+                    mpfork._dump_result(b'x')
+                    self.assertEqual(len(used), 1)
+            finally:
+                os.rmdir(shm_dir)
+
+        def test_timeout_files_cleanup(self):
+            import concurrent.futures
+            import tempfile
+            from unittest import mock
+            prefix = 'mpfork_test_%d_' % os.getpid()
+            directory = mpfork._shm_dir or tempfile.gettempdir()
+            # each job has its own prefix, fixed here to find its files
+            with mock.patch.object(mpfork, '_job_prefix', lambda: prefix):
+                self.assertRaises(concurrent.futures.TimeoutError,
+                                  mpfork._run_job, _write_and_sleep,
+                                  (directory, prefix), {}, timeout=0.5)
+                self.assertEqual([f for f in os.listdir(directory)
+                                  if f.startswith(prefix)], [])
+                process = mpfork.PoolProcess()
+                try:
+                    self.assertRaises(concurrent.futures.TimeoutError,
+                                      process._run_job, _write_and_sleep,
+                                      (directory, prefix), {}, timeout=0.5)
+                    self.assertEqual([f for f in os.listdir(directory)
+                                      if f.startswith(prefix)], [])
+                    self.assertEqual(process.run_job(sum, (1, 2)), 3)
+                finally:
+                    process.stop()
+
+        def test_mpfork_resources(self):
+            import threading
+            import time
+            njobs = 6
+            q = queue.Queue()
+            res = [None] * njobs
+            budget = mpfork.set_resource_budget(
+                memory=100, pin_cpus=hasattr(os, 'sched_setaffinity'))
+            try:
+                workers = mpfork.allocate_workers(q, 4)
+                resources = [{'memory': 60} for i in range(njobs)]
+                peak = [0]
+                lock = threading.Lock()
+
+                def monitor():
+                    while any(r is None for r in res):
+                        with lock:
+                            peak[0] = max(peak[0], budget.used_memory)
+                        time.sleep(0.005)
+
+                m = threading.Thread(target=monitor)
+                m.start()
+                for i in range(njobs):
+                    q.put((i, _allocate_and_sleep, (i, ), {}, res,
+                           resources[i]))
+                for i in range(len(workers)):
+                    q.put(None)
+                q.join()
+                for w in workers:
+                    w.join()
+                m.join()
+                # 60 + 60 > 100: jobs ran one at a time
+                self.assertEqual(peak[0], 60)
+                self.assertEqual(budget.used_memory, 0)
+                # pinned on one core
+                ncpu = 1 if hasattr(os, 'sched_setaffinity') else None
+                for i in range(njobs):
+                    self.assertEqual(res[i], (i, ncpu))
+                    # 20 MB allocated by the job
+                    self.assertTrue(resources[i]['max_rss'] > 20000000)
+            finally:
+                mpfork.set_resource_budget()
+
+        def test_resource_budget_order(self):
+            import threading
+            import time
+            budget = mpfork.ResourceBudget(cpu=2)
+            first = budget.acquire(1)
+            started = []
+
+            def job(name, cpu):
+                token = budget.acquire(cpu)
+                started.append(name)
+                time.sleep(0.05)
+                budget.release(token)
+
+            big = threading.Thread(target=job, args=('big', 2))
+            big.start()
+            while not budget._waiters:
+                time.sleep(0.005)
+            # would fit beside the first job, but the big one came first
+            small = threading.Thread(target=job, args=('small', 1))
+            small.start()
+            time.sleep(0.1)
+            self.assertEqual(started, [])
+            budget.release(first)
+            big.join()
+            small.join()
+            self.assertEqual(started, ['big', 'small'])
+            self.assertEqual(budget.used_cpu, 0)
+
+            if hasattr(os, 'sched_getaffinity'):
+                budget = mpfork.ResourceBudget(pin_cpus=True)
+                ncpu = len(os.sched_getaffinity(0))
+                # no core reserved: not pinned
+                token = budget.acquire(0)
+                self.assertEqual(token, (0, 0, None))
+                self.assertEqual(mpfork._run_job(_affinity, (), {},
+                                                 cpus=token[2]), ncpu)
+                budget.release(token)
+                self.assertEqual(len(budget._free_cpus), ncpu)
+
+
+def _allocate_and_sleep(i):
+    import time
+    data = bytearray(20000000)
+    for j in range(0, len(data), 4096):
+        data[j] = 1
+    time.sleep(0.05)
+    ncpu = None
+    if hasattr(os, 'sched_getaffinity'):
+        ncpu = len(os.sched_getaffinity(0))
+    return (i, ncpu)
+
+
+def _write_and_sleep(directory, prefix):
+    # as a job killed while writing a result in shared memory
+    import time
+    with open(os.path.join(directory, prefix + 'result'), 'wb') as f:
+        f.write(b'partial')
+    time.sleep(30)
+
+
+def _affinity():
+    return len(os.sched_getaffinity(0))
+
+
+def _arrays_result(i):
+    import numpy
+    return {'name': 'job %d' % i,
+            'big': numpy.ones((300, 400)) * i,
+            'small': numpy.array([i, i + 1])}
+
 
 def test():
     suite = unittest.TestLoader().loadTestsFromTestCase(TestMPFork)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+import gc
+import unittest
+import weakref
+
+from soma.notification import (Notifier, ObservableAttributes,
+                               ObservableNotifier, ListenerHandle)
+from soma.undefined import Undefined
+from soma.utils.weak_proxy import proxy_method, weak_proxy
+
+
+class View(object):
+    # a listener object, as a GUI view
+
+    def __init__(self):
+        self.values = []
+
+    def update(self, value):
+        self.values.append(value)
+
+    def __call__(self, value):
+        self.values.append(value)
+
+
+class TestNotification(unittest.TestCase):
+
+    def test_handles(self):
+        notifier = Notifier(1)
+        values = []
+
+        def append(value):
+            values.append(value)
+        handle = notifier.add(append)
+        self.assertTrue(isinstance(handle, ListenerHandle))
+        self.assertTrue(notifier.add(append) is handle)
+        other = notifier.add(lambda value: values.append(-value))
+        notifier.notify(1)
+        self.assertEqual(values, [1, -1])
+        self.assertTrue(handle.isActive())
+        self.assertTrue(handle.close())
+        self.assertFalse(handle.close())
+        self.assertFalse(handle.isActive())
+        notifier.notify(2)
+        self.assertEqual(values, [1, -1, -2])
+        self.assertTrue(notifier.remove(other.listener))
+        self.assertEqual(notifier._listeners, [])
+        with notifier.add(append):
+            notifier.notify(3)
+        notifier.notify(4)
+        self.assertEqual(values, [1, -1, -2, 3])
+
+        # removal during notification
+        del values[:]
+        handles = []
+        handles.append(notifier.add(lambda value: handles[1].close()))
+        handles.append(notifier.add(append))
+        notifier.notify(5)
+        notifier.notify(6)
+        self.assertEqual(values, [5])
+
+        # a handle does not keep its notifier alive
+        notifier = Notifier()
+        handle = notifier.add(lambda: None)
+        notifier_ref = weakref.ref(notifier)
+        del notifier
+        gc.collect()
+        self.assertTrue(notifier_ref() is None)
+        self.assertFalse(handle.close())
+
+    def test_weak_listeners(self):
+        notifier = Notifier(1)
+        view = View()
+        handle = notifier.add(view.update, weak=True)
+        self.assertTrue(notifier.add(view.update, weak=True) is handle)
+        notifier.notify(1)
+        self.assertEqual(view.values, [1])
+        view_ref = weakref.ref(view)
+        del view
+        self.assertTrue(view_ref() is None)
+        # removed without notification
+        self.assertEqual(notifier._listeners, [])
+        self.assertFalse(handle.isActive())
+        notifier.notify(2)
+
+        # remove() finds weakly registered methods
+        view = View()
+        notifier.add(view.update, weak=True)
+        self.assertTrue(notifier.remove(view.update))
+        self.assertEqual(notifier._listeners, [])
+
+        # proxy_method and weak proxies are removed when deleted
+        view = View()
+        notifier.add(proxy_method(view, 'update'))
+        notifier.add(weak_proxy(view))
+        notifier.notify(3)
+        self.assertEqual(view.values, [3, 3])
+        del view
+        self.assertEqual(notifier._listeners, [])
+
+        # without weak=True, the method object is kept alive
+        view = View()
+        notifier.add(view.update)
+        view_ref = weakref.ref(view)
+        del view
+        gc.collect()
+        self.assertTrue(view_ref() is not None)
+
+    def test_strong_and_weak_registration(self):
+        notifier = Notifier(1)
+        view = View()
+        for first, second in ((False, True), (True, False)):
+            handle = notifier.add(view.update, weak=first)
+            # a method is registered once, weakly or not
+            self.assertTrue(notifier.add(view.update, weak=second) is handle)
+            notifier.notify(1)
+            self.assertEqual(view.values, [1])
+            self.assertTrue(notifier.remove(view.update))
+            self.assertEqual(notifier._listeners, [])
+            self.assertFalse(handle.isActive())
+            del view.values[:]
+
+    def test_remove_dead_listeners(self):
+        notifier = Notifier(1)
+        child = Notifier(1)
+        notifier.add(child)
+        view = View()
+        proxy = weakref.proxy(view)
+        handles = [notifier.add(proxy), child.add(proxy)]
+        self.assertEqual(notifier.removeDeadListeners(), 0)
+        # simulate listeners whose object cannot be watched
+        for handle in handles:
+            handle._watch = None
+        del view
+        self.assertEqual(len(child._listeners), 1)
+        self.assertEqual(notifier.removeDeadListeners(), 2)
+        self.assertEqual(notifier._listeners, [child])
+        self.assertEqual(child._listeners, [])
+
+    def test_observable_attributes(self):
+        observable = ObservableAttributes()
+        view = View()
+        any_handle = observable.onAttributeChange(view.update, weak=True)
+        name_handle = observable.onAttributeChange('name', view.update,
+                                                   weak=True)
+        values = []
+        handle = observable.onAttributeChange(
+            'name', lambda name, new, old: values.append((name, new, old)))
+        observable.name = 'a'
+        self.assertEqual(view.values, ['a', 'a'])
+        self.assertEqual(values, [('name', 'a', Undefined)])
+        handle.close()
+        observable.name = 'b'
+        self.assertEqual(len(values), 1)
+        self.assertTrue(observable.removeOnAttributeChange('name',
+                                                           view.update))
+        self.assertFalse(name_handle.isActive())
+        self.assertTrue(any_handle.isActive())
+        del view
+        self.assertFalse(any_handle.isActive())
+        self.assertEqual(observable._onAnyAttributeChange._listeners, [])
+
+        # many short lived views do not accumulate
+        for i in range(100):
+            view = View()
+            observable.onAttributeChange('name', view.update, weak=True)
+        del view
+        observable.name = 'c'
+        self.assertEqual(observable._onAttributeChange['name']._listeners,
+                         [])
+
+    def test_observable_notifier(self):
+        notifier = ObservableNotifier()
+        events = []
+        notifier.onAddFirstListener.add(lambda: events.append('first'))
+        notifier.onRemoveLastListener.add(lambda: events.append('last'))
+        view = View()
+        handle = notifier.add(view.update, weak=True)
+        notifier.add(view)
+        self.assertEqual(events, ['first'])
+        handle.close()
+        notifier.remove(view)
+        self.assertEqual(events, ['first', 'last'])
+        notifier.add(view.update, weak=True)
+        del view
+        self.assertEqual(events, ['first', 'last', 'first', 'last'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from soma import path
+
+
+class TestPath(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        file_name = os.path.join(self.directory, name)
+        if not os.path.isdir(os.path.dirname(file_name)):
+            os.makedirs(os.path.dirname(file_name))
+        with open(file_name, 'wb') as f:
+            f.write(content)
+        return file_name
+
+    def test_path_hash(self):
+        content = os.urandom(3 * path.hash_block_size + 10)
+        file_name = self.write('tree/a/big', content)
+        self.assertEqual(path.path_hash(file_name),
+                         hashlib.md5(content).hexdigest())
+        self.assertEqual(path.path_hash(file_name, algorithm='blake2b'),
+                         hashlib.blake2b(content).hexdigest())
+        for i in range(20):
+            self.write('tree/b/c/file%d' % i, b'content %d' % i)
+        os.mkdir(os.path.join(self.directory, 'tree', 'empty'))
+        tree = os.path.join(self.directory, 'tree')
+        digest = path.path_hash(tree, algorithm='sha256')
+        self.assertEqual(len(digest), 64)
+        self.assertEqual(path.path_hash(tree, algorithm='sha256', threads=1),
+                         digest)
+        # content, file names and directories change the digest
+        self.write('tree/b/c/file3', b'modified')
+        modified = path.path_hash(tree, algorithm='sha256')
+        self.assertNotEqual(modified, digest)
+        os.rename(os.path.join(tree, 'b', 'c', 'file3'),
+                  os.path.join(tree, 'b', 'file3'))
+        self.assertNotEqual(path.path_hash(tree, algorithm='sha256'),
+                            modified)
+        self.assertNotEqual(path.path_hash(tree, algorithm='sha256'),
+                            digest)
+        os.rmdir(os.path.join(tree, 'empty'))
+        self.assertNotEqual(path.path_hash(tree, algorithm='sha256'),
+                            digest)
+
+    def test_digest_cache(self):
+        tree = os.path.join(self.directory, 'tree')
+        for i in range(5):
+            self.write('tree/file%d' % i, b'content %d' % i)
+        cache_file = os.path.join(self.directory, 'cache.json')
+        cache = path.FileDigestCache(cache_file)
+        digest = path.path_hash(tree, cache=cache)
+        self.assertEqual(path.path_hash(tree), digest)
+        cache.save()
+        # cached digests are used for unchanged files
+        cache = path.FileDigestCache(cache_file)
+        key = ('md5', os.path.abspath(os.path.join(tree, 'file0')))
+        size, mtime, inode, file_digest = cache._digests[key]
+        cache._digests[key] = (size, mtime, inode, '0' * 32)
+        self.assertNotEqual(path.path_hash(tree, cache=cache), digest)
+        # modified files are read again
+        self.write('tree/file0', b'new content')
+        self.assertEqual(path.path_hash(tree, cache=cache),
+                         path.path_hash(tree))
+        self.assertEqual(path.path_hash(os.path.join(tree, 'file0'),
+                                        cache=cache),
+                         hashlib.md5(b'new content').hexdigest())
+
+    def test_find_in_path(self):
+        bin_dirs = [os.path.join(self.directory, 'bin%d' % i)
+                    for i in range(2)]
+        self.write('bin0/tool', b'')
+        self.write('bin1/tool', b'')
+        self.write('bin1/.hidden_tool', b'')
+        self.write('bin1/libfoo.so.1', b'')
+        # directories modified long ago are cached
+        for d in bin_dirs:
+            os.utime(d, (0, 0))
+        search = os.pathsep.join(bin_dirs)
+        self.assertEqual(path.find_in_path('tool', search),
+                         os.path.join(bin_dirs[0], 'tool'))
+        self.assertEqual(path.find_in_path('*tool', bin_dirs),
+                         os.path.join(bin_dirs[0], 'tool'))
+        self.assertEqual(path.find_in_path('.hid*', search),
+                         os.path.join(bin_dirs[1], '.hidden_tool'))
+        self.assertEqual(path.find_in_path('other', search), None)
+        self.assertTrue(bin_dirs[1] in path._directory_index)
+        # a modified directory is read again
+        self.write('bin1/other', b'')
+        self.assertEqual(path.find_in_path('other', search),
+                         os.path.join(bin_dirs[1], 'other'))
+        self.assertEqual(path.find_in_path('bin1/oth*', [self.directory]),
+                         os.path.join(self.directory, 'bin1', 'other'))
+        if sys.platform.startswith('linux'):
+            from soma.utils.find_library import find_library
+            ld_library_path = os.environ.get('LD_LIBRARY_PATH')
+            os.environ['LD_LIBRARY_PATH'] = search
+            try:
+                self.assertEqual(find_library('foo'), 'libfoo.so.1')
+            finally:
+                if ld_library_path is None:
+                    del os.environ['LD_LIBRARY_PATH']
+                else:
+                    os.environ['LD_LIBRARY_PATH'] = ld_library_path
+
+
+if __name__ == "__main__":
+    unittest.main()
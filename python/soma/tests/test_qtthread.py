@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+import threading
+import time
+import unittest
+
+try:
+    from soma.qt_gui.qt_backend import QtCore
+    from soma.qt_gui.qtThread import QtThreadCall
+    have_qt = True
+except ImportError:
+    # PyQt not installed
+    have_qt = False
+
+
+@unittest.skipIf(not have_qt, 'Qt is not available')
+class TestQtThreadCall(unittest.TestCase):
+
+    def setUp(self):
+        self.app = QtCore.QCoreApplication.instance()
+        if self.app is None:
+            self.app = QtCore.QCoreApplication([])
+        self.qthread = QtThreadCall()
+        self.qthread.minInterval = 0.
+
+    def tearDown(self):
+        self.qthread.minInterval = 0.
+        self.process_events(lambda: not self.qthread.actions)
+
+    def in_thread(self, function):
+        # push() and push_latest() only queue calls from another thread
+        thread = threading.Thread(target=function)
+        thread.start()
+        thread.join()
+
+    def process_events(self, done, timeout=5.):
+        start = time.time()
+        while not done() and time.time() - start < timeout:
+            self.app.processEvents()
+            time.sleep(0.01)
+
+    def test_push_latest(self):
+        calls = []
+
+        def push():
+            for i in range(100):
+                self.qthread.push_latest('progress', calls.append, i)
+            self.qthread.push(calls.append, 'other')
+            for i in range(10):
+                self.qthread.push_latest('progress', calls.append, -i)
+
+        self.in_thread(push)
+        # a single queued call, and a single posted event, for the key
+        self.assertEqual(len(self.qthread.actions), 2)
+        self.assertTrue(self.qthread._eventPending)
+        self.process_events(lambda: len(calls) == 2)
+        # the latest value, at the position of the first push
+        self.assertEqual(calls, [-9, 'other'])
+        self.assertFalse(self.qthread._eventPending)
+        self.assertEqual(self.qthread.keyedActions, {})
+
+        # after execution, the key is pushed again
+        self.in_thread(lambda: self.qthread.push_latest(
+            'progress', calls.append, 'again'))
+        self.process_events(lambda: len(calls) == 3)
+        self.assertEqual(calls[-1], 'again')
+
+        # in the main thread, calls are immediate
+        self.qthread.push_latest('progress', calls.append, 'main')
+        self.assertEqual(calls[-1], 'main')
+
+    def test_min_interval(self):
+        calls = []
+        self.qthread.minInterval = 0.3
+        self.qthread._lastAction = time.time()
+        start = time.time()
+        self.in_thread(lambda: self.qthread.push(calls.append, 1))
+        self.app.processEvents()
+        # too early: delayed
+        self.assertEqual(calls, [])
+        # pushed during the delay: executed with the first call, without
+        # another event
+        self.in_thread(lambda: self.qthread.push(calls.append, 2))
+        self.process_events(lambda: len(calls) == 2)
+        self.assertEqual(calls, [1, 2])
+        self.assertTrue(time.time() - start >= 0.25)
+
+
+if __name__ == "__main__":
+    unittest.main()
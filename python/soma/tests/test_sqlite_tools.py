@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from soma.sqlite_tools import ThreadSafeSQLiteConnection
+
+
+class TestSQLiteTools(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.directory, 'test.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_threads(self, target, n):
+        threads = [threading.Thread(target=target) for i in range(n)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_pool(self):
+        db = ThreadSafeSQLiteConnection(self.db_file, max_connections=2,
+                                        mmap_size=1 << 20, busy_timeout=1000)
+        with db.write_transaction() as connection:
+            connection.execute('CREATE TABLE t (i INTEGER)')
+            connection.executemany('INSERT INTO t VALUES (?)',
+                                   [(i, ) for i in range(100)])
+        connection = db.get_connection()
+        self.assertEqual(
+            connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(
+            connection.execute('PRAGMA busy_timeout').fetchone()[0], 1000)
+        self.assertEqual(
+            connection.execute('SELECT COUNT(*) FROM t').fetchone()[0], 100)
+        results = []
+
+        def read():
+            # threads end without releasing their connection
+            c = db.get_connection()
+            results.append(c.execute('SELECT SUM(i) FROM t').fetchone()[0])
+        self.run_threads(read, 10)
+        self.assertEqual(results, [4950] * 10)
+        # connections of ended threads have been reused
+        db._instanceLock.acquire()
+        try:
+            db._reclaim_connections()
+            self.assertEqual(len(db.connections) + len(db._idle), 2)
+        finally:
+            db._instanceLock.release()
+        # a failed write transaction is rolled back
+        try:
+            with db.write_transaction() as c:
+                c.execute('DELETE FROM t')
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(
+            connection.execute('SELECT COUNT(*) FROM t').fetchone()[0], 100)
+        db.delete_connection()
+        db.close()
+        self.assertRaises(RuntimeError, db.get_connection)
+
+    def test_batch_writer(self):
+        db = ThreadSafeSQLiteConnection(self.db_file)
+        writer = db.batch_writer(batch_size=100, delay=10)
+        writer.execute('CREATE TABLE t (i INTEGER, s TEXT)')
+
+        def write():
+            for i in range(1000):
+                writer.execute('INSERT INTO t VALUES (?, ?)', (i, str(i)))
+            writer.executemany('INSERT INTO t (i) VALUES (?)',
+                               [(-1, )] * 10)
+            writer.flush()
+            # own writes are visible after flush()
+            c = db.get_connection()
+            self.assertTrue(c.execute('SELECT COUNT(*) FROM t').fetchone()[0]
+                            >= 1010)
+            db.delete_connection()
+        self.run_threads(write, 4)
+        connection = db.get_connection()
+        self.assertEqual(
+            connection.execute('SELECT COUNT(*), SUM(i) FROM t').fetchone(),
+            (4040, 4 * (499500 - 10)))
+        # errors are reported to the writing threads
+        writer.execute('INSERT INTO unknown VALUES (1)')
+        self.assertRaises(Exception, writer.flush)
+        self.assertTrue(writer.fence().result(timeout=10) is None)
+        writer.execute('INSERT INTO t (i) VALUES (?)', (5, ))
+        writer.close()
+        self.assertEqual(
+            connection.execute('SELECT COUNT(*) FROM t').fetchone()[0], 4041)
+        self.assertRaises(RuntimeError, writer.execute, 'DELETE FROM t')
+        db.delete_connection()
+        db.close()
+
+    def test_memory_database(self):
+        db = ThreadSafeSQLiteConnection(':memory:')
+        connection = db.get_connection()
+        self.assertEqual(
+            connection.execute('PRAGMA journal_mode').fetchone()[0], 'memory')
+        db.delete_connection()
+        self.assertTrue(db.get_connection() is connection)
+        # the writer and all threads use the same database
+        with db.write_transaction() as c:
+            self.assertTrue(c is connection)
+            c.execute('CREATE TABLE t (i INTEGER)')
+            c.execute('INSERT INTO t VALUES (1)')
+        results = []
+
+        def read():
+            c = db.get_connection()
+            results.append(c.execute('SELECT COUNT(*) FROM t').fetchone()[0])
+        self.run_threads(read, 2)
+        self.assertEqual(results, [1, 1])
+        writer = db.batch_writer(delay=0.)
+        writer.execute('INSERT INTO t VALUES (2)')
+        writer.close()
+        self.assertEqual(
+            connection.execute('SELECT SUM(i) FROM t').fetchone()[0], 3)
+        db.close()
+
+    def test_read_only_database(self):
+        # not in WAL mode, as a database created by another program
+        connection = sqlite3.connect(self.db_file)
+        connection.execute('CREATE TABLE t (i INTEGER)')
+        connection.execute('INSERT INTO t VALUES (1)')
+        connection.commit()
+        connection.close()
+        for uri in ('file:%s?mode=ro', 'file:%s?immutable=1'):
+            db = ThreadSafeSQLiteConnection(uri % self.db_file, uri=True)
+            connection = db.get_connection()
+            self.assertEqual(
+                connection.execute('SELECT COUNT(*) FROM t').fetchone()[0], 1)
+            self.assertEqual(
+                connection.execute('PRAGMA journal_mode').fetchone()[0],
+                'delete')
+            db.delete_connection()
+            db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
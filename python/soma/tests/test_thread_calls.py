@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+import asyncio
+import threading
+import unittest
+
+from soma.thread_calls import SingleThreadCalls
+
+
+class TestThreadCalls(unittest.TestCase):
+
+    def start(self, stc):
+        thread = threading.Thread(target=stc.processingLoop)
+        stc.setProcessingThread(thread)
+        thread.start()
+        return thread
+
+    def test_call_and_push(self):
+        stc = SingleThreadCalls()
+        thread = self.start(stc)
+        try:
+            self.assertEqual(stc.call(lambda x, y=1: x + y, 2, y=3), 5)
+            self.assertEqual(stc.call(threading.current_thread), thread)
+            self.assertRaises(ZeroDivisionError, stc.call, lambda: 1 / 0)
+            # the waiter is reusable after an exception
+            self.assertEqual(stc.call(lambda: 'ok'), 'ok')
+            results = []
+            stc.push(results.append, 0)
+            stc.push_many([(results.append, (1, )), (results.append, [2], {})])
+            self.assertEqual(stc.call(len, results), 3)
+            self.assertEqual(results, [0, 1, 2])
+        finally:
+            stc.stop()
+            thread.join()
+
+    def test_submit(self):
+        stc = SingleThreadCalls()
+        thread = self.start(stc)
+        try:
+            futures = [stc.submit(pow, i, 2) for i in range(100)]
+            self.assertEqual([f.result() for f in futures],
+                             [i * i for i in range(100)])
+            future = stc.submit(int, 'not an int')
+            # the traceback is kept (assertRaises would remove it)
+            self.assertTrue(future.exception().__traceback__ is not None)
+            self.assertRaises(ValueError, future.result)
+
+            async def coroutine():
+                return await stc.submit_async(threading.current_thread)
+            self.assertEqual(asyncio.run(coroutine()), thread)
+        finally:
+            stc.stop()
+            thread.join()
+        # from the processing thread, the future is done immediately
+        stc = SingleThreadCalls()
+        self.assertEqual(stc.submit(len, 'abc').result(timeout=0), 3)
+
+    def test_bounded_queue(self):
+        stc = SingleThreadCalls(maxsize=4)
+        results = []
+        sizes = []
+
+        def producer(start):
+            for i in range(start, start + 500):
+                stc.push(results.append, i)
+                sizes.append(len(stc._queue))
+            stc.push_many([(results.append, (-1, ))] * 10)
+        thread = self.start(stc)
+        producers = [threading.Thread(target=producer, args=(i * 1000, ))
+                     for i in range(8)]
+        for p in producers:
+            p.start()
+        for p in producers:
+            p.join()
+        stc.stop()
+        thread.join()
+        self.assertEqual(len(results), 8 * 510)
+        # each producer may add one call after the size check
+        self.assertTrue(max(sizes) <= stc.maxsize + 8)
+        self.assertEqual(sorted(i for i in results if i >= 0),
+                         [i * 1000 + j for i in range(8) for j in range(500)])
+
+
+if __name__ == "__main__":
+    unittest.main()
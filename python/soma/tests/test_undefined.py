@@ -12,27 +12,20 @@ from six.moves import reload_module
 
 class TestUndefined(unittest.TestCase):
 
+    traits_modules = ('traits', 'traits.api', 'traits.trait_base')
+
     def setUp(self):
-        # disable traits module
-        if 'traits' in sys.modules:
-            self._traits = sys.modules['traits']
-        else:
-            self._traits = None
-        if 'traits.api' in sys.modules:
-            self._traits_api = sys.modules['traits.api']
-        else:
-            self._traits_api = None
+        # save traits modules, to disable them
+        self._traits_modules = dict((name, sys.modules.get(name))
+                                    for name in self.traits_modules)
 
     def restore_traits(self):
-        # fix / restore traits module
-        if self._traits_api is None:
-            del sys.modules['traits.api']
-        else:
-            sys.modules['traits.api'] = self._traits_api
-        if self._traits is None:
-            del sys.modules['traits']
-        else:
-            sys.modules['traits'] = self._traits
+        # fix / restore traits modules
+        for name, module in self._traits_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
 
     def tearDown(self):
         self.restore_traits()
@@ -40,8 +33,8 @@ class TestUndefined(unittest.TestCase):
         reload_module(undefined)
 
     def test_undefined_builtin(self):
-        sys.modules['traits'] = None
-        sys.modules['traits.api'] = None
+        for name in self.traits_modules:
+            sys.modules[name] = None
         from soma import undefined
         reload_module(undefined)
         self.assertTrue(hasattr(undefined, 'Undefined'))
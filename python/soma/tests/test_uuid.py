@@ -38,6 +38,38 @@ class TestUUID(unittest.TestCase):
         u3 = uuid.Uuid(b'1cab3907-9056-4694-a1d5-266ed5b6ebe3')
         u4 = uuid.Uuid(u'1cab3907-9056-4694-a1d5-266ed5b6ebe3')
         self.assertEqual(u3, u4)
+        upper = u'1CAB3907-9056-4694-A1D5-266ED5B6EBE3'
+        self.assertEqual(u3, uuid.Uuid(upper))
+        # equal objects have the same hash value
+        self.assertNotEqual(u3, upper)
+        self.assertEqual(hash(u3), hash(upper.lower()))
+        self.assertNotEqual(u3, u'1cab3907 9056 4694 a1d5 266ed5b6ebe')
+        self.assertEqual(u3.bytes,
+                         bytes.fromhex('1cab390790564694a1d5266ed5b6ebe3'))
+        # Uuid keys can be accessed with strings
+        d = {u3: 'value'}
+        self.assertEqual(d['1cab3907-9056-4694-a1d5-266ed5b6ebe3'], 'value')
+        self.assertFalse(hasattr(u3, '__dict__'))
+
+    def test_minf(self):
+        from soma.minf.api import readMinf, writeMinf
+        d = tempfile.mkdtemp()
+        try:
+            u = uuid.Uuid()
+            minf_file = os.path.join(d, 'uuid.minf')
+            for format in ('XML', 'binary'):
+                writeMinf(minf_file, ({'uuid': u}, ), format=format)
+                value = readMinf(minf_file)[0]['uuid']
+                self.assertTrue(isinstance(value, uuid.Uuid))
+                self.assertEqual(value, u)
+        finally:
+            shutil.rmtree(d)
+
+    def test_generate_many(self):
+        uuids = uuid.Uuid.generate_many(1000)
+        self.assertEqual(len(set(uuids)), 1000)
+        self.assertTrue(all(isinstance(u, uuid.Uuid) for u in uuids))
+        self.assertEqual(uuids[0], uuid.Uuid(str(uuids[0])))
 
 
 def test():
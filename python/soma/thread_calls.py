@@ -58,10 +58,43 @@ until the call is done and the result available).
 from __future__ import absolute_import
 __docformat__ = "restructuredtext en"
 
+import collections
 import threading
 import time
 
 
+def _runInFuture(future, function, args, kwargs):
+    '''
+    Executes a function call and stores its result (or its exception, with
+    its traceback) in a :class:`concurrent.futures.Future`. Nothing is done if
+    the future has been cancelled before.
+    '''
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        result = function(*args, **kwargs)
+    except BaseException as e:
+        future.set_exception(e)
+    else:
+        future.set_result(result)
+
+
+class _CallWaiter(object):
+
+    '''
+    Object used by a thread to wait for the result of
+    :meth:`SingleThreadCalls.call`. Each thread reuses the same waiter for all its calls (a thread cannot
+    wait for two calls at the same time).
+    '''
+    __slots__ = ('lock', 'result', 'exception')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lock.acquire()
+        self.result = None
+        self.exception = None
+
+
 class SingleThreadCalls(object):
 
     '''
@@ -70,13 +103,17 @@ class SingleThreadCalls(object):
     :meth:`processFunctions`.
 
     Registration can be blocking (see :meth:`call`) or non blocking (see
-    :meth:`push`).
+    :meth:`push` and :meth:`push_many`).
 
     Blocking registration waits for the function to be processed and returns
     its result (or raises its exception). Non blocking registration puts the
     function in the list and returns immediately, ignoring any return value or
     exception.
 
+    Pending calls are stored in a :class:`collections.deque`: registering a
+    call does not need to take a lock unless the processing thread is
+    waiting for functions, or the queue is full.
+
     Example::
 
         stc = SingleThreadCall()
@@ -85,7 +122,7 @@ class SingleThreadCalls(object):
         processingThread.start()
     '''
 
-    def __init__(self, thread=None):
+    def __init__(self, thread=None, maxsize=0):
         '''
         The thread passed in parameter is the processing thread of this
         SingleThreadCalls. When started (which is not been done by
@@ -98,12 +135,22 @@ class SingleThreadCalls(object):
         thread: :class:`threading.Thread` instance or *None*
             Processing thread. If *None*, :func:`threading.current_thread`
             is used.
+        maxsize: int
+            if greater than 0, maximum number of pending calls. Threads
+            registering calls in a full queue wait until the processing
+            thread has processed some of them (back-pressure).
         '''
-        self._queue = []
+        self._queue = collections.deque()
         if thread is None:
             thread = threading.current_thread()
         self._thread = thread
         self._condition = threading.Condition()
+        # True when the processing thread waits on self._condition
+        self._waiting = False
+        self.maxsize = maxsize
+        self._notFull = threading.Condition(threading.Lock())
+        self._waitingProducers = 0
+        self._waiters = threading.local()
 
     def setProcessingThread(self, thread):
         '''
@@ -150,35 +197,26 @@ class SingleThreadCalls(object):
             the result of the function call
         '''
         if threading.current_thread() is self._thread:
-            result = function(*args, **kwargs)
-        else:
-            semaphore = threading.Semaphore(0)
-            semaphore._result = None
-            semaphore._exception = None
-            self._condition.acquire()
-            try:
-                self._queue.append(
-                    (self._executeAndNotify, (semaphore, function, args, kwargs), {}))
-                self._condition.notify()
-            finally:
-                self._condition.release()
-            semaphore.acquire()
-            if semaphore._exception is not None:
-                e = semaphore._exception
-                semaphore.release()
-                raise e
-            result = semaphore._result
+            return function(*args, **kwargs)
+        waiter = getattr(self._waiters, 'waiter', None)
+        if waiter is None:
+            waiter = self._waiters.waiter = _CallWaiter()
+        self._append((self._executeAndNotify,
+                      (waiter, function, args, kwargs), {}))
+        waiter.lock.acquire()
+        exception = waiter.exception
+        result = waiter.result
+        waiter.result = waiter.exception = None
+        if exception is not None:
+            raise exception
         return result
 
-    def _executeAndNotify(semaphore, function, args, kwargs):
+    def _executeAndNotify(waiter, function, args, kwargs):
         try:
-            result = function(*args, **kwargs)
-            semaphore._result = result
-            semaphore._exception = None
-            semaphore.release()
+            waiter.result = function(*args, **kwargs)
         except Exception as e:
-            semaphore._exception = e
-            semaphore.release()
+            waiter.exception = e
+        waiter.lock.release()
     _executeAndNotify = staticmethod(_executeAndNotify)
 
     def push(self, function, *args, **kwargs):
@@ -205,12 +243,86 @@ class SingleThreadCalls(object):
         if threading.current_thread() is self._thread:
             function(*args, **kwargs)
         else:
-            self._condition.acquire()
-            try:
-                self._queue.append((function, args, kwargs))
+            self._append((function, args, kwargs))
+
+    def submit(self, function, *args, **kwargs):
+        '''
+        Same as :meth:`push` but returns a :class:`concurrent.futures.Future`
+        which gets the result of the function (or its exception). Unlike
+        :meth:`call`, the calling thread is not blocked: it may submit many
+        calls before waiting for their results.
+
+        Parameters
+        ----------
+        function: callable
+            function to execute
+        args:
+            parameters of the function
+        kwargs:
+            keyword parameters of the function
+
+        Returns
+        -------
+        :class:`concurrent.futures.Future`
+        '''
+        import concurrent.futures
+        future = concurrent.futures.Future()
+        self.push(_runInFuture, future, function, args, kwargs)
+        return future
+
+    def submit_async(self, function, *args, **kwargs):
+        '''
+        Same as :meth:`submit` but returns an :mod:`asyncio` future, to be
+        awaited in a coroutine of the event loop running in the current
+        thread.
+        '''
+        import asyncio
+        return asyncio.wrap_future(self.submit(function, *args, **kwargs))
+
+    def push_many(self, calls):
+        '''
+        Same as :meth:`push` for several functions at once, which is much
+        cheaper than several calls to :meth:`push`.
+
+        Parameters
+        ----------
+        calls: iterable
+            each item is a tuple (function, args, kwargs) where args and
+            kwargs may be omitted.
+        '''
+        calls = [(call[0], tuple(call[1]) if len(call) > 1 else (),
+                  call[2] if len(call) > 2 else {}) for call in calls]
+        if threading.current_thread() is self._thread:
+            for function, args, kwargs in calls:
+                function(*args, **kwargs)
+        elif calls:
+            if self.maxsize > 0:
+                for call in calls:
+                    self._append(call)
+            else:
+                self._queue.extend(calls)
+                self._wakeUp()
+
+    def _append(self, action):
+        if self.maxsize > 0 and len(self._queue) >= self.maxsize:
+            with self._notFull:
+                self._waitingProducers += 1
+                try:
+                    while len(self._queue) >= self.maxsize:
+                        # the processing thread must not wait while the
+                        # queue is full
+                        self._wakeUp()
+                        self._notFull.wait()
+                finally:
+                    self._waitingProducers -= 1
+        self._queue.append(action)
+        self._wakeUp()
+
+    def _wakeUp(self):
+        # the condition is only used when the processing thread waits
+        if self._waiting:
+            with self._condition:
                 self._condition.notify()
-            finally:
-                self._condition.release()
 
     def stop(self):
         '''
@@ -220,12 +332,8 @@ class SingleThreadCalls(object):
         will be processed but functions registered after the special value will be
         ignored.
         '''
-        self._condition.acquire()
-        try:
-            self._queue.append(None)
-            self._condition.notify()
-        finally:
-            self._condition.release()
+        self._queue.append(None)
+        self._wakeUp()
 
     def processFunctions(self, blocking=False):
         '''
@@ -242,34 +350,37 @@ class SingleThreadCalls(object):
         Parameters
         ----------
         blocking: bool
-            if *blocking* is *False* (the default), *processFunctions*
+            kept for compatibility: the queue can always be accessed without
+            waiting.
 
         Returns
         -------
         int:
-            * Returns 0 immediately if it cannot access the function list (for
-              example if it is locked by another thread that is registering a
-              function).
-            * If *blocking* is *True*, *processFunctions* waits until the
-              function list is available, and returns the number of function
-              called
+            * the number of function called
             * If :meth:`stop` has been called, *None* is returned
         '''
-        if self._condition.acquire(blocking):
-            try:
-                actions = self._queue
-                self._queue = []
-            finally:
-                self._condition.release()
-            result = 0
-            for action in actions:
-                if action is None:
-                    return None
-                function, args, kwargs = action
-                function(*args, **kwargs)
-                result += 1
-            return result
-        return 0
+        queue = self._queue
+        popleft = queue.popleft
+        result = 0
+        # functions registered while processing are left for the next call
+        for i in range(len(queue)):
+            action = popleft()
+            if action is None:
+                self._notifyNotFull()
+                return None
+            function, args, kwargs = action
+            function(*args, **kwargs)
+            result += 1
+            if self._waitingProducers and not result % 64:
+                self._notifyNotFull()
+        if result:
+            self._notifyNotFull()
+        return result
+
+    def _notifyNotFull(self):
+        if self._waitingProducers:
+            with self._notFull:
+                self._notFull.notify_all()
 
     def processingLoop(self):
         '''
@@ -277,10 +388,13 @@ class SingleThreadCalls(object):
 
         .. seealso:: :meth:`processFunctions`
         '''
-        actionCount = 0
-        self._condition.acquire()
-        self.processFunctions()
-        while actionCount is not None:
-            self._condition.wait()
-            actionCount = self.processFunctions()
-        self._condition.release()
+        while self.processFunctions() is not None:
+            with self._condition:
+                self._waiting = True
+                try:
+                    # functions may have been registered before
+                    # self._waiting was set
+                    while not self._queue:
+                        self._condition.wait()
+                finally:
+                    self._waiting = False
@@ -56,8 +56,9 @@ from __future__ import absolute_import
 __docformat__ = "restructuredtext en"
 
 try:
-    # If possible, use _Undefined from traits
-    from traits.api import Undefined
+    # If possible, use _Undefined from traits. traits.trait_base is imported
+    # rather than traits.api, which takes much longer to import.
+    from traits.trait_base import Undefined
     # Undefined is also defined for backward compatibility
     undefined = Undefined
 except ImportError:
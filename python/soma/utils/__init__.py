@@ -7,4 +7,10 @@
 # for details.
 #
 
-from .loader import load_objects
+
+def __getattr__(name):
+    # load_objects and submodules are imported on first access (PEP 562)
+    from soma import _import_submodule
+    if name == 'load_objects':
+        return _import_submodule(__name__, 'loader').load_objects
+    return _import_submodule(__name__, name)
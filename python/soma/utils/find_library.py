@@ -8,9 +8,22 @@ from __future__ import absolute_import
 import os
 import sys
 import ctypes.util
-import glob
+
+from soma.path import match_in_directory
 
 ctypes_find_library = ctypes.util.find_library
+# results of ctypes_find_library(), which runs external commands
+_ctypes_results = {}
+
+
+def _ctypes_find_library(name):
+    try:
+        return _ctypes_results[name]
+    except KeyError:
+        result = ctypes_find_library(name)
+        _ctypes_results[name] = result
+        return result
+
 
 def find_library(name):
     ''' :func:`ctypes.util.find_library` is broken on linux at least: it relies
@@ -19,6 +32,9 @@ def find_library(name):
     installed nor configured.
 
     Here we are looking in ``[[DY]LD_LIBRARY_]PATH`` (depending on the system)
+
+    Directory contents are cached (see :func:`soma.path.directory_index`),
+    as well as the results of :func:`ctypes.util.find_library`.
     '''
     def sorted_match(filenames):
         return sorted(filenames)[-1] # probably not the best
@@ -42,7 +58,7 @@ def find_library(name):
     paths = os.environ.get(envar)
     if paths is None:
         # no path: fallback to ctypes
-        return ctypes_find_library(name)
+        return _ctypes_find_library(name)
 
     paths = paths.split(os.pathsep)
     names = [fname + ext for ext in exts] + [name + ext for ext in exts]
@@ -51,21 +67,22 @@ def find_library(name):
     found = None
     for path in paths:
         for tname in names:
-            filename = os.path.join(path, tname)
-            if os.path.exists(filename):
-                found = filename
-                break
+            if match_in_directory(path, tname):
+                filename = os.path.join(path, tname)
+                if os.path.exists(filename):
+                    found = filename
+                    break
         for tname in patterns:
-            filenames = glob.glob(os.path.join(path, tname))
+            filenames = match_in_directory(path, tname)
             if len(filenames) != 0:
-                found = sorted_match(filenames)
+                found = os.path.join(path, sorted_match(filenames))
                 break
 
     if found is not None:
         return os.path.basename(os.path.realpath(found))
 
     # not found: fallback to ctypes
-    return ctypes_find_library(name)
+    return _ctypes_find_library(name)
 
 
 def patch_ctypes_find_library():
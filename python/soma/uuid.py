@@ -43,26 +43,52 @@ from __future__ import absolute_import
 import six
 __docformat__ = "epytext en"
 
-import struct
-import random
-import binascii
-import sys
+import os
 
 #-------------------------------------------------------------------------
 
 
+def _parse(uuid):
+    '''
+    Return the 16 bytes of an uuid string (str or bytes) or None if it is
+    not valid.
+    '''
+    if isinstance(uuid, bytes):
+        try:
+            uuid = uuid.decode('ascii')
+        except UnicodeDecodeError:
+            return None
+    if len(uuid) == 36 and uuid[8] == uuid[13] == uuid[18] == uuid[23] \
+            == '-':
+        hexa = uuid.replace('-', '')
+    else:
+        hexa = uuid[0:8] + uuid[9:13] + uuid[14:18] + uuid[19:23] \
+            + uuid[24:36]
+    try:
+        value = bytes.fromhex(hexa)
+    except ValueError:
+        return None
+    if len(value) != 16:
+        # fromhex() ignores spaces
+        return None
+    return value
+
+
 class Uuid(object):
 
     '''
     An Uuid instance is a universal unique identifier. It is a 128 bits
     random value.
+
+    Uuid instances can be compared to their string representation (as
+    returned by ``str()``, in lowercase), and have the same hash value: a
+    dictionary indexed by Uuid instances can be accessed with strings.
+    Other string forms accepted by the constructor (uppercase for instance)
+    are not equal to Uuid instances, since their hash value differs.
     '''
-    def __new__(cls, value=None):
-        if isinstance(value, Uuid):
-            return value
-        return object.__new__(cls)
+    __slots__ = ('__uuid', '__str')
 
-    def __init__(self, uuid=None):
+    def __new__(cls, uuid=None):
         '''
         Uuid constructor. If *uuid* is omitted or *None*, a new random
         Uuid is created; if it is a string if must be 36 characters long and
@@ -78,65 +104,80 @@ class Uuid(object):
         case, *Uuid(uuid)* returns *uuid*.
         '''
         if isinstance(uuid, Uuid):
-            return
+            return uuid
+        self = object.__new__(cls)
+        self.__str = None
         if uuid is None:
             # Generate a new 128 bits uuid
-            self.__uuid = struct.pack('QQ', random.randrange(2 ** 64 - 1),
-                                      random.randrange(2 ** 64 - 1))
+            self.__uuid = os.urandom(16)
         else:
-            try:
-                uuid = six.ensure_binary(uuid, encoding='ascii')
-                self.__uuid = binascii.unhexlify(uuid[0:8] + uuid[9:13] +
-                                                 uuid[14:18] + uuid[19:23] +
-                                                 uuid[24:36])
-            except Exception:
+            value = _parse(uuid)
+            if value is None:
                 raise ValueError("Invalid uuid string %s" % (repr(uuid), ))
+            self.__uuid = value
+        return self
+
+    @classmethod
+    def generate_many(cls, count):
+        '''
+        Return a list of *count* new random Uuid instances. Random bytes are
+        obtained at once, which is much faster than creating instances one
+        by one.
+        '''
+        data = os.urandom(16 * count)
+        result = []
+        new = object.__new__
+        for i in range(0, 16 * count, 16):
+            uuid = new(cls)
+            uuid.__uuid = data[i:i + 16]
+            uuid.__str = None
+            result.append(uuid)
+        return result
 
     def __getnewargs__(self):
+        # used by minf
         return (str(self), )
 
+    def __reduce__(self):
+        return (self.__class__, (str(self), ))
+
+    def __setstate__(self, state):
+        # pickles written before Uuid used __slots__
+        if isinstance(state, tuple):
+            state = dict(state[1] or {}, **(state[0] or {}))
+        self.__uuid = state['_Uuid__uuid']
+        self.__str = None
+
+    @property
+    def bytes(self):
+        '''
+        The 16 bytes of the uuid
+        '''
+        return self.__uuid
+
     def __str__(self):
-        if not isinstance(self.__uuid, bytes):
-            # this should not happen, but has been seen in some places
-            import warnings
-            warnings.warn('soma.uuid.Uuid: self.__uuid is not of type bytes, '
-                          'but {0}. This is not supposed to happen.'
-                          .format(type(self.__uuid)))
-            self.__uuid = bytes(self.__uuid, encoding='utf-8')
-        return six.ensure_str(
-            binascii.hexlify(self.__uuid[0:4]) + b'-' +
-            binascii.hexlify(self.__uuid[4:6]) + b'-' +
-            binascii.hexlify(self.__uuid[6:8]) + b'-' +
-            binascii.hexlify(self.__uuid[8:10]) + b'-' +
-            binascii.hexlify(self.__uuid[10:16])
-        )
+        result = self.__str
+        if result is None:
+            h = self.__uuid.hex()
+            result = self.__str = '%s-%s-%s-%s-%s' % (h[:8], h[8:12],
+                                                      h[12:16], h[16:20],
+                                                      h[20:])
+        return result
 
     def __repr__(self):
         return repr(str(self))
 
     def __hash__(self):
-        return hash(self.__uuid)
+        return hash(str(self))
 
     def __eq__(self, other):
         if isinstance(other, Uuid):
             return self.__uuid == other.__uuid
         elif isinstance(other, six.string_types):  # assume string-like object (str or unicode)
-            try:
-                uuid_other = Uuid(other)
-            except ValueError:
-                return False
-            return self.__uuid == uuid_other.__uuid
+            # only the str() form has the same hash value
+            return other == str(self)
         else:
             return False
 
     def __ne__(self, other):
-        if isinstance(other, Uuid):
-            return self.__uuid != other.__uuid
-        elif isinstance(other, six.string_types):  # assume string-like object (str or unicode)
-            try:
-                uuid_other = Uuid(other)
-            except ValueError:
-                return True
-            return self.__uuid != uuid_other.__uuid
-        else:
-            return True
+        return not self.__eq__(other)
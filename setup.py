@@ -25,6 +25,7 @@ setup(
     package_dir = {'': python_dir},
     packages=find_packages(python_dir),
     platforms=release_info["PLATFORMS"],
+    python_requires=release_info["PYTHON_REQUIRES"],
     install_requires=release_info["REQUIRES"],
     extras_require = release_info["EXTRAS_REQUIRE"],
 )